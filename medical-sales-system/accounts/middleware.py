@@ -0,0 +1,19 @@
+# accounts/middleware.py
+from .roles import MANAGER, get_roles
+
+
+class RoleMiddleware:
+    """
+    بيحل أدوار اليوزر مرة واحدة لكل request:
+      request.roles      → frozenset بأسماء الجروبات
+      request.is_manager → bool
+    لازم يكون بعد AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.roles = get_roles(request.user)
+        request.is_manager = MANAGER in request.roles
+        return self.get_response(request)
@@ -0,0 +1,123 @@
+# accounts/roles.py
+"""
+Role service موحّد بدل نسخ is_manager في كل app.
+
+- الأدوار = أسماء الـ Groups بتاعة اليوزر (Manager / Rep).
+- بتتحل مرة واحدة لكل request (RoleMiddleware → request.roles / request.is_manager)
+  وبتتخزن على user object نفسه، فـ user_passes_test(is_manager) مش بيعمل query تاني.
+- وبين الـ requests في الكاش (django cache) بمفتاح user id — بس لو الـ backend مشترك
+  بين الـ workers (Redis/Memcached/DB)، وبتتمسح لما عضوية الجروبات تتغيّر (m2m_changed)
+  أو جروب يتغيّر اسمه/يتحذف.
+
+مع LocMemCache (الافتراضي) أو DummyCache الكاش لكل process: الـ invalidation من worker
+مش هيوصل للباقيين فممكن يفضلوا شايفين دور قديم لحد الـ timeout. علشان كده مع الـ backends
+دي بنكتفي بالـ memo لكل request (query واحدة للجروبات).
+"""
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+MANAGER = 'Manager'
+REP = 'Rep'
+
+_VERSION_KEY = 'roles:version'
+
+
+def _timeout():
+    return getattr(settings, 'ROLE_CACHE_TIMEOUT', 300)
+
+
+def _shared():
+    """الكاش الافتراضي مشترك بين الـ processes (مش LocMem / Dummy)."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _key(user_id):
+    # version عام علشان نقدر نمسح كاش الكل مرة واحدة (تغيير جروب)
+    ver = cache.get_or_set(_VERSION_KEY, 1, None)
+    return f'roles:{ver}:{user_id}'
+
+
+def get_roles(user):
+    """frozenset بأسماء جروبات اليوزر (فاضية لو مش مسجّل دخول)."""
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    memo = getattr(user, '_cached_roles', None)
+    if memo is not None:
+        return memo
+    if not _shared():
+        roles = frozenset(user.groups.values_list('name', flat=True))
+        user._cached_roles = roles
+        return roles
+    key = _key(user.pk)
+    roles = cache.get(key)
+    if roles is None:
+        roles = frozenset(user.groups.values_list('name', flat=True))
+        cache.set(key, roles, _timeout())
+    user._cached_roles = roles
+    return roles
+
+
+def has_role(user, role):
+    return role in get_roles(user)
+
+
+def is_manager(user):
+    """بديل u.groups.filter(name='Manager').exists() — ينفع مع user_passes_test."""
+    return MANAGER in get_roles(user)
+
+
+def invalidate(user_id=None):
+    """يمسح كاش يوزر واحد، أو الكل لو user_id=None."""
+    if not _shared():
+        return
+    if user_id is not None:
+        cache.delete(_key(user_id))
+        return
+    try:
+        cache.incr(_VERSION_KEY)
+    except ValueError:
+        cache.set(_VERSION_KEY, 2, None)
+
+
+# ============================
+# Invalidation
+# ============================
+
+@receiver(m2m_changed, sender=User.groups.through)
+def _groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        # user.groups.add/remove/clear
+        instance.__dict__.pop('_cached_roles', None)
+        invalidate(instance.pk)
+    elif pk_set:
+        # group.user_set.add/remove
+        for uid in pk_set:
+            invalidate(uid)
+    else:
+        # group.user_set.clear → مش عارفين مين
+        invalidate()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def _group_changed(sender, **kwargs):
+    invalidate()
+
+
+@receiver(post_save, sender=User)
+def _user_saved(sender, instance, created, **kwargs):
+    # id جديد → ما نسيبش كاش قديم لنفس الـ id
+    if created:
+        invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def _user_deleted(sender, instance, **kwargs):
+    invalidate(instance.pk)
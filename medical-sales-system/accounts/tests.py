@@ -1,3 +1,166 @@
+import csv
+import io
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from clientsapp.models import Client
+from med.exports import csv_response, first_of
+from visits.models import DailyVisit
+from . import roles
+
+
+class RoleCacheTests(TestCase):
+    """كاش الأدوار بين الـ requests (كاش مشترك) وكل مسارات الـ invalidation."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('roles_user', password='x')
+        cls.manager = Group.objects.create(name=roles.MANAGER)
+        cls.rep = Group.objects.create(name=roles.REP)
+        cls.user.groups.add(cls.rep)
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(roles, '_shared', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fresh(self):
+        # instance جديد زي كل request (من غير الـ memo)
+        return User.objects.get(pk=self.user.pk)
+
+    def roles_of(self):
+        return roles.get_roles(self.fresh())
+
+    def test_cached_between_requests(self):
+        self.assertEqual(self.roles_of(), {roles.REP})
+        user = self.fresh()
+        with self.assertNumQueries(0):
+            self.assertEqual(roles.get_roles(user), {roles.REP})
+
+    def test_user_groups_add_and_remove(self):
+        self.roles_of()
+        self.user.groups.add(self.manager)
+        self.assertTrue(roles.is_manager(self.fresh()))
+        self.user.groups.remove(self.manager)
+        self.assertFalse(roles.is_manager(self.fresh()))
+
+    def test_add_clears_memo_on_same_instance(self):
+        user = self.fresh()
+        self.assertFalse(roles.is_manager(user))
+        user.groups.add(self.manager)
+        self.assertTrue(roles.is_manager(user))
+
+    def test_group_user_set_add_and_clear(self):
+        self.roles_of()
+        self.manager.user_set.add(self.user)
+        self.assertIn(roles.MANAGER, self.roles_of())
+        self.rep.user_set.clear()
+        self.assertEqual(self.roles_of(), {roles.MANAGER})
+
+    def test_group_rename_and_delete(self):
+        self.roles_of()
+        self.rep.name = 'Field Rep'
+        self.rep.save()
+        self.assertEqual(self.roles_of(), {'Field Rep'})
+        self.rep.delete()
+        self.assertEqual(self.roles_of(), frozenset())
+
+    def test_deleted_user_id_not_reused_from_cache(self):
+        self.roles_of()
+        pk = self.user.pk
+        self.user.delete()
+        self.assertIsNone(cache.get(roles._key(pk)))
+
+
+class RoleNoSharedCacheTests(TestCase):
+    """LocMem (كاش لكل process): ولا قراية ولا كتابة في الكاش — memo لكل request بس."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('roles_local', password='x')
+        cls.user.groups.add(Group.objects.create(name=roles.MANAGER))
+
+    def test_every_request_reads_groups(self):
+        cache.clear()
+        self.assertFalse(roles._shared())
+        for _ in range(2):
+            user = User.objects.get(pk=self.user.pk)
+            with self.assertNumQueries(1):
+                self.assertTrue(roles.is_manager(user))
+                self.assertTrue(roles.is_manager(user))   # memo
+        self.assertIsNone(cache.get(roles._key(self.user.pk)))
+
+
+def read_csv(resp):
+    body = b''.join(resp.streaming_content).decode('utf-8')
+    return body, list(csv.reader(io.StringIO(body.lstrip('\ufeff'))))
+
+
+class CsvExportTests(TestCase):
+    """med/exports.csv_response + export الـ account overview (عدد الخلايا = عدد الـ headers)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('csv_mgr', password='x')
+        cls.manager.groups.add(Group.objects.create(name=roles.MANAGER))
+        cls.rep = User.objects.create_user('csv_rep', password='x')
+        cls.client_row = Client.objects.bulk_create([Client(
+            rep=cls.rep, week_number=7, doctor_name='د. منى', entity_name='مستشفى النور',
+            is_deleted=True)])[0]
+        cls.visit = DailyVisit.objects.create(
+            rep=cls.rep, client=cls.client_row, week_number=7, visit_date=date(2025, 2, 10),
+            entity='Nour', city='Alex', visit_objective='Demo', other_objective='Follow-up, samples',
+        )
+        cls.bare = DailyVisit.objects.create(rep=cls.rep, week_number=7, visit_date=date(2025, 2, 11),
+                                             entity='Bare')
+        DailyVisit.objects.filter(pk__in=[cls.visit.pk, cls.bare.pk]).update(is_deleted=True, client_doctor='')
+
+    def test_account_visits_export_aligns_cells_with_headers(self):
+        self.client.force_login(self.manager)
+        resp = self.client.get(reverse('accounts:account'), {'export': 'csv', 'source': 'visits'})
+        self.assertEqual(resp['Content-Type'], 'text/csv; charset=utf-8')
+        _, rows = read_csv(resp)
+        header, data = rows[0], rows[1:]
+        self.assertEqual(len(header), 14)
+        self.assertTrue(all(len(r) == len(header) for r in data))
+        row = dict(zip(header, data[[int(r[0]) for r in data].index(self.visit.pk)]))
+        self.assertEqual(row['Visit Objective'], 'Demo')
+        self.assertEqual(row['Other Objective'], 'Follow-up, samples')
+        self.assertEqual(row['Client (Entity)'], 'مستشفى النور')
+        self.assertEqual(row['Rep'], 'csv_rep')
+
+    def test_account_clients_export(self):
+        self.client.force_login(self.manager)
+        resp = self.client.get(reverse('accounts:account'), {'export': 'csv', 'source': 'clients'})
+        _, rows = read_csv(resp)
+        self.assertEqual(len(rows[0]), 13)
+        self.assertEqual(rows[1][2], 'د. منى')
 
-# Create your tests here.
+    def test_engine_options_and_single_query(self):
+        qs = DailyVisit.objects.filter(rep=self.rep).order_by('id')
+        resp = csv_response(qs, [
+            ('ID', 'id'),
+            ('Doctor', first_of('client_doctor', 'client__doctor_name')),
+            ('Week', 'week_number', lambda w: f'W{w}'),
+            ('Rep', 'rep__username'),
+        ], 'x.csv', numbered=True, bom=True, lineterminator='\n',
+            tail=[DailyVisit(id=999, rep=self.rep, week_number=8, client_doctor='Cold Dr')])
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp['Content-Disposition'], 'attachment; filename="x.csv"')
+        with self.assertNumQueries(1):
+            body, rows = read_csv(resp)
+        self.assertTrue(body.startswith('\ufeff#,ID'))
+        self.assertNotIn('\r\n', body)
+        self.assertEqual(rows, [
+            ['#', 'ID', 'Doctor', 'Week', 'Rep'],
+            # client_doctor فاضي → first_of بيرجع لاسم دكتور العميل؛ من غير عميل → خلية فاضية
+            ['1', str(self.visit.pk), 'د. منى', 'W7', 'csv_rep'],
+            ['2', str(self.bare.pk), '', 'W7', 'csv_rep'],
+            ['3', '999', 'Cold Dr', 'W8', 'csv_rep'],
+        ])
@@ -6,17 +6,14 @@ from django.shortcuts import redirect, render
 from django.http import HttpResponse
 from django.contrib import messages
 from django.db import IntegrityError
-from django.db.models import Q
 from django.apps import apps
-import csv
 
 # لو عامل موديل البروفايل في reps/models.py
 from reps.models import RepProfile
-
-
-# -------- Helpers --------
-def is_manager(u):
-    return u.is_authenticated and u.groups.filter(name='Manager').exists()
+from search.index import search_queryset
+from med.exports import csv_response
+from med import fanout
+from .roles import is_manager
 
 
 # -------- Auth Flow --------
@@ -27,7 +24,7 @@ def post_login_redirect(request):
     - Manager → dashboard:main
     - غير كده (Rep) → plans:weekly
     """
-    if request.user.groups.filter(name='Manager').exists():
+    if request.is_manager:
         return redirect('dashboard:main')
     return redirect('plans:weekly')
 
@@ -82,78 +79,39 @@ def account_overview(request):
         if hasattr(Client, 'week_number'):
             clients_qs = clients_qs.filter(week_number=wk)
 
-    # بحث نصي بسيط
+    # بحث نصي (FTS index + relevance)
     if q:
         if hasattr(DailyVisit, 'objects'):
-            visits_qs = visits_qs.filter(
-                Q(entity__icontains=q) |
-                Q(doctor_name__icontains=q) |
-                Q(phone__icontains=q) |
-                Q(city__icontains=q) |
-                Q(visit_objective__icontains=q) |
-                Q(other_objective__icontains=q)
-            )
+            visits_qs = search_queryset(visits_qs, q)
         if hasattr(Client, 'objects'):
-            clients_qs = clients_qs.filter(
-                Q(doctor_name__icontains=q) |
-                Q(entity_name__icontains=q) |
-                Q(phone__icontains=q) |
-                Q(city__icontains=q) |
-                Q(status__icontains=q)
-            )
+            clients_qs = search_queryset(clients_qs, q)
 
     # ===== Export CSV (بنفس الفلاتر) =====
     if do_csv:
-        resp = HttpResponse(content_type='text/csv; charset=utf-8')
-        resp['Content-Disposition'] = f'attachment; filename="{src}.csv"'
-        w = csv.writer(resp)
-
         if src == 'clients':
-            w.writerow(['ID','Week','Doctor Name','Entity Name','Phone','Email','City','Location',
-                        'Status','Notes','Rep','Created','Updated'])
-            for c in clients_qs:
-                w.writerow([
-                    getattr(c, 'id', ''),
-                    getattr(c, 'week_number', ''),
-                    getattr(c, 'doctor_name', ''),
-                    getattr(c, 'entity_name', ''),
-                    getattr(c, 'phone', ''),
-                    getattr(c, 'email', ''),
-                    getattr(c, 'city', ''),
-                    getattr(c, 'location', ''),
-                    getattr(c, 'status', ''),
-                    getattr(c, 'notes', ''),
-                    getattr(getattr(c, 'rep', None), 'username', ''),
-                    getattr(c, 'created_at', ''),
-                    getattr(c, 'updated_at', ''),
-                ])
-            return resp
+            return csv_response(clients_qs, [
+                ('ID', 'id'), ('Week', 'week_number'), ('Doctor Name', 'doctor_name'),
+                ('Entity Name', 'entity_name'), ('Phone', 'phone'), ('Email', 'email'),
+                ('City', 'city'), ('Location', 'location'), ('Status', 'status'), ('Notes', 'notes'),
+                ('Rep', 'rep__username'), ('Created', 'created_at'), ('Updated', 'updated_at'),
+            ], 'clients.csv')
 
         # visits (default)
-        w.writerow(['ID','Week','Visit Date','Actual DateTime','Entity','Address','City','Phone',
-                    'Visit Objective','Other Objective','Client (Entity)','Rep',
-                    'Created','Updated'])
-        for v in visits_qs:
-            w.writerow([
-                getattr(v, 'id', ''),
-                getattr(v, 'week_number', ''),
-                getattr(v, 'visit_date', ''),
-                getattr(v, 'actual_datetime', ''),
-                getattr(v, 'entity', ''),
-                getattr(v, 'address', ''),
-                getattr(v, 'city', ''),
-                (getattr(v, 'phone', '') or getattr(v, 'phone_number', '')),
-                (getattr(v, 'visit_outcome', '') or getattr(v, 'visit_objective', '')),
-                getattr(getattr(v, 'client', None), 'entity_name', ''),
-                getattr(getattr(v, 'rep', None), 'username', ''),
-                getattr(v, 'created_at', ''),
-                getattr(v, 'updated_at', ''),
-            ])
-        return resp
-
-    # للعرض فقط: حدّ أقصى 2000 صف عشان الأداء في الصفحة
-    visits_show  = visits_qs[:2000]  if hasattr(visits_qs, 'all')  else []
-    clients_show = clients_qs[:2000] if hasattr(clients_qs, 'all') else []
+        return csv_response(visits_qs, [
+            ('ID', 'id'), ('Week', 'week_number'), ('Visit Date', 'visit_date'),
+            ('Actual DateTime', 'actual_datetime'), ('Entity', 'entity'), ('Address', 'address'),
+            ('City', 'city'), ('Phone', 'phone'),
+            ('Visit Objective', 'visit_objective'), ('Other Objective', 'other_objective'),
+            ('Client (Entity)', 'client__entity_name'), ('Rep', 'rep__username'),
+            ('Created', 'created_at'), ('Updated', 'updated_at'),
+        ], 'visits.csv')
+
+    # للعرض فقط: حدّ أقصى 2000 صف عشان الأداء في الصفحة — الجدولين بالتوازي (med/fanout.py)
+    shown = fanout.run({
+        'visits':  lambda: list(visits_qs[:2000])  if hasattr(visits_qs, 'all')  else [],
+        'clients': lambda: list(clients_qs[:2000]) if hasattr(clients_qs, 'all') else [],
+    })
+    visits_show, clients_show = shown['visits'], shown['clients']
 
     return render(request, 'accounts/account.html', {
         'show': show,
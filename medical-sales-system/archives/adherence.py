@@ -0,0 +1,127 @@
+# archives/adherence.py
+"""
+Planned vs actual لكل (rep, week_number):
+
+- planned       = WeeklyPlan بحالة approved (أو Archived بعد finalize_week)
+- started       = منهم اللي اتعمل لها DailyVisit واحدة على الأقل
+- visits        = كل DailyVisit في الأسبوع (مؤرشفة أو لأ)
+- completed     = منهم status_code = DONE أو Deal
+- client_linked = منهم مربوط بعميل
+
+كله في aggregate-ين (plans / visits) متجمّعين بـ (rep, week) — من غير loop على الخطط.
+الأسابيع اللي اتقفلت (finalize_week → freeze) بتتقري من WeeklyAdherence، والـ live
+queries بتستبعدها بـ NOT EXISTS.
+"""
+from django.db.models import Count, Exists, OuterRef, Q
+
+from plans.models import WeeklyPlan
+from visits.models import DailyVisit, VisitStatus
+from med import fanout
+from .models import ArchiveWeekly, WeeklyAdherence
+
+COUNTS = ('planned', 'started', 'visits', 'completed', 'client_linked')
+
+_APPROVED = Q(status__iexact='approved') | Q(status__iexact='archived')
+_PLAN_APPROVED = Q(weekly_plan__status__iexact='approved') | Q(weekly_plan__status__iexact='archived')
+_COMPLETED = Q(status_code=VisitStatus.DONE) | Q(is_deal=True)
+
+
+def _scope(qs, week_field, weeks, rep_id, skip_frozen, rep_ids=None):
+    qs = qs.filter(**{f'{week_field}__isnull': False}).order_by()
+    if weeks is not None:
+        qs = qs.filter(**{f'{week_field}__in': list(weeks)})
+    if rep_id:
+        qs = qs.filter(rep_id=rep_id)
+    if rep_ids is not None:
+        qs = qs.filter(rep_id__in=list(rep_ids))
+    if skip_frozen:
+        qs = qs.exclude(Exists(WeeklyAdherence.objects.filter(
+            rep_id=OuterRef('rep_id'), week_no=OuterRef(week_field))))
+    return qs
+
+
+def compute(weeks=None, rep_id=None, skip_frozen=False, rep_ids=None):
+    """{(rep_id, week): {planned, started, visits, completed, client_linked}} من المصدر."""
+    res = fanout.run({
+        'plans': lambda: list(
+            _scope(WeeklyPlan.objects.filter(_APPROVED), 'week_number', weeks, rep_id, skip_frozen, rep_ids)
+            .values('rep_id', 'week_number')
+            .annotate(planned=Count('id'))
+        ),
+        'visits': lambda: list(
+            _scope(DailyVisit.objects.all(), 'week_number', weeks, rep_id, skip_frozen, rep_ids)
+            .values('rep_id', 'week_number')
+            .annotate(
+                started=Count('weekly_plan', distinct=True, filter=_PLAN_APPROVED),
+                visits=Count('id'),
+                completed=Count('id', filter=_COMPLETED),
+                client_linked=Count('client'),
+            )
+        ),
+    })
+    out = {}
+    for r in res['plans'] + res['visits']:
+        if not r['rep_id']:
+            continue
+        row = out.setdefault((r['rep_id'], r['week_number']), dict.fromkeys(COUNTS, 0))
+        for k in COUNTS:
+            if k in r:
+                row[k] = r[k]
+    return out
+
+
+def report(weeks=None, rep_id=None):
+    """
+    صفوف جاهزة للعرض: المجمّد من WeeklyAdherence + الباقي live.
+    [{rep_id, week, planned, ..., frozen}] مرتبة بالأسبوع (الأحدث الأول).
+    """
+    frozen = WeeklyAdherence.objects.all()
+    if weeks is not None:
+        frozen = frozen.filter(week_no__in=list(weeks))
+    if rep_id:
+        frozen = frozen.filter(rep_id=rep_id)
+
+    rows = [dict(rep_id=a.rep_id, week=a.week_no, frozen=True, **{k: getattr(a, k) for k in COUNTS})
+            for a in frozen]
+    rows += [dict(rep_id=key[0], week=key[1], frozen=False, **vals)
+             for key, vals in compute(weeks, rep_id, skip_frozen=True).items()]
+    rows.sort(key=lambda r: (-r['week'], r['rep_id']))
+    return rows
+
+
+def rates(row):
+    """نسب مئوية (int) لصف من report()."""
+    def pct(a, b):
+        return round(a * 100 / b) if b else 0
+    return {
+        'plan_rate': pct(row['started'], row['planned']),
+        'completion_rate': pct(row['completed'], row['visits']),
+        'client_rate': pct(row['client_linked'], row['visits']),
+    }
+
+
+def freeze(pairs):
+    """
+    يجمّد أسابيع [(rep_id, week_no), ...] — بيتنادى من finalize (archives/finalize.py).
+    upsert واحد (ON CONFLICT (rep, week_no) DO UPDATE) لكل الأزواج.
+    """
+    pairs = {(r, w) for r, w in pairs if r and w}
+    if not pairs:
+        return 0
+    live = compute(weeks={w for _, w in pairs}, rep_ids={r for r, _ in pairs})
+    WeeklyAdherence.objects.bulk_create(
+        [WeeklyAdherence(rep_id=rep_id, week_no=week_no, **(live.get((rep_id, week_no)) or dict.fromkeys(COUNTS, 0)))
+         for rep_id, week_no in pairs],
+        update_conflicts=True, unique_fields=['rep', 'week_no'], update_fields=[*COUNTS, 'computed_at'],
+        batch_size=500,
+    )
+    return len(pairs)
+
+
+def freeze_archived():
+    """كل (rep, week) ليهم ArchiveWeekly ولسه مش متجمّدين (للأسابيع اللي اتقفلت قبل الميزة دي)."""
+    pending = (ArchiveWeekly.objects
+               .filter(rep__isnull=False, week_no__isnull=False)
+               .exclude(Exists(WeeklyAdherence.objects.filter(rep_id=OuterRef('rep_id'), week_no=OuterRef('week_no'))))
+               .values_list('rep_id', 'week_no').distinct())
+    return freeze(set(pending))
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import ArchiveWeekly
+from .models import ArchiveWeekly, ArchiveWeeklyClient, WeeklyAdherence
+from . import adherence
 
 @admin.register(ArchiveWeekly)
 class ArchiveWeeklyAdmin(admin.ModelAdmin):
@@ -48,3 +49,23 @@ class ArchiveWeeklyAdmin(admin.ModelAdmin):
     def get_status(self, obj):
         return getattr(obj, 'status', '')  # لو مش موجودة هتطلع فاضية
     get_status.short_description = 'Status'
+
+
+@admin.register(ArchiveWeeklyClient)
+class ArchiveWeeklyClientAdmin(admin.ModelAdmin):
+    list_display  = ('id', 'week_no', 'rep', 'client', 'added_at')
+    list_filter   = ('week_no', 'rep')
+    raw_id_fields = ('client',)
+
+
+@admin.action(description="Recompute (إعادة حساب من المصدر)")
+def refreeze(modeladmin, request, queryset):
+    adherence.freeze(queryset.values_list('rep_id', 'week_no'))
+
+
+@admin.register(WeeklyAdherence)
+class WeeklyAdherenceAdmin(admin.ModelAdmin):
+    list_display  = ('week_no', 'rep', 'planned', 'started', 'visits', 'completed', 'client_linked', 'computed_at')
+    list_filter   = ('week_no', 'rep')
+    readonly_fields = ('computed_at',)
+    actions = (refreeze,)
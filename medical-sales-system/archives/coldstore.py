@@ -0,0 +1,330 @@
+# archives/coldstore.py
+"""
+Cold tier: الصفوف القديمة بتتنقل من الداتابيز لملفات segments مضغوطة (gzip JSONL) append-only:
+
+    <ARCHIVE_COLD_DIR>/
+        manifest.json                          ← فهرس صغير: segment لكل (جدول، تشغيل) + مدى التواريخ والـ ids
+        archives.archiveweekly/000001.jsonl.gz
+        visits.dailyvisit/000001.jsonl.gz
+        clientsapp.client/000001.jsonl.gz
+
+- النقل:   python manage.py tier_cold [--days N] [--dry-run] — أقدم من ARCHIVE_COLD_AFTER_DAYS.
+- القراءة: rows(label, ranges) بتفتح بس الـ segments اللي مداها بيتقاطع مع الفلتر (من الـ manifest).
+- الجداول الحية بتفضل صغيرة → الـ indexes بتفضل في الكاش.
+
+إيه اللي بيتنقل (الترتيب مهم — الأرشيف الأول):
+- ArchiveWeekly: archived_at أقدم من الـ horizon.
+- DailyVisit / Client: soft-deleted (deleted_at أقدم من الـ horizon) وأسبوعهم مالوش صف أرشيف في الـ hot
+  — فعدادات ArchiveWeekly (archives.counters) عمرها ما بتشاور على صف اتنقل.
+  العميل كمان لازم ما يكونش مربوط بزيارة hot.
+
+ترتيب الكتابة (crash-safe): segment (tmp + fsync + rename) → manifest (state=pending) →
+DELETE في transaction واحدة → state=done. segment pending وصفوفه لسه في الداتابيز = النقل اترجع
+(rollback) فبيتشال في التشغيل الجاي (recover)؛ ولو صفوفه اتمسحت بيتعلّم done.
+"""
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from clientsapp.models import Client
+from dashboardapp.cache import bump as bump_dashboard
+from med.serializers import dumps
+from search import index as search_index
+from visits.models import DailyVisit
+from .models import ArchiveWeekly, ArchiveWeeklyClient
+from . import adherence
+
+ARCHIVE, VISITS, CLIENTS = 'archives.ArchiveWeekly', 'visits.DailyVisit', 'clientsapp.Client'
+
+# label → الحقول اللي مداها بيتسجّل في الـ manifest (للـ pruning وقت القراءة)
+RANGE_FIELDS = {
+    ARCHIVE: ('archived_at', 'planned_date'),
+    VISITS: ('visit_date', 'deleted_at'),
+    CLIENTS: ('created_at', 'deleted_at'),
+}
+ORDER = (ARCHIVE, VISITS, CLIENTS)
+BATCH_SIZE = 1000
+MANIFEST = 'manifest.json'
+
+
+def _root():
+    return Path(getattr(settings, 'ARCHIVE_COLD_DIR', Path(settings.BASE_DIR) / 'cold'))
+
+
+def _horizon_days():
+    return int(getattr(settings, 'ARCHIVE_COLD_AFTER_DAYS', 365))
+
+
+# ---------- Manifest ----------
+def load_manifest():
+    path = _root() / MANIFEST
+    if not path.exists():
+        return {'segments': []}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest):
+    root = _root()
+    root.mkdir(parents=True, exist_ok=True)
+    tmp = root / (MANIFEST + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, root / MANIFEST)
+
+
+# ---------- اختيار الصفوف ----------
+def _hot_week(rep, week):
+    """فيه صف ArchiveWeekly (hot) لنفس (rep, week) بتاع الصف الخارجي."""
+    return Exists(ArchiveWeekly.objects.filter(rep_id=OuterRef(rep), week_no=OuterRef(week)))
+
+
+def candidates(label, cutoff):
+    if label == ARCHIVE:
+        return ArchiveWeekly.objects.filter(archived_at__lt=cutoff)
+    if label == VISITS:
+        return (DailyVisit.objects
+                .filter(is_deleted=True, deleted_at__lt=cutoff)
+                .exclude(_hot_week('rep_id', 'week_number')))
+    if label == CLIENTS:
+        linked = ArchiveWeeklyClient.objects.filter(client_id=OuterRef('pk')).filter(_hot_week('rep_id', 'week_no'))
+        return (Client.objects
+                .filter(is_deleted=True, deleted_at__lt=cutoff)
+                .exclude(_hot_week('rep_id', 'week_number'))
+                .exclude(Exists(DailyVisit.objects.filter(client_id=OuterRef('pk'))))
+                .exclude(Exists(linked)))
+    raise ValueError(label)
+
+
+# ---------- Segments ----------
+def _attnames(model):
+    return [f.attname for f in model._meta.concrete_fields]
+
+
+def _iter_rows(model, ids, batch_size):
+    fields = _attnames(model)
+    for i in range(0, len(ids), batch_size):
+        yield from model.objects.filter(pk__in=ids[i:i + batch_size]).order_by('pk').values(*fields)
+
+
+def _write_segment(label, seq, rows):
+    """يكتب segment جديد ويرجّع entry الـ manifest بتاعه (من غير ما يضيفه)."""
+    folder = _root() / label.lower()
+    folder.mkdir(parents=True, exist_ok=True)
+    name = f'{seq:06d}.jsonl.gz'
+    tmp = folder / (name + '.tmp')
+
+    n, min_id, max_id = 0, None, None
+    ranges = {f: [None, None] for f in RANGE_FIELDS[label]}
+    with open(tmp, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as gz:
+            for row in rows:
+                gz.write(dumps(row) + b'\n')
+                n += 1
+                pk = row['id']
+                min_id = pk if min_id is None else min(min_id, pk)
+                max_id = pk if max_id is None else max(max_id, pk)
+                for f, span in ranges.items():
+                    v = row.get(f)
+                    if v is None:
+                        continue
+                    span[0] = v if span[0] is None else min(span[0], v)
+                    span[1] = v if span[1] is None else max(span[1], v)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, folder / name)
+
+    return {
+        'table': label,
+        'file': f'{label.lower()}/{name}',
+        'rows': n,
+        'bytes': (folder / name).stat().st_size,
+        'min_id': min_id,
+        'max_id': max_id,
+        'ranges': {f: [v.isoformat() if v is not None else None for v in span] for f, span in ranges.items()},
+        'created_at': timezone.now().isoformat(),
+        'state': 'pending',
+    }
+
+
+def _delete(model, ids, batch_size):
+    """
+    DELETE … WHERE pk IN (…) صريح — من غير collector/signals، وده مقصود:
+    - الـ candidates ما حدش بيشاور عليهم (اتفلتروا فوق)، والعضويات بتتمسح هنا قبل العميل.
+    - العدادات مش محتاجة visit_removed لأن أسبوعهم مالوش صف hot.
+    - VisitDailyRollup بيفضل شايل الزيارات اللي راحت cold (تاريخ الداشبورد ما يتغيّرش)،
+      والـ signals كانت هتطرحهم (rollup.remove) وتعمل bump لكل صف.
+    - فهرس البحث بيتشال يدوي (unindex_ids).
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk = connection.ops.quote_name(model._meta.pk.column)
+    for i in range(0, len(ids), batch_size):
+        chunk = ids[i:i + batch_size]
+        if model is Client:
+            ArchiveWeeklyClient.objects.filter(client_id__in=chunk).delete()
+        with connection.cursor() as cur:
+            cur.execute(f"DELETE FROM {table} WHERE {pk} IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        search_index.unindex_ids(model, chunk)
+
+
+def recover():
+    """يقفل أي segment فضل pending من تشغيل اتقطع. يرجّع عدد الـ segments اللي اتصلّحت."""
+    manifest = load_manifest()
+    fixed, keep = 0, []
+    for seg in manifest['segments']:
+        if seg.get('state') == 'pending':
+            fixed += 1
+            model = apps.get_model(seg['table'])
+            if model.objects.filter(pk=seg['min_id']).exists():
+                # الـ DELETE اترجع — الصفوف لسه hot، والـ segment ملوش لازمة
+                (_root() / seg['file']).unlink(missing_ok=True)
+                continue
+            seg['state'] = 'done'
+        keep.append(seg)
+    if fixed:
+        manifest['segments'] = keep
+        _save_manifest(manifest)
+    return fixed
+
+
+def move(days=None, dry_run=False, batch_size=BATCH_SIZE):
+    """
+    ينقل الصفوف الأقدم من days (افتراضي ARCHIVE_COLD_AFTER_DAYS) للـ cold tier.
+    يرجّع {'cutoff', 'recovered', 'tables': {label: {'rows', 'file', 'bytes'}}, 'timings_ms'}.
+    """
+    days = _horizon_days() if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    out = {'cutoff': cutoff.isoformat(), 'recovered': 0, 'tables': {}, 'timings_ms': {}}
+
+    if dry_run:
+        # تقريبي للزيارات/العملاء: بيتحسبوا على الأرشيف الـ hot الحالي (قبل نقل أسابيعه)
+        out['tables'] = {label: {'rows': candidates(label, cutoff).count()} for label in ORDER}
+        return out
+
+    out['recovered'] = recover()
+    # الأسابيع اللي رايحة cold لازم تتجمّد الأول (adherence بيقرا ArchiveWeekly الـ hot)
+    adherence.freeze_archived()
+
+    for label in ORDER:
+        t = time.perf_counter()
+        model = apps.get_model(label)
+        with transaction.atomic():
+            ids = list(candidates(label, cutoff).order_by('pk').values_list('pk', flat=True))
+            if not ids:
+                continue
+            manifest = load_manifest()
+            seq = 1 + sum(1 for s in manifest['segments'] if s['table'] == label)
+            seg = _write_segment(label, seq, _iter_rows(model, ids, batch_size))
+            manifest['segments'].append(seg)
+            _save_manifest(manifest)
+            _delete(model, ids, batch_size)
+
+        manifest = load_manifest()
+        for s in manifest['segments']:
+            if s['file'] == seg['file']:
+                s['state'] = 'done'
+        _save_manifest(manifest)
+        out['tables'][label] = {'rows': seg['rows'], 'file': seg['file'], 'bytes': seg['bytes']}
+        out['timings_ms'][label] = round((time.perf_counter() - t) * 1000, 1)
+
+    if out['tables']:
+        bump_dashboard('clients', 'plans')
+    return out
+
+
+# ---------- القراءة ----------
+def _overlaps(seg, ranges, parse):
+    for f, (lo, hi) in ranges.items():
+        span = seg['ranges'].get(f)
+        if not span:
+            continue
+        s_lo, s_hi = span
+        if s_lo is None:
+            # كل قيم الحقل ده في الـ segment فاضية → مفيش صف هيعدّي الفلتر
+            return False
+        if hi is not None and parse[f](s_lo) > hi:
+            return False
+        if lo is not None and parse[f](s_hi) < lo:
+            return False
+    return True
+
+
+def rows(label, ranges=None):
+    """
+    generator بـ dicts (attnames → قيم Python) من الـ cold tier.
+    ranges = {field: (lo, hi)} — None = مفتوح. الـ segments اللي برّه المدى ما بتتفتحش،
+    والصفوف جوه الـ segment بتتفلتر بنفس الشرط (قيمة فاضية = مش مطابقة، زي SQL).
+    """
+    ranges = {f: r for f, r in (ranges or {}).items() if r != (None, None)}
+    model = apps.get_model(label)
+    parse = {f.attname: f.to_python for f in model._meta.concrete_fields}
+    for seg in load_manifest()['segments']:
+        if seg['table'] != label or not _overlaps(seg, ranges, parse):
+            continue
+        if seg.get('state') == 'pending' and model.objects.filter(pk=seg['min_id']).exists():
+            continue  # النقل ما اتمّش — الصفوف لسه hot
+        with gzip.open(_root() / seg['file'], 'rb') as gz:
+            for line in gz:
+                row = {k: parse[k](v) if v is not None and k in parse else v
+                       for k, v in json.loads(line).items()}
+                if all(_within(row.get(f), lo, hi) for f, (lo, hi) in ranges.items()):
+                    yield row
+
+
+def _within(v, lo, hi):
+    if v is None:
+        return False
+    return (lo is None or v >= lo) and (hi is None or v <= hi)
+
+
+def has_segments(label):
+    return any(seg['table'] == label for seg in load_manifest()['segments'])
+
+
+def _text(obj, path):
+    for part in path.split('__'):
+        obj = getattr(obj, part, None) if obj is not None else None
+    return '' if obj is None else str(obj)
+
+
+def archive_rows(ranges=None, q=''):
+    """
+    صفوف ArchiveWeekly من الـ cold tier كـ instances (مش محفوظة) جاهزة للقالب/الـ CSV:
+    rep متحمّل (in_bulk واحد)، ولو نفس (rep, week_no) رجع له صف hot (sync مثلاً) الـ hot بيكسب.
+    q = substring من غير حساسية للحروف على نفس حقول البحث (search.index.INDEXED).
+    """
+    if not has_segments(ARCHIVE):
+        return []
+    found = list(rows(ARCHIVE, ranges))
+    if not found:
+        return []
+    users = User.objects.in_bulk({r['rep_id'] for r in found if r['rep_id']})
+    hot = set(ArchiveWeekly.objects
+              .filter(week_no__in={r['week_no'] for r in found if r['week_no']})
+              .values_list('rep_id', 'week_no'))
+    paths = search_index.INDEXED[ARCHIVE]
+    q = (q or '').strip().lower()
+
+    out = []
+    for r in found:
+        if r['rep_id'] is not None and (r['rep_id'], r['week_no']) in hot:
+            continue
+        aw = ArchiveWeekly(**r)
+        aw.rep = users.get(r['rep_id'])
+        if q and not any(q in _text(aw, p).lower() for p in paths):
+            continue
+        out.append(aw)
+    out.sort(key=lambda aw: (aw.archived_at, aw.pk), reverse=True)
+    return out
@@ -0,0 +1,315 @@
+# archives/counters.py
+"""
+عدادات ArchiveWeekly (total_visits / unique_clients) بشكل incremental.
+
+- total_visits   = عدد DailyVisit لنفس (rep, week_number) — مؤرشفة أو لأ.
+- unique_clients = عدد صفوف ArchiveWeeklyClient لنفس (rep, week_no).
+
+- زيارة موجودة اتغيّر (rep, week_number, client) بتاعها: المفتاح القديم محفوظ من post_init
+  (snapshot) وبعد الكتابة visits_moved بتنقل العدّ وتشيل العضوية القديمة لو مفيش حاجة تانية بتسندها.
+
+كل التحديثات F() atomic على الصفوف الموجودة بس (وجود صف ArchiveWeekly معناه إن الأسبوع
+اتأرشف/اتعمله Approve، فمش بنعمل صفوف جديدة من هنا). صف جديد بيتعمل عن طريق upsert_week(s)
+(INSERT … ON CONFLICT على المفتاح الفريد (rep, week_no)) وبيتعدّ مرة واحدة جوه نفس الـ INSERT. أي drift بيتصلّح بـ: python manage.py reconcile_archive_counters --fix
+"""
+from collections import Counter
+
+from django.db.models import Count, Exists, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from visits.models import DailyVisit
+from clientsapp.models import Client
+from search import index as search_index
+from .models import ArchiveWeekly, ArchiveWeeklyClient
+
+
+def _bump(rep_id, week_no, visits=0, clients=0):
+    if not (rep_id and week_no) or not (visits or clients):
+        return 0
+    qs = ArchiveWeekly.objects.filter(rep_id=rep_id, week_no=week_no)
+    changes = {}
+    if visits:
+        changes['total_visits'] = F('total_visits') + visits
+        if visits < 0:
+            # الحقول Positive — ما ننزلش تحت الصفر (الـ reconcile يصلّح)
+            qs = qs.filter(total_visits__gte=-visits)
+    if clients:
+        changes['unique_clients'] = F('unique_clients') + clients
+    return qs.update(**changes)
+
+
+# ---------- زيارات ----------
+def visit_added(rep_id, week_no):
+    return _bump(rep_id, week_no, visits=1)
+
+
+def visit_removed(rep_id, week_no):
+    return _bump(rep_id, week_no, visits=-1)
+
+
+def visits_added(visits):
+    """نسخة الـ bulk: UPDATE واحد لكل (rep, week)."""
+    per_week = Counter((v.rep_id, v.week_number) for v in visits if v.rep_id and v.week_number)
+    for (rep_id, week_no), n in per_week.items():
+        _bump(rep_id, week_no, visits=n)
+
+
+# ---------- عملاء ----------
+def link_client(rep_id, week_no, client_id):
+    """يسجّل العميل في الأسبوع؛ لو أول مرة يزود unique_clients."""
+    if not (rep_id and week_no and client_id):
+        return False
+    _, created = ArchiveWeeklyClient.objects.get_or_create(rep_id=rep_id, week_no=week_no, client_id=client_id)
+    if created:
+        _bump(rep_id, week_no, clients=1)
+    return created
+
+
+def link_clients(visits):
+    """
+    نسخة الـ bulk: insert مرة واحدة (ignore_conflicts) وبعدين unique_clients
+    يتحسب من جدول العضوية للأسابيع اللي اتلمست بس.
+    """
+    triples = {(v.rep_id, v.week_number, v.client_id) for v in visits
+               if v.rep_id and v.week_number and v.client_id}
+    if not triples:
+        return
+    ArchiveWeeklyClient.objects.bulk_create(
+        [ArchiveWeeklyClient(rep_id=r, week_no=w, client_id=c) for r, w, c in triples],
+        ignore_conflicts=True,
+    )
+    recount({(r, w) for r, w, _ in triples}, visits=False)
+
+
+# ---------- نقل زيارة (rep / week / client) ----------
+_KEY_FIELDS = {'rep_id', 'week_number', 'client_id'}
+# instance متحمّل بـ only()/defer() — المفتاح القديم مش معروف (الـ reconcile يصلّح)
+_UNKNOWN = object()
+
+
+def _key(v):
+    return (v.rep_id, v.week_number, v.client_id)
+
+
+def snapshot(v):
+    """يحفظ (rep, week, client) زي ما هي في الداتابيز (post_init وبعد كل كتابة)."""
+    if not v.pk:
+        v._archive_key = None
+    elif _KEY_FIELDS & {f.attname for f in v._meta.concrete_fields if f.attname not in v.__dict__}:
+        v._archive_key = _UNKNOWN
+    else:
+        v._archive_key = _key(v)
+
+
+def _unlink_stale(triples):
+    """يشيل عضويات (rep, week, client) مالهاش زيارة ولا عميل بيسندها (نفس مصدر rebuild_memberships)."""
+    q = Q(pk__in=[])
+    for rep_id, week_no, client_id in triples:
+        q |= Q(rep_id=rep_id, week_no=week_no, client_id=client_id)
+    return (ArchiveWeeklyClient.objects.filter(q)
+            .exclude(Exists(DailyVisit.objects.filter(
+                rep_id=OuterRef('rep_id'), week_number=OuterRef('week_no'), client_id=OuterRef('client_id'))))
+            .exclude(Exists(Client.objects.filter(
+                pk=OuterRef('client_id'), rep_id=OuterRef('rep_id'), week_number=OuterRef('week_no'))))
+            .delete())[0]
+
+
+def visits_moved(visits):
+    """
+    بعد كتابة زيارات موجودة (save / bulk_update): اللي اتغيّر مفتاحها من snapshot
+    بيتشال عدّها من الأسبوع القديم ويتضاف للجديد، والعضوية القديمة بتتشال لو بقت stale.
+    يرجّع عدد الزيارات اللي اتنقلت.
+    """
+    moved = []
+    for v in visits:
+        old, new = getattr(v, '_archive_key', None), _key(v)
+        v._archive_key = new
+        if old is None or old is _UNKNOWN or old == new:
+            continue
+        moved.append((old, new))
+    if not moved:
+        return 0
+
+    per_week = Counter()
+    for (r0, w0, _), (r1, w1, _) in moved:
+        if (r0, w0) != (r1, w1):
+            per_week[(r0, w0)] -= 1
+            per_week[(r1, w1)] += 1
+    for (rep_id, week_no), n in per_week.items():
+        _bump(rep_id, week_no, visits=n)
+
+    added = {new for _, new in moved if all(new)}
+    if added:
+        ArchiveWeeklyClient.objects.bulk_create(
+            [ArchiveWeeklyClient(rep_id=r, week_no=w, client_id=c) for r, w, c in added],
+            ignore_conflicts=True,
+        )
+    stale = {old for old, _ in moved if all(old)}
+    if stale:
+        _unlink_stale(stale)
+    recount({k[:2] for k in added | stale}, visits=False)
+    return len(moved)
+
+
+# ---------- إنشاء / إعادة حساب ----------
+def _expected_visits():
+    return Subquery(
+        DailyVisit.objects.filter(rep_id=OuterRef('rep_id'), week_number=OuterRef('week_no'))
+                          .order_by().values('rep_id').annotate(n=Count('id')).values('n')[:1],
+        output_field=IntegerField(),
+    )
+
+
+def _expected_clients():
+    return Subquery(
+        ArchiveWeeklyClient.objects.filter(rep_id=OuterRef('rep_id'), week_no=OuterRef('week_no'))
+                                   .order_by().values('rep_id').annotate(n=Count('id')).values('n')[:1],
+        output_field=IntegerField(),
+    )
+
+
+def _weeks_q(weeks):
+    """OR بشرط واحد لكل أسبوع: week_no = w AND rep_id IN (...)."""
+    by_week = {}
+    for rep_id, week_no in weeks:
+        by_week.setdefault(week_no, []).append(rep_id)
+    q = Q(pk__in=[])
+    for week_no, reps in by_week.items():
+        q |= Q(rep_id__in=reps, week_no=week_no)
+    return q
+
+
+def recount(weeks=None, visits=True, clients=True, ids=None):
+    """
+    UPDATE واحد set-based من المصدر. weeks = iterable من (rep_id, week_no) أو None للكل.
+    ids = pks صفوف ArchiveWeekly بعينها (بعد bulk_create مثلاً) بدل weeks.
+    """
+    qs = ArchiveWeekly.objects.all()
+    if ids is not None:
+        ids = list(ids)
+        if not ids:
+            return 0
+        qs = qs.filter(pk__in=ids)
+    elif weeks is not None:
+        weeks = list(weeks)
+        if not weeks:
+            return 0
+        qs = qs.filter(_weeks_q(weeks))
+    changes = {}
+    if visits:
+        changes['total_visits'] = Coalesce(_expected_visits(), Value(0))
+    if clients:
+        changes['unique_clients'] = Coalesce(_expected_clients(), Value(0))
+    return qs.update(**changes)
+
+
+def _initial_visits(rep_id, week_no):
+    return Coalesce(Subquery(
+        DailyVisit.objects.filter(rep_id=rep_id, week_number=week_no)
+                          .order_by().values('rep_id').annotate(n=Count('id')).values('n')[:1],
+        output_field=IntegerField(),
+    ), Value(0))
+
+
+def _initial_clients(rep_id, week_no):
+    return Coalesce(Subquery(
+        ArchiveWeeklyClient.objects.filter(rep_id=rep_id, week_no=week_no)
+                                   .order_by().values('rep_id').annotate(n=Count('id')).values('n')[:1],
+        output_field=IntegerField(),
+    ), Value(0))
+
+
+def upsert_weeks(rows, update_fields=(), batch_size=None):
+    """
+    rows = iterable من (rep_id, week_no, values) — statement واحد لكل batch:
+        INSERT … VALUES (…, (SELECT COUNT …), (SELECT COUNT …))
+        ON CONFLICT (rep_id, week_no) DO UPDATE SET <update_fields>   | DO NOTHING
+    - صف جديد: العدادات بتتحسب من المصدر جوه نفس الـ INSERT.
+    - صف موجود: update_fields بس اللي بتتكتب؛ العدادات (incremental) ما بتتلمسش.
+    - bulk_create مش بيطلق post_save → فهرس البحث بيتحدث هنا للصفوف اللي اتلمست.
+    """
+    objs = [
+        ArchiveWeekly(rep_id=rep_id, week_no=week_no,
+                      total_visits=_initial_visits(rep_id, week_no),
+                      unique_clients=_initial_clients(rep_id, week_no),
+                      **values)
+        for rep_id, week_no, values in rows if rep_id and week_no
+    ]
+    if not objs:
+        return 0
+    update_fields = [f for f in update_fields if f not in ('total_visits', 'unique_clients')]
+    if update_fields:
+        ArchiveWeekly.objects.bulk_create(
+            objs, batch_size=batch_size, update_conflicts=True,
+            unique_fields=['rep', 'week_no'], update_fields=update_fields,
+        )
+    else:
+        ArchiveWeekly.objects.bulk_create(objs, batch_size=batch_size, ignore_conflicts=True)
+    _reindex({(o.rep_id, o.week_no) for o in objs}, batch_size or 1000)
+    return len(objs)
+
+
+def _reindex(weeks, batch_size):
+    """index_objects لصفوف (rep, week_no) دي (مع rep علشان rep__username)."""
+    qs = ArchiveWeekly.objects.filter(_weeks_q(weeks)).select_related('rep')
+    batch = []
+    for aw in qs.iterator(chunk_size=batch_size):
+        batch.append(aw)
+        if len(batch) >= batch_size:
+            search_index.index_objects(ArchiveWeekly, batch)
+            batch = []
+    search_index.index_objects(ArchiveWeekly, batch)
+
+
+def upsert_week(rep_id, week_no, defaults=None, update=True):
+    """
+    صف الأسبوع في statement واحد. update=True → defaults بتتكتب على الصف لو موجود
+    (زي update_or_create)؛ update=False → الصف الموجود زي ما هو (زي get_or_create).
+    """
+    defaults = dict(defaults or {})
+    return upsert_weeks([(rep_id, week_no, defaults)],
+                        update_fields=list(defaults) if update else ()) > 0
+
+
+def ensure_week(rep_id, week_no, defaults=None):
+    """يتأكد إن فيه صف للأسبوع؛ defaults بتتحط بس لو الصف جديد (ON CONFLICT DO NOTHING)."""
+    return upsert_week(rep_id, week_no, defaults, update=False)
+
+
+# ---------- Reconcile ----------
+def rebuild_memberships(dry_run=False):
+    """
+    يبني جدول العضوية من المصدر (زيارات مربوطة بعميل + عملاء ليهم week_number).
+    يرجّع (missing, stale)؛ dry_run=True → عدّ بس من غير كتابة.
+    """
+    expected = set(
+        DailyVisit.objects.filter(rep__isnull=False, week_number__isnull=False, client__isnull=False)
+                          .values_list('rep_id', 'week_number', 'client_id').distinct()
+    ) | set(
+        Client.objects.filter(rep__isnull=False, week_number__isnull=False)
+                      .values_list('rep_id', 'week_number', 'id').distinct()
+    )
+    current = dict(
+        ((r, w, c), pk) for pk, r, w, c in
+        ArchiveWeeklyClient.objects.values_list('id', 'rep_id', 'week_no', 'client_id')
+    )
+    missing = expected - current.keys()
+    stale = [pk for key, pk in current.items() if key not in expected]
+    if dry_run:
+        return len(missing), len(stale)
+
+    ArchiveWeeklyClient.objects.bulk_create(
+        [ArchiveWeeklyClient(rep_id=r, week_no=w, client_id=c) for r, w, c in missing],
+        ignore_conflicts=True, batch_size=1000,
+    )
+    if stale:
+        ArchiveWeeklyClient.objects.filter(pk__in=stale).delete()
+    return len(missing), len(stale)
+
+
+def drifted():
+    """QuerySet بالصفوف اللي عداداتها مختلفة عن المصدر (مع expected_visits / expected_clients)."""
+    return (ArchiveWeekly.objects
+            .annotate(expected_visits=Coalesce(_expected_visits(), Value(0)),
+                      expected_clients=Coalesce(_expected_clients(), Value(0)))
+            .filter(~Q(total_visits=F('expected_visits')) | ~Q(unique_clients=F('expected_clients'))))
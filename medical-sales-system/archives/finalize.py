@@ -0,0 +1,157 @@
+# archives/finalize.py
+"""
+Finalize أسابيع لكل المندوبين مرة واحدة (finalize_week = نفس الحاجة لزوج واحد):
+
+1) candidates: query واحدة — ROW_NUMBER() OVER (PARTITION BY rep, week) على WeeklyPlan
+   اللي ليها DailyVisit + Client live لنفس (rep, week) → زوج واحد + خطته المرجعية في كل صف.
+2) الـ reps بتتقسم chunks، وكل chunk في transaction لوحده:
+   upsert لصفوف ArchiveWeekly + فهرس البحث بتاعها (counters.upsert_weeks)، soft-delete بـ UPDATE واحد لكل جدول،
+   WeeklyPlan → Archived (+ updated_at وفهرس البحث)، و adherence.freeze (upsert واحد).
+3) timings_ms لكل مرحلة (مجموع الـ chunks) + زمن الكتابة الفعلي (wall).
+
+الـ chunks بتتوزع على med/fanout بس لو الـ backend بيسمح بأكتر من writer في نفس الوقت.
+على SQLite (WAL = writer واحد) الـ transactions المتوازية بتستنى بعض أو تفشل بـ
+"database is locked"، فبتشتغل ورا بعض في نفس الـ thread.
+"""
+import time
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from clientsapp.models import Client
+from dashboardapp import rollup
+from dashboardapp.cache import bump as bump_dashboard
+from med import fanout
+from plans.models import WeeklyPlan
+from search import index as search_index
+from visits.models import DailyVisit
+from . import adherence, counters
+from .sync import FIELD_MAP, plan_defaults
+
+FINAL_STATUS = 'Completed'
+CHUNK_REPS = 20
+PHASES = ('archive', 'soft_delete', 'rollup', 'plans', 'adherence')
+
+
+def _live(model, week_field='week_number'):
+    return Exists(model.objects.filter(rep_id=OuterRef('rep_id'), is_deleted=False,
+                                       **{week_field: OuterRef('week_number')}))
+
+
+def candidates(weeks, rep_ids=None):
+    """[{rep_id, week_number, <حقول الخطة المرجعية>}] — زوج جاهز للأرشفة في كل صف."""
+    qs = WeeklyPlan.objects.filter(week_number__in=list(weeks), rep__isnull=False)
+    if rep_ids is not None:
+        qs = qs.filter(rep_id__in=list(rep_ids))
+    return list(qs
+                .filter(_live(DailyVisit), _live(Client))
+                .annotate(rn=Window(RowNumber(),
+                                    partition_by=[F('rep_id'), F('week_number')],
+                                    order_by=[F('planned_date').asc(), F('id').asc()]))
+                .filter(rn=1)
+                .values('rep_id', 'week_number', *FIELD_MAP.values()))
+
+
+def _pairs_q(pairs, week_field='week_number'):
+    """OR بـ شرط واحد لكل أسبوع: week = w AND rep_id IN (...)."""
+    by_week = defaultdict(list)
+    for rep_id, week_no in pairs:
+        by_week[week_no].append(rep_id)
+    q = Q(pk__in=[])
+    for week_no, reps in by_week.items():
+        q |= Q(rep_id__in=reps, **{week_field: week_no})
+    return q
+
+
+def _finalize_chunk(plans, now):
+    timings = dict.fromkeys(PHASES, 0.0)
+    t = time.perf_counter()
+
+    def lap(name):
+        nonlocal t
+        cur = time.perf_counter()
+        timings[name] += (cur - t) * 1000
+        t = cur
+
+    pairs = [(p['rep_id'], p['week_number']) for p in plans]
+    where = _pairs_q(pairs)
+    with transaction.atomic():
+        # العدادات incremental — بتتعد مرة واحدة جوه الـ INSERT لو الصف جديد؛
+        # status حقل بحث → upsert_weeks بيعمل reindex لصفوف الأرشيف
+        counters.upsert_weeks([(r, w, plan_defaults(p, FINAL_STATUS)) for (r, w), p in zip(pairs, plans)],
+                              update_fields=[*FIELD_MAP, 'status'])
+        lap('archive')
+
+        dv = DailyVisit.objects.filter(where, is_deleted=False)
+        touched = rollup.keys_for(dv)
+        n_visits = dv.update(is_deleted=True, deleted_at=now, deleted_by=F('rep'))
+        n_clients = Client.objects.filter(where, is_deleted=False).update(
+            is_deleted=True, deleted_at=now, deleted_by=F('rep'))
+        lap('soft_delete')
+
+        rollup.rebuild_keys(touched)
+        lap('rollup')
+
+        # updated_at علشان الـ sync feed يبعت tombstone، و status حقل بحث → reindex
+        archived = WeeklyPlan.objects.filter(where)
+        plan_ids = list(archived.values_list('pk', flat=True))
+        archived.update(status='Archived', updated_at=now)
+        search_index.index_objects(
+            WeeklyPlan, list(WeeklyPlan.objects.filter(pk__in=plan_ids).select_related('rep')))
+        lap('plans')
+
+        # Planned vs actual يتجمّد (الداشبورد بيقراه من WeeklyAdherence بعد كده)
+        adherence.freeze(pairs)
+        lap('adherence')
+
+    return {'pairs': len(pairs), 'visits': n_visits, 'clients': n_clients, 'timings': timings}
+
+
+def _parallel_writes():
+    # SQLite: writer واحد في المرة — التوازي هنا بيجيب lock waits مش سرعة
+    return connection.vendor != 'sqlite'
+
+
+def finalize(weeks, rep_ids=None, chunk_reps=CHUNK_REPS):
+    """
+    يأرشف كل (rep, week) جاهز في weeks. يرجّع
+    {'pairs', 'reps', 'chunks', 'visits', 'clients', 'timings_ms': {candidates, <PHASES>, write, total}}.
+    """
+    started = time.perf_counter()
+    plans = candidates(weeks, rep_ids)
+    timings = {'candidates': round((time.perf_counter() - started) * 1000, 1)}
+
+    chunk_reps = max(1, chunk_reps)
+    by_rep = defaultdict(list)
+    for p in plans:
+        by_rep[p['rep_id']].append(p)
+    reps = sorted(by_rep)
+    chunks = [[p for r in reps[i:i + chunk_reps] for p in by_rep[r]]
+              for i in range(0, len(reps), chunk_reps)]
+
+    now = timezone.now()
+    t = time.perf_counter()
+    if _parallel_writes():
+        results = fanout.run({i: (lambda c=c: _finalize_chunk(c, now)) for i, c in enumerate(chunks)})
+    else:
+        results = {i: _finalize_chunk(c, now) for i, c in enumerate(chunks)}
+    timings['write'] = round((time.perf_counter() - t) * 1000, 1)
+
+    for phase in PHASES:
+        timings[phase] = round(sum(r['timings'][phase] for r in results.values()), 1)
+    timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+
+    if plans:
+        # update() مش بيطلق signals — نسخ كاش الداشبورد يدوي
+        bump_dashboard('clients', 'plans')
+    return {
+        'pairs': len(plans),
+        'reps': len(reps),
+        'chunks': len(chunks),
+        'visits': sum(r['visits'] for r in results.values()),
+        'clients': sum(r['clients'] for r in results.values()),
+        'timings_ms': timings,
+    }
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from archives import tasks
+from archives.finalize import CHUNK_REPS, candidates
+
+
+class Command(BaseCommand):
+    help = "يأرشف أسبوع (أو أكتر) لكل المندوبين مرة واحدة — نفس finalize_week بس batch، مع تقرير timings."
+
+    def add_arguments(self, parser):
+        parser.add_argument('weeks', nargs='+', type=int, help="أرقام الأسابيع.")
+        parser.add_argument('--chunk-reps', type=int, default=CHUNK_REPS,
+                            help="عدد المندوبين في كل chunk (كل chunk في transaction لوحده؛ بالتوازي بس على backend بيدعم أكتر من writer).")
+        parser.add_argument('--dry-run', action='store_true', help="اعرض الأزواج الجاهزة بس.")
+        parser.add_argument('--enqueue', action='store_true', help="حطها جوب في الطابور بدل التنفيذ هنا.")
+
+    def handle(self, *args, **opts):
+        weeks = opts['weeks']
+        if opts['dry_run']:
+            pairs = sorted((p['week_number'], p['rep_id']) for p in candidates(weeks))
+            for week_no, rep_id in pairs:
+                self.stdout.write(f"W{week_no} rep={rep_id}")
+            self.stdout.write(f"{len(pairs)} pair(s) ready")
+            return
+        if opts['enqueue']:
+            job = tasks.enqueue_finalize(weeks, opts['chunk_reps'])
+            self.stdout.write(self.style.SUCCESS(f"Enqueued job #{job.pk}" if job else "Ran eagerly."))
+            return
+        res = tasks.finalize_weeks(weeks, opts['chunk_reps'])
+        self.stdout.write(self.style.SUCCESS(tasks.format_report(res)))
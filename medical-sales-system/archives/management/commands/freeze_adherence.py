@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from archives import adherence
+from archives.models import WeeklyAdherence
+
+
+class Command(BaseCommand):
+    help = "يجمّد Planned vs actual لكل أسبوع متأرشف لسه مش متجمّد. --refresh يعيد حساب المتجمّد كمان."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--refresh', action='store_true', help="أعد حساب كل الأسابيع المتجمّدة من المصدر.")
+
+    def handle(self, *args, **opts):
+        with transaction.atomic():
+            n = adherence.freeze_archived()
+            if opts['refresh']:
+                n += adherence.freeze(WeeklyAdherence.objects.values_list('rep_id', 'week_no'))
+        self.stdout.write(self.style.SUCCESS(f"Frozen weeks: {n}"))
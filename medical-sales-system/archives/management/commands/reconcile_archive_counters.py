@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from archives import counters
+
+
+class Command(BaseCommand):
+    help = "يقارن عدادات ArchiveWeekly (total_visits / unique_clients) بالمصدر ويبلّغ عن أي drift. --fix يصلّح."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="صلّح جدول العضوية والعدادات.")
+        parser.add_argument('--limit', type=int, default=20, help="أقصى عدد صفوف drift تتطبع.")
+
+    def handle(self, *args, **opts):
+        fix = opts['fix']
+
+        with transaction.atomic():
+            missing, stale = counters.rebuild_memberships(dry_run=not fix)
+            self.stdout.write(f"Memberships: {missing} missing, {stale} stale" + (" (fixed)" if fix else ""))
+
+            rows = list(counters.drifted().values(
+                'id', 'rep_id', 'week_no', 'total_visits', 'expected_visits', 'unique_clients', 'expected_clients',
+            ))
+            for r in rows[:opts['limit']]:
+                self.stdout.write(
+                    f"  #{r['id']} rep={r['rep_id']} week={r['week_no']}: "
+                    f"visits {r['total_visits']} → {r['expected_visits']}, "
+                    f"clients {r['unique_clients']} → {r['expected_clients']}"
+                )
+            if len(rows) > opts['limit']:
+                self.stdout.write(f"  … and {len(rows) - opts['limit']} more")
+
+            if fix and rows:
+                counters.recount({(r['rep_id'], r['week_no']) for r in rows})
+
+        msg = f"Drifted rows: {len(rows)}" + (" (fixed)" if fix and rows else "")
+        self.stdout.write(self.style.SUCCESS(msg) if not rows or fix else self.style.WARNING(msg))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from archives import sync
+
+
+class Command(BaseCommand):
+    help = "يزامن ArchiveWeekly من WeeklyPlan (approved) — نفس POST /archives/sync/ بس من الـ CLI."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=sync.BATCH_SIZE)
+
+    def handle(self, *args, **opts):
+        res = sync.sync(batch_size=opts['batch_size'])
+        t = res['timings_ms']
+        self.stdout.write(
+            f"created={res['created']} touched={res['touched']}"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"plans {t['plans']}ms · existing {t['existing']}ms · "
+                               f"write {t['write']}ms · total {t['total']}ms")
+        )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from archives import coldstore
+
+
+class Command(BaseCommand):
+    help = ("ينقل الأرشيف القديم والزيارات/العملاء المحذوفين (soft-delete) الأقدم من الـ horizon "
+            "لـ segments مضغوطة في ARCHIVE_COLD_DIR.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="الـ horizon بالأيام (افتراضي ARCHIVE_COLD_AFTER_DAYS).")
+        parser.add_argument('--dry-run', action='store_true', help="عدّ بس من غير نقل.")
+        parser.add_argument('--batch-size', type=int, default=coldstore.BATCH_SIZE)
+
+    def handle(self, *args, **opts):
+        res = coldstore.move(days=opts['days'], dry_run=opts['dry_run'], batch_size=opts['batch_size'])
+        self.stdout.write(f"cutoff={res['cutoff']}")
+        if res['recovered']:
+            self.stdout.write(self.style.WARNING(f"recovered {res['recovered']} pending segment(s)"))
+        for label in coldstore.ORDER:
+            info = res['tables'].get(label)
+            if not info:
+                self.stdout.write(f"{label}: nothing to move")
+            elif opts['dry_run']:
+                self.stdout.write(f"{label}: {info['rows']} row(s) would move")
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{label}: {info['rows']} row(s) → {info['file']} "
+                    f"({info['bytes']} bytes, {res['timings_ms'][label]}ms)"
+                ))
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    """عضوية (rep, week, client) من الداتا الحالية + إعادة حساب العدادات مرة واحدة."""
+    from django.db.models import Count
+    DailyVisit = apps.get_model('visits', 'DailyVisit')
+    Client = apps.get_model('clientsapp', 'Client')
+    ArchiveWeekly = apps.get_model('archives', 'ArchiveWeekly')
+    Member = apps.get_model('archives', 'ArchiveWeeklyClient')
+
+    triples = set(
+        DailyVisit.objects.filter(rep__isnull=False, week_number__isnull=False, client__isnull=False)
+                          .values_list('rep_id', 'week_number', 'client_id').distinct()
+    ) | set(
+        Client.objects.filter(rep__isnull=False, week_number__isnull=False)
+                      .values_list('rep_id', 'week_number', 'id').distinct()
+    )
+    Member.objects.bulk_create(
+        [Member(rep_id=r, week_no=w, client_id=c) for r, w, c in triples],
+        ignore_conflicts=True, batch_size=1000,
+    )
+
+    visits = {(r['rep_id'], r['week_number']): r['n'] for r in
+              DailyVisit.objects.values('rep_id', 'week_number').annotate(n=Count('id'))}
+    clients = {(r['rep_id'], r['week_no']): r['n'] for r in
+               Member.objects.values('rep_id', 'week_no').annotate(n=Count('id'))}
+    rows = list(ArchiveWeekly.objects.all())
+    for aw in rows:
+        aw.total_visits = visits.get((aw.rep_id, aw.week_no), 0)
+        aw.unique_clients = clients.get((aw.rep_id, aw.week_no), 0)
+    ArchiveWeekly.objects.bulk_update(rows, ['total_visits', 'unique_clients'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archives', '0004_archiveweekly_total_visits_and_more'),
+        ('clientsapp', '0003_alter_client_options_remove_client_weekly_plan'),
+        ('visits', '0006_remove_dailyvisit_doctor_name_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveWeeklyClient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_no', models.PositiveSmallIntegerField()),
+                ('added_at', models.DateTimeField(auto_now_add=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_weeks', to='clientsapp.client')),
+                ('rep', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_week_clients', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('rep', 'week_no', 'client'), name='archives_week_client_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archives', '0005_archiveweeklyclient'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyAdherence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_no', models.PositiveSmallIntegerField()),
+                ('planned', models.PositiveIntegerField(default=0)),
+                ('started', models.PositiveIntegerField(default=0)),
+                ('visits', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0)),
+                ('client_linked', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('rep', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_adherence', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['week_no'], name='archives_we_week_no_918582_idx')],
+                'constraints': [models.UniqueConstraint(fields=('rep', 'week_no'), name='archives_adherence_uniq')],
+            },
+        ),
+    ]
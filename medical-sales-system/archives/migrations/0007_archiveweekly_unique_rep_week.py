@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:05
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def dedupe(apps, schema_editor):
+    """
+    يسيب أقدم صف (أصغر id) لكل (rep, week_no) ويمسح الباقي — DELETE واحد.
+    العدادات ما بتتجمعش: كل نسخة كانت بتتحدث بنفس الـ F() update فالقيم واحدة.
+    """
+    ArchiveWeekly = apps.get_model('archives', 'ArchiveWeekly')
+    older = ArchiveWeekly.objects.filter(
+        rep_id=OuterRef('rep_id'), week_no=OuterRef('week_no'), id__lt=OuterRef('id'),
+    )
+    (ArchiveWeekly.objects
+     .filter(rep__isnull=False, week_no__isnull=False)
+     .filter(Exists(older))
+     .delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archives', '0006_weeklyadherence'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='archiveweekly',
+            constraint=models.UniqueConstraint(fields=('rep', 'week_no'), name='archives_week_rep_uniq'),
+        ),
+    ]
@@ -37,8 +37,10 @@ class ArchiveWeekly(models.Model):
             models.Index(fields=['planned_date']),
             models.Index(fields=['rep']),
         ]
-        # لو عايز تمنع تكرار سنابشوتات كتير لنفس الأسبوع ونفس الـrep، فكّ الكومنت اللي تحت:
-        # unique_together = (('week_no', 'rep', 'planned_date'),)
+        constraints = [
+            # صف واحد لكل (rep, week_no) — الكتابة كلها upsert (archives.counters.upsert_week)
+            models.UniqueConstraint(fields=['rep', 'week_no'], name='archives_week_rep_uniq'),
+        ]
 
     def __str__(self):
         repname = getattr(self.rep, 'username', '—')
@@ -49,3 +51,50 @@ class ArchiveWeekly(models.Model):
     @property
     def week_number(self):
         return self.week_no
+
+
+class ArchiveWeeklyClient(models.Model):
+    """
+    عضوية (rep, week_no, client) — مصدر unique_clients في ArchiveWeekly.
+    صف واحد لكل عميل في الأسبوع، فالـ distinct بيبقى مجرد COUNT على الجدول ده.
+    """
+    rep      = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_week_clients')
+    week_no  = models.PositiveSmallIntegerField()
+    client   = models.ForeignKey('clientsapp.Client', on_delete=models.CASCADE, related_name='archive_weeks')
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['rep', 'week_no', 'client'], name='archives_week_client_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Week {self.week_no} — rep {self.rep_id} — client {self.client_id}"
+
+
+class WeeklyAdherence(models.Model):
+    """
+    Planned vs actual لأسبوع اتقفل (finalize_week) — صف واحد لكل (rep, week_no).
+    الأسابيع المفتوحة بتتحسب live (archives/adherence.py)؛ بعد الأرشفة الأرقام بتتجمّد هنا.
+    """
+    rep           = models.ForeignKey(User, on_delete=models.CASCADE, related_name='weekly_adherence')
+    week_no       = models.PositiveSmallIntegerField()
+
+    planned       = models.PositiveIntegerField(default=0)   # WeeklyPlan approved/archived
+    started       = models.PositiveIntegerField(default=0)   # منهم اللي ليه DailyVisit واحدة على الأقل
+    visits        = models.PositiveIntegerField(default=0)   # DailyVisit في الأسبوع
+    completed     = models.PositiveIntegerField(default=0)   # منهم Completed / Deal
+    client_linked = models.PositiveIntegerField(default=0)   # منهم مربوط بعميل
+
+    computed_at   = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['rep', 'week_no'], name='archives_adherence_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['week_no']),
+        ]
+
+    def __str__(self):
+        return f"Week {self.week_no} — rep {self.rep_id}: {self.started}/{self.planned}"
@@ -0,0 +1,41 @@
+# archives/signals.py
+"""
+تحديث عدادات ArchiveWeekly مع كل زيارة/عميل (archives.counters).
+post_init بيحفظ (rep, week, client) القديمة علشان save بيغيّرهم ينقل العدّ (visits_moved).
+الـ bulk paths (bulk_create/bulk_update) مش بتطلق signals — بتنادي counters بنفسها.
+"""
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from visits.models import DailyVisit
+from clientsapp.models import Client
+from . import counters
+
+
+@receiver(post_init, sender=DailyVisit)
+def remember_archive_key(sender, instance, **kwargs):
+    counters.snapshot(instance)
+
+
+@receiver(post_save, sender=DailyVisit)
+def count_visit(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        counters.visit_added(instance.rep_id, instance.week_number)
+        counters.snapshot(instance)
+    # الزيارة اتنقلت (rep / week / client) → العدّ والعضوية من القديم للجديد
+    elif counters.visits_moved([instance]):
+        return
+    # ربط عميل بالزيارة (عند الإنشاء أو أي save بيلمس client)
+    if instance.client_id and (created or update_fields is None or 'client' in update_fields):
+        counters.link_client(instance.rep_id, instance.week_number, instance.client_id)
+
+
+@receiver(post_delete, sender=DailyVisit)
+def uncount_visit(sender, instance, **kwargs):
+    counters.visit_removed(instance.rep_id, instance.week_number)
+
+
+@receiver(post_save, sender=Client)
+def count_client(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or {'rep', 'week_number'} & set(update_fields):
+        counters.link_client(instance.rep_id, instance.week_number, instance.pk)
@@ -0,0 +1,93 @@
+# archives/sync.py
+"""
+مزامنة ArchiveWeekly من WeeklyPlan (approved) — set-based:
+
+1) query واحدة بـ ROW_NUMBER() OVER (PARTITION BY rep, week ORDER BY planned_date, id)
+   → الخطة المرجعية لكل (rep, week_number).
+2) query واحدة بمفاتيح الأرشيف الموجودة (للتقرير بس: created / touched).
+3) upsert واحد لكل batch: INSERT … ON CONFLICT (rep_id, week_no) DO UPDATE (counters.upsert_weeks)
+   — الجديد بيتعدّ جوه نفس الـ INSERT، والموجود بيتحدث من غير ما العدادات تتلمس،
+   وفهرس البحث بيتحدث للصفوف اللي اتكتبت (bulk_create مش بيطلق post_save).
+   مفيش merge للتكرار: (rep, week_no) unique في الداتابيز.
+
+عدد الـ queries ثابت تقريباً مهما كان عدد الأزواج (بيكبر بس مع batch_size).
+بيتنادى من POST /archives/sync/ ومن: python manage.py sync_archives
+"""
+import time
+
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from plans.models import WeeklyPlan
+from .models import ArchiveWeekly
+from . import counters
+
+# حقول ArchiveWeekly ← حقول WeeklyPlan
+FIELD_MAP = {
+    'planned_date': 'planned_date',
+    'aa_plan': 'aa_plan',
+    'targeted_line': 'product_line',
+    'entity_type': 'entity_type',
+    'specialization': 'specialization',
+    'visit_objective': 'visit_objective',
+    'entity_address': 'entity_address',
+    'notes': 'notes',
+}
+SYNC_FIELDS = [*FIELD_MAP, 'status']
+SYNC_STATUS = 'Approved'
+BATCH_SIZE = 500
+
+
+def reference_plans():
+    """أول خطة approved (planned_date ثم id) لكل (rep, week_number) — query واحدة."""
+    return (WeeklyPlan.objects
+            .filter(status='approved')
+            .annotate(rn=Window(RowNumber(),
+                                partition_by=[F('rep_id'), F('week_number')],
+                                order_by=[F('planned_date').asc(), F('id').asc()]))
+            .filter(rn=1)
+            .values('rep_id', 'week_number', *FIELD_MAP.values()))
+
+
+def plan_defaults(plan, status=SYNC_STATUS):
+    """قيم ArchiveWeekly من صف خطة (values بأسماء WeeklyPlan)."""
+    d = {dst: plan[src] for dst, src in FIELD_MAP.items()}
+    d['status'] = status
+    return d
+
+
+def sync(batch_size=BATCH_SIZE):
+    """
+    يرجّع {'created', 'touched', 'timings_ms': {...}}.
+    created = أزواج ما كانش ليها صف؛ touched = أزواج ليها صف موجود واتحدثت.
+    """
+    timings = {}
+    t = time.perf_counter()
+
+    def lap(name):
+        nonlocal t
+        now = time.perf_counter()
+        timings[name] = round((now - t) * 1000, 1)
+        t = now
+
+    refs = {(p['rep_id'], p['week_number']): plan_defaults(p) for p in reference_plans()}
+    lap('plans')
+
+    with transaction.atomic():
+        existing = set(ArchiveWeekly.objects
+                       .filter(rep__isnull=False, week_no__in={w for _, w in refs})
+                       .values_list('rep_id', 'week_no'))
+        touched = len(existing & refs.keys())
+        lap('existing')
+
+        counters.upsert_weeks(((r, w, vals) for (r, w), vals in refs.items()),
+                              update_fields=SYNC_FIELDS, batch_size=batch_size)
+        lap('write')
+
+    timings['total'] = round(sum(timings.values()), 1)
+    return {
+        'created': len(refs) - touched,
+        'touched': touched,
+        'timings_ms': timings,
+    }
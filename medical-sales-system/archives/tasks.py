@@ -0,0 +1,41 @@
+# archives/tasks.py
+"""
+جوبات الخلفية الخاصة بالأرشيف (بتتنفذ عن طريق jobs.queue / run_jobs).
+"""
+import logging
+
+from jobs.queue import enqueue
+from .finalize import CHUNK_REPS, finalize
+
+logger = logging.getLogger(__name__)
+
+FINALIZE_TASK = 'archives.tasks.finalize_weeks'
+
+
+def enqueue_finalize(weeks, chunk_reps=None):
+    """
+    يحط finalize أسابيع (لكل المندوبين) في الطابور.
+    key بالأسابيع → طلبين ورا بعض لنفس الأسابيع = تشغيل واحد.
+    """
+    weeks = sorted({int(w) for w in weeks if w})
+    if not weeks:
+        return None
+    payload = {"weeks": weeks}
+    if chunk_reps:
+        payload["chunk_reps"] = chunk_reps
+    return enqueue(FINALIZE_TASK, payload, key="finalize:" + ",".join(map(str, weeks)))
+
+
+def format_report(res):
+    t = res['timings_ms']
+    phases = " · ".join(f"{name} {t[name]}ms" for name in ('candidates', 'archive', 'soft_delete',
+                                                          'rollup', 'plans', 'adherence'))
+    return (f"pairs={res['pairs']} reps={res['reps']} chunks={res['chunks']} "
+            f"visits={res['visits']} clients={res['clients']}\n"
+            f"{phases} · write (wall) {t['write']}ms · total {t['total']}ms")
+
+
+def finalize_weeks(weeks, chunk_reps=None):
+    res = finalize(weeks, chunk_reps=chunk_reps or CHUNK_REPS)
+    logger.info("finalize_weeks %s\n%s", weeks, format_report(res))
+    return res
@@ -1,3 +1,425 @@
-from django.test import TestCase
+import json
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from clientsapp.models import Client
+from dashboardapp.models import VisitDailyRollup
+from plans.models import WeeklyPlan
+from search import index as search_index
+from visits.models import DailyVisit
+from . import coldstore, counters, finalize, sync as archive_sync
+from .models import ArchiveWeekly, ArchiveWeeklyClient, WeeklyAdherence
+from .utils import finalize_week
+
+WEEK = 42
+DAY = date(2025, 10, 13)
+
+
+def make_plan(rep, week=WEEK, status='approved'):
+    return WeeklyPlan.objects.create(
+        rep=rep, planned_date=DAY, aa_plan='Plan', product_line='Line', entity_address='Addr',
+        entity_type='Hospital', specialization='Surgery', visit_objective='Demo',
+        week_number=week, status=status,
+    )
+
+
+def make_client(rep, week=WEEK):
+    # bulk_create: من غير signal الكاسكيد اللي بيأرشف العميل أول ما يتسجل
+    return Client.objects.bulk_create([Client(rep=rep, week_number=week, doctor_name=f'Dr {rep.username}')])[0]
+
+
+class FinalizeTests(TestCase):
+    """finalize / finalize_week على كذا مندوب: العدادات، الـ soft-delete، الـ rollup والـ adherence."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reps = [User.objects.create_user(f'fin_rep{i}', password='x') for i in range(3)]
+        cls.plans = {}
+        for rep in cls.reps:
+            cls.plans[rep.pk] = make_plan(rep)
+            client = make_client(rep) if rep is not cls.reps[2] else None
+            DailyVisit.objects.create(rep=rep, weekly_plan=cls.plans[rep.pk], week_number=WEEK,
+                                      visit_date=DAY, entity='E1', visit_status='Completed', client=client)
+            DailyVisit.objects.create(rep=rep, weekly_plan=cls.plans[rep.pk], week_number=WEEK,
+                                      visit_date=DAY, entity='E2', visit_status='Postponed')
+        # أسبوع تاني لنفس المندوب — ما يتلمسش
+        cls.other_week = DailyVisit.objects.create(rep=cls.reps[0], week_number=WEEK + 1,
+                                                   visit_date=DAY, entity='Next')
+
+    def test_finalize_all_reps(self):
+        before = timezone.now()
+        res = finalize.finalize([WEEK], chunk_reps=1)
+        # المندوب التالت مالوش Client → مش جاهز
+        self.assertEqual((res['pairs'], res['reps'], res['chunks']), (2, 2, 2))
+        self.assertEqual((res['visits'], res['clients']), (4, 2))
+        done, pending = self.reps[:2], self.reps[2]
+
+        for rep in done:
+            week = ArchiveWeekly.objects.get(rep=rep, week_no=WEEK)
+            self.assertEqual((week.status, week.total_visits, week.unique_clients), ('Completed', 2, 1))
+            self.assertFalse(DailyVisit.objects.filter(rep=rep, week_number=WEEK, is_deleted=False).exists())
+            self.assertFalse(Client.objects.filter(rep=rep, is_deleted=False).exists())
+            plan = WeeklyPlan.objects.get(pk=self.plans[rep.pk].pk)
+            self.assertEqual(plan.status, 'Archived')
+            self.assertGreaterEqual(plan.updated_at, before)
+            roll = VisitDailyRollup.objects.filter(rep=rep, visit_date=DAY)
+            self.assertEqual(sum(r.archived for r in roll), 2)
+            adh = WeeklyAdherence.objects.get(rep=rep, week_no=WEEK)
+            self.assertEqual((adh.planned, adh.started, adh.visits, adh.completed, adh.client_linked),
+                             (1, 1, 2, 1, 1))
+
+        self.assertFalse(DailyVisit.objects.filter(rep=pending, is_deleted=True).exists())
+        self.assertEqual(WeeklyPlan.objects.get(pk=self.plans[pending.pk].pk).status, 'approved')
+        self.assertFalse(WeeklyAdherence.objects.filter(rep=pending).exists())
+        self.assertFalse(DailyVisit.objects.get(pk=self.other_week.pk).is_deleted)
+
+        # الأسبوع اتقفل — مفيش أزواج جاهزة تاني
+        self.assertEqual(finalize.finalize([WEEK])['pairs'], 0)
+
+    def test_status_change_is_reindexed(self):
+        finalize.finalize([WEEK])
+        found = search_index.search_queryset(WeeklyPlan.objects.all(), 'Archived', rank=False)
+        self.assertEqual({p.rep_id for p in found}, {r.pk for r in self.reps[:2]})
+
+    def test_archive_status_is_reindexed(self):
+        # صف موجود قبل الـ finalize (Approve) بحالة قديمة
+        counters.upsert_week(self.reps[0].pk, WEEK, {'status': 'Approved'})
+        finalize.finalize([WEEK])
+        found = search_index.search_queryset(ArchiveWeekly.objects.all(), 'Completed', rank=False)
+        self.assertEqual({w.rep_id for w in found}, {r.pk for r in self.reps[:2]})
+        self.assertFalse(search_index.search_queryset(ArchiveWeekly.objects.all(), 'Approved', rank=False).exists())
+
+    def test_sqlite_chunks_run_sequentially(self):
+        calls = []
+        real_run = finalize.fanout.run
+
+        def run(tasks):
+            calls.append(set(tasks))
+            return real_run(tasks)
+
+        with mock.patch.object(finalize, '_parallel_writes', return_value=False), \
+                mock.patch.object(finalize.fanout, 'run', side_effect=run):
+            self.assertEqual(finalize.finalize([WEEK], chunk_reps=1)['chunks'], 2)
+        # fanout بيتنادى بس للقراية جوه adherence — مش للـ chunks
+        self.assertNotIn({0, 1}, calls)
+
+    def test_finalize_week_single_pair(self):
+        pending = self.reps[2]
+        self.assertFalse(finalize_week(WEEK, pending))
+        make_client(pending)
+        self.assertTrue(finalize_week(WEEK, pending))
+        self.assertEqual(ArchiveWeekly.objects.get(rep=pending, week_no=WEEK).total_visits, 2)
+        self.assertEqual(WeeklyAdherence.objects.get(rep=pending, week_no=WEEK).planned, 1)
+        # باقي المندوبين ما اتلمسوش
+        self.assertFalse(ArchiveWeekly.objects.filter(rep__in=self.reps[:2]).exists())
+
+
+class CounterMoveTests(TestCase):
+    """save / bulk_update بيغيّر (rep, week, client) لزيارة → العدّ والعضوية بيتنقلوا."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rep = User.objects.create_user('move_rep', password='x')
+        cls.other = User.objects.create_user('move_other', password='x')
+        cls.manager = User.objects.create_user('move_mgr', password='x')
+        cls.manager.groups.add(Group.objects.get_or_create(name='Manager')[0])
+        for rep, week in ((cls.rep, WEEK), (cls.rep, WEEK + 1), (cls.other, WEEK)):
+            counters.ensure_week(rep.pk, week)
+        # عملاء من غير rep/week — العضوية بتتسند على الزيارات بس
+        cls.c1, cls.c2 = Client.objects.bulk_create([Client(doctor_name='Dr One'), Client(doctor_name='Dr Two')])
+
+    def setUp(self):
+        self.visit = DailyVisit.objects.create(rep=self.rep, week_number=WEEK, visit_date=DAY,
+                                               entity='Move', client=self.c1)
+
+    def week(self, rep, week=WEEK):
+        w = ArchiveWeekly.objects.get(rep=rep, week_no=week)
+        return w.total_visits, w.unique_clients
+
+    def members(self):
+        return set(ArchiveWeeklyClient.objects.values_list('rep_id', 'week_no', 'client_id'))
+
+    def test_week_change_moves_counts(self):
+        self.assertEqual(self.week(self.rep), (1, 1))
+        self.visit.week_number = WEEK + 1
+        self.visit.save()
+        self.assertEqual(self.week(self.rep), (0, 0))
+        self.assertEqual(self.week(self.rep, WEEK + 1), (1, 1))
+        self.assertEqual(self.members(), {(self.rep.pk, WEEK + 1, self.c1.pk)})
+        self.assertFalse(counters.drifted().exists())
+
+    def test_rep_change_with_update_fields(self):
+        self.visit.rep = self.other
+        self.visit.save(update_fields=['rep'])
+        self.assertEqual(self.week(self.rep), (0, 0))
+        self.assertEqual(self.week(self.other), (1, 1))
+        self.assertFalse(counters.drifted().exists())
+
+    def test_client_change_swaps_membership(self):
+        self.visit.client = self.c2
+        self.visit.save()
+        self.assertEqual(self.week(self.rep), (1, 1))
+        self.assertEqual(self.members(), {(self.rep.pk, WEEK, self.c2.pk)})
+
+    def test_membership_kept_while_supported(self):
+        DailyVisit.objects.create(rep=self.rep, week_number=WEEK, visit_date=DAY, entity='Same', client=self.c1)
+        self.visit.week_number = WEEK + 1
+        self.visit.save()
+        self.assertEqual(self.week(self.rep), (1, 1))
+        self.assertIn((self.rep.pk, WEEK, self.c1.pk), self.members())
+        self.assertFalse(counters.drifted().exists())
+
+    def test_unchanged_key_is_noop(self):
+        self.visit.entity = 'Renamed'
+        self.visit.save()
+        self.assertEqual(self.week(self.rep), (1, 1))
+        self.assertEqual(self.members(), {(self.rep.pk, WEEK, self.c1.pk)})
+
+    def test_bulk_save_moves_counts(self):
+        self.client.force_login(self.manager)
+        resp = self.client.post(
+            reverse('visits:api_bulk_save'),
+            json.dumps({'rows': [{'id': self.visit.pk, 'rep': self.other.pk, 'client_id': self.c2.pk,
+                                  'visit_date': DAY.isoformat(), 'visit_status': 'Postponed'}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertTrue(resp.json()['ok'], resp.content)
+        self.assertEqual(self.week(self.rep), (0, 0))
+        self.assertEqual(self.week(self.other), (1, 1))
+        self.assertEqual(self.members(), {(self.other.pk, WEEK, self.c2.pk)})
+        self.assertFalse(counters.drifted().exists())
+
+
+class ColdStoreTests(TestCase):
+    """tier_cold: النقل والقراية تاني، recovery لـ segment فضل pending، والـ hot بيكسب الـ cold."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rep = User.objects.create_user('cold_rep', password='x')
+        old = timezone.now() - timedelta(days=800)
+        counters.ensure_week(cls.rep.pk, 10, {'status': 'Completed', 'notes': 'Old week'})
+        ArchiveWeekly.objects.update(archived_at=old)
+        cls.visit = DailyVisit.objects.create(rep=cls.rep, week_number=10, visit_date=old.date(), entity='Cold visit')
+        DailyVisit.objects.filter(pk=cls.visit.pk).update(is_deleted=True, deleted_at=old)
+        cls.client_row = Client.objects.bulk_create([Client(
+            rep=cls.rep, week_number=10, doctor_name='Dr Cold', is_deleted=True, deleted_at=old)])[0]
+        # أسبوع حديث — يفضل hot
+        counters.ensure_week(cls.rep.pk, 40)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cold_dir = override_settings(ARCHIVE_COLD_DIR=tmp.name)
+        cold_dir.enable()
+        self.addCleanup(cold_dir.disable)
+
+    def test_move_then_read_back(self):
+        res = coldstore.move(days=365)
+        self.assertEqual({label: t['rows'] for label, t in res['tables'].items()},
+                         {coldstore.ARCHIVE: 1, coldstore.VISITS: 1, coldstore.CLIENTS: 1})
+        self.assertEqual(list(ArchiveWeekly.objects.values_list('week_no', flat=True)), [40])
+        self.assertFalse(DailyVisit.objects.filter(pk=self.visit.pk).exists())
+        self.assertFalse(Client.objects.filter(pk=self.client_row.pk).exists())
+        self.assertFalse(ArchiveWeeklyClient.objects.filter(client_id=self.client_row.pk).exists())
+        # الأسبوع اتجمّد قبل ما يروح cold
+        self.assertTrue(WeeklyAdherence.objects.filter(rep=self.rep, week_no=10).exists())
+
+        [aw] = coldstore.archive_rows()
+        self.assertEqual((aw.week_no, aw.status, aw.rep.username), (10, 'Completed', 'cold_rep'))
+        self.assertEqual([aw.pk for aw in coldstore.archive_rows(q='old week')], [aw.pk])
+        self.assertEqual(coldstore.archive_rows(q='missing'), [])
+        [row] = coldstore.rows(coldstore.VISITS)
+        self.assertEqual((row['id'], row['entity'], row['visit_date']),
+                         (self.visit.pk, 'Cold visit', self.visit.visit_date))
+        # مدى تواريخ برّه الـ segment → مفيش صفوف
+        future = timezone.localdate()
+        self.assertEqual(list(coldstore.rows(coldstore.VISITS, {'visit_date': (future, None)})), [])
+        self.assertTrue(all(s['state'] == 'done' for s in coldstore.load_manifest()['segments']))
+
+    def test_recover_pending_segment_with_hot_rows(self):
+        ids = list(ArchiveWeekly.objects.filter(week_no=10).values_list('pk', flat=True))
+        # نقل اتقطع بعد الـ segment والـ manifest وقبل الـ DELETE
+        seg = coldstore._write_segment(coldstore.ARCHIVE, 1, coldstore._iter_rows(ArchiveWeekly, ids, 100))
+        coldstore._save_manifest({'segments': [seg]})
+        path = coldstore._root() / seg['file']
+        self.assertTrue(path.exists())
+        # الصفوف لسه hot → القراية بتتجاهل الـ segment
+        self.assertEqual(coldstore.archive_rows(), [])
+
+        self.assertEqual(coldstore.recover(), 1)
+        self.assertFalse(path.exists())
+        self.assertEqual(coldstore.load_manifest()['segments'], [])
+        self.assertEqual(ArchiveWeekly.objects.filter(pk__in=ids).count(), 1)
+
+    def test_recover_marks_pending_done_when_rows_gone(self):
+        coldstore.move(days=365)
+        manifest = coldstore.load_manifest()
+        for seg in manifest['segments']:
+            seg['state'] = 'pending'
+        coldstore._save_manifest(manifest)
+        self.assertEqual(coldstore.recover(), 3)
+        self.assertTrue(all(s['state'] == 'done' for s in coldstore.load_manifest()['segments']))
+        self.assertEqual(len(coldstore.archive_rows()), 1)
+
+    def test_hot_row_wins_over_cold(self):
+        coldstore.move(days=365)
+        self.assertEqual(len(coldstore.archive_rows()), 1)
+        # الأسبوع رجع hot (sync / approve) → نسخة الـ cold ما تظهرش
+        counters.ensure_week(self.rep.pk, 10, {'status': 'approved'})
+        self.assertEqual(coldstore.archive_rows(), [])
+
+
+class ArchiveSyncTests(TestCase):
+    """sync(): خطة مرجعية لكل (rep, week)، upsert من غير تكرار، والعدادات بتتلمس بس للصفوف الجديدة."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rep = User.objects.create_user('sync_arch_rep', password='x')
+        cls.manager = User.objects.create_user('sync_arch_mgr', password='x')
+        cls.manager.groups.add(Group.objects.get_or_create(name='Manager')[0])
+        first = make_plan(cls.rep, week=5)
+        WeeklyPlan.objects.filter(pk=first.pk).update(planned_date=date(2025, 1, 27), notes='first')
+        make_plan(cls.rep, week=5)                       # نفس الأسبوع، تاريخ أحدث
+        make_plan(cls.rep, week=6)
+        make_plan(cls.rep, week=7, status='rejected')    # مش approved → ما يتزامنش
+        for _ in range(2):
+            DailyVisit.objects.create(rep=cls.rep, week_number=5, visit_date=DAY, entity='S')
+        # صف موجود بعداد متزوّد يدوي — الـ sync ما يلمسش العدادات
+        counters.ensure_week(cls.rep.pk, 6, {'status': 'old'})
+        ArchiveWeekly.objects.filter(week_no=6).update(total_visits=9)
+
+    def test_sync_creates_and_touches(self):
+        res = archive_sync.sync()
+        self.assertEqual((res['created'], res['touched']), (1, 1))
+        self.assertEqual(sorted(ArchiveWeekly.objects.values_list('week_no', flat=True)), [5, 6])
+
+        w5 = ArchiveWeekly.objects.get(week_no=5)
+        self.assertEqual((w5.planned_date, w5.notes, w5.status), (date(2025, 1, 27), 'first', 'Approved'))
+        self.assertEqual(w5.total_visits, 2)
+        w6 = ArchiveWeekly.objects.get(week_no=6)
+        self.assertEqual((w6.status, w6.targeted_line, w6.total_visits), ('Approved', 'Line', 9))
+
+        again = archive_sync.sync()
+        self.assertEqual((again['created'], again['touched']), (0, 2))
+        self.assertEqual(ArchiveWeekly.objects.count(), 2)
+
+    def test_synced_rows_are_searchable(self):
+        archive_sync.sync()
+        hits = search_index.search_queryset(ArchiveWeekly.objects.all(), 'Approved', rank=False)
+        self.assertEqual(sorted(w.week_no for w in hits), [5, 6])
+        # الصف الموجود (status 'old') اتعمله reindex بعد التحديث
+        self.assertFalse(search_index.search_queryset(ArchiveWeekly.objects.all(), 'old', rank=False).exists())
+        # تعديل حقل بحث في الخطة → sync تاني يحدّث الفهرس
+        WeeklyPlan.objects.filter(week_number=6).update(aa_plan='Maadi Surgical')
+        archive_sync.sync()
+        hits = search_index.search_queryset(ArchiveWeekly.objects.all(), 'Maadi')
+        self.assertEqual([w.week_no for w in hits], [6])
+
+    def test_query_count_independent_of_pairs(self):
+        with CaptureQueriesContext(connection) as small:
+            archive_sync.sync()
+        for week in range(20, 40):
+            make_plan(self.rep, week=week)
+        with self.assertNumQueries(len(small)):
+            res = archive_sync.sync()
+        self.assertEqual(res['created'], 20)
+
+    def test_view_requires_post(self):
+        self.client.force_login(self.manager)
+        self.assertEqual(self.client.get(reverse('archives:sync')).status_code, 405)
+        resp = self.client.post(reverse('archives:sync'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['created'], 1)
+
+
+class UpsertWeekTests(TestCase):
+    """(rep, week_no) unique + upsert_week(s): INSERT … ON CONFLICT بدل get_or_create."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rep = User.objects.create_user('upsert_rep', password='x')
+        client = make_client(cls.rep, week=3)
+        for _ in range(3):
+            DailyVisit.objects.create(rep=cls.rep, week_number=3, visit_date=DAY, entity='U', client=client)
+
+    def test_insert_counts_from_source(self):
+        counters.upsert_week(self.rep.pk, 3, {'status': 'Approved', 'notes': 'n1'})
+        w = ArchiveWeekly.objects.get(rep=self.rep, week_no=3)
+        self.assertEqual((w.total_visits, w.unique_clients, w.notes), (3, 1, 'n1'))
+
+    def test_conflict_updates_defaults_not_counters(self):
+        counters.upsert_week(self.rep.pk, 3, {'status': 'Approved'})
+        ArchiveWeekly.objects.update(total_visits=7)
+        counters.upsert_week(self.rep.pk, 3, {'status': 'Completed', 'notes': 'n2'})
+        w = ArchiveWeekly.objects.get(rep=self.rep, week_no=3)
+        self.assertEqual((w.status, w.notes, w.total_visits), ('Completed', 'n2', 7))
+        self.assertEqual(ArchiveWeekly.objects.count(), 1)
+
+    def test_ensure_week_keeps_existing(self):
+        counters.upsert_week(self.rep.pk, 3, {'status': 'Approved'})
+        counters.ensure_week(self.rep.pk, 3, {'status': 'Other'})
+        self.assertEqual(ArchiveWeekly.objects.get(rep=self.rep, week_no=3).status, 'Approved')
+
+    def test_batch_and_skips_incomplete_keys(self):
+        n = counters.upsert_weeks([(self.rep.pk, 3, {}), (self.rep.pk, 4, {}), (None, 4, {}), (self.rep.pk, None, {})],
+                                  batch_size=1)
+        self.assertEqual(n, 2)
+        self.assertEqual(dict(ArchiveWeekly.objects.values_list('week_no', 'total_visits')), {3: 3, 4: 0})
+
+    def test_upserted_row_is_searchable(self):
+        counters.upsert_week(self.rep.pk, 3, {'status': 'Approved', 'aa_plan': 'Zamalek Oncology'})
+        hits = search_index.search_queryset(ArchiveWeekly.objects.all(), 'Zamalek')
+        self.assertEqual([(w.rep_id, w.week_no) for w in hits], [(self.rep.pk, 3)])
+        # update على حقل بحث في الـ conflict → الفهرس بيتبع
+        counters.upsert_week(self.rep.pk, 3, {'aa_plan': 'Heliopolis Cardio'})
+        self.assertFalse(search_index.search_queryset(ArchiveWeekly.objects.all(), 'Zamalek').exists())
+        self.assertEqual(search_index.search_queryset(ArchiveWeekly.objects.all(), 'upsert_rep').count(), 1)
+
+    def test_duplicate_insert_rejected(self):
+        counters.ensure_week(self.rep.pk, 3)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ArchiveWeekly.objects.create(rep=self.rep, week_no=3)
+
+
+class DedupeMigrationTests(TransactionTestCase):
+    """0007: الصفوف المكررة لنفس (rep, week_no) بتتشال (الأقدم بيفضل) قبل الـ constraint."""
+
+    before = [('archives', '0006_weeklyadherence')]
+    after = [('archives', '0007_archiveweekly_unique_rep_week')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        # رجّع الـ schema لآخر migration
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_dedupe_keeps_oldest(self):
+        old_apps = self.migrate(self.before)
+        Archive = old_apps.get_model('archives', 'ArchiveWeekly')
+        rep = old_apps.get_model('auth', 'User').objects.create(username='dup_rep')
+        keep = Archive.objects.create(rep_id=rep.pk, week_no=1, notes='keep')
+        Archive.objects.create(rep_id=rep.pk, week_no=1, notes='dup')
+        Archive.objects.create(rep_id=rep.pk, week_no=1, notes='dup')
+        other = Archive.objects.create(rep_id=rep.pk, week_no=2)
+        orphans = [Archive.objects.create(rep=None, week_no=1).pk for _ in range(2)]
+
+        new_apps = self.migrate(self.after)
+        Archive = new_apps.get_model('archives', 'ArchiveWeekly')
+        self.assertEqual(sorted(Archive.objects.values_list('pk', flat=True)),
+                         sorted([keep.pk, other.pk, *orphans]))
+        self.assertEqual(Archive.objects.get(pk=keep.pk).notes, 'keep')
@@ -1,22 +1,19 @@
 # archives/views.py
 from datetime import timedelta
-import csv
 
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.views.decorators.http import require_POST
 from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
-from django.db.models import Q
-from django.db import transaction
+from django.http import JsonResponse
 
 from .models import ArchiveWeekly
-from plans.models import WeeklyPlan  # للـ sync
-
-
-# ---- صلاحيات ----
-def is_manager(u):
-    return u.is_authenticated and u.groups.filter(name='Manager').exists()
+from . import coldstore, sync as archive_sync
+from search.index import search_queryset
+from med import fanout
+from med.exports import csv_response, wants_csv
+from accounts.roles import is_manager
 
 
 # ---- صفحة الأرشيف (فلاتر + جدول + Export CSV + KPIs) ----
@@ -26,14 +23,17 @@ def archives_list(request):
     """
     صفحة الأرشيف + فلاتر + Export CSV
     (تم فصل السِنك في فيو مستقل: POST /archives/sync/)
+    الصفوف اللي اتنقلت للـ cold tier (archives/coldstore.py) بتتدمج بنفس الفلاتر.
     """
     qs = ArchiveWeekly.objects.all()
+    since = None
 
     # Quick range by archived_at (افتراضي 365 يوم)
     quick = request.GET.get('quick', '365')
     if quick.isdigit():
         days = int(quick)
-        qs = qs.filter(archived_at__gte=timezone.now() - timedelta(days=days))
+        since = timezone.now() - timedelta(days=days)
+        qs = qs.filter(archived_at__gte=since)
 
     # فلاتر تاريخ الـ planned_date
     d_from = request.GET.get('from')
@@ -46,71 +46,59 @@ def archives_list(request):
     # بحث نصي
     q = request.GET.get('q', '').strip()
     if q:
-        qs = qs.filter(
-            Q(rep__username__icontains=q) |
-            Q(entity_type__icontains=q) |
-            Q(specialization__icontains=q) |
-            Q(visit_objective__icontains=q) |
-            Q(entity_address__icontains=q) |  # بدل address/account
-            Q(notes__icontains=q) |
-            Q(status__icontains=q) |
-            Q(aa_plan__icontains=q) |
-            Q(targeted_line__icontains=q)
-        )
-
-    # ----- Export CSV (يحترم نفس الفلاتر) -----
-    if request.GET.get('export') == 'csv':
-        resp = HttpResponse(content_type='text/csv; charset=utf-8')
-        resp['Content-Disposition'] = 'attachment; filename="archives.csv"'
-
-        # BOM عشان Excel يقرأ UTF-8 عربي صح
-        resp.write('\ufeff')
+        # الفلترة بالفهرس؛ الترتيب بيتحدد تحت (archived_at) فمش محتاجين relevance
+        qs = search_queryset(qs, q, rank=False)
 
-        # lineterminator لتفادي سطر فاضي في ويندوز/Excel
-        w = csv.writer(resp, lineterminator='\n')
+    # cold tier: الـ manifest بيحدد الـ segments اللي مداها داخل الفلتر (الافتراضي غالباً ولا واحد)
+    cold = coldstore.archive_rows({
+        'archived_at': (since, None),
+        'planned_date': (_parse_day(d_from), _parse_day(d_to)),
+    }, q)
 
-        w.writerow([
-            '#', 'Archived At', 'Planned Date', 'Week #', 'Rep', 'Aa Plan',
-            'Targeted Line', 'Entity Type', 'Specialization', 'Visit Objective',
-            'Address', 'Notes', 'Status'
-        ])
-        for r in qs.order_by('-archived_at', '-id'):
-            w.writerow([
-                r.id,
-                r.archived_at.strftime('%Y-%m-%d %H:%M:%S') if r.archived_at else '',
-                r.planned_date or '',
-                r.week_no or '',
-                (r.rep.get_username() if r.rep_id else ''),
-                r.aa_plan or '',
-                r.targeted_line or '',
-                r.entity_type or '',
-                r.specialization or '',
-                r.visit_objective or '',
-                r.entity_address or '',  # الاسم النهائي بدل r.address
-                r.notes or '',
-                r.status or '',
-            ])
-        return resp
-
-    # KPIs
-    k_rows = qs.count()
-    k_reps = qs.values('rep_id').distinct().count()
-    k_accounts = qs.exclude(entity_address='').values('entity_address').distinct().count()  # بدل account
-    k_last = qs.order_by('-archived_at').values_list('archived_at', flat=True).first()
-
-    # Rows للجدول
-    rows = qs.order_by('-archived_at', '-id')[:500]
-
-    ctx = {
-        'rows': rows,
-        'k_rows': k_rows,
-        'k_reps': k_reps,
-        'k_accounts': k_accounts,
-        'k_last': k_last,
+    # ----- Export CSV (يحترم نفس الفلاتر) -----
+    if wants_csv(request):
+        # BOM عشان Excel يقرأ UTF-8 عربي صح + lineterminator لتفادي سطر فاضي في ويندوز/Excel
+        return csv_response(qs.order_by('-archived_at', '-id'), [
+            ('#', 'id'),
+            ('Archived At', 'archived_at', lambda d: d.strftime('%Y-%m-%d %H:%M:%S') if d else ''),
+            ('Planned Date', 'planned_date'), ('Week #', 'week_no'), ('Rep', 'rep__username'),
+            ('Aa Plan', 'aa_plan'), ('Targeted Line', 'targeted_line'), ('Entity Type', 'entity_type'),
+            ('Specialization', 'specialization'), ('Visit Objective', 'visit_objective'),
+            ('Address', 'entity_address'),  # الاسم النهائي بدل r.address
+            ('Notes', 'notes'), ('Status', 'status'),
+        ], 'archives.csv', bom=True, lineterminator='\n', tail=cold)
+
+    # KPIs + Rows للجدول — queries مستقلة بالتوازي (med/fanout.py)
+    tasks = {
+        'k_rows': lambda: qs.count(),
+        'k_reps': lambda: qs.values('rep_id').distinct().count(),
+        'k_accounts': lambda: qs.exclude(entity_address='').values('entity_address').distinct().count(),  # بدل account
+        'k_last': lambda: qs.order_by('-archived_at').values_list('archived_at', flat=True).first(),
+        'rows': lambda: list(qs.select_related('rep').order_by('-archived_at', '-id')[:500]),
     }
+    if cold:
+        # الـ distinct لازم يبقى على الاتحاد (hot ∪ cold) — فبنجيب القيم نفسها بدل العدد
+        tasks['k_reps'] = lambda: set(qs.values_list('rep_id', flat=True).distinct())
+        tasks['k_accounts'] = lambda: set(qs.exclude(entity_address='')
+                                            .values_list('entity_address', flat=True).distinct())
+    ctx = fanout.run(tasks)
+
+    if cold:
+        ctx['k_rows'] += len(cold)
+        ctx['k_reps'] = len(ctx['k_reps'] | {aw.rep_id for aw in cold})
+        ctx['k_accounts'] = len(ctx['k_accounts'] | {aw.entity_address for aw in cold if aw.entity_address})
+        ctx['k_last'] = ctx['k_last'] or cold[0].archived_at
+        ctx['rows'] = sorted(ctx['rows'] + cold[:500], key=lambda aw: (aw.archived_at, aw.pk), reverse=True)[:500]
     return render(request, 'archives/archives.html', ctx)
 
 
+def _parse_day(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
 # ---- مزامنة من الويكلي للأرشيف (POST فقط) ----
 @login_required
 @user_passes_test(is_manager)
@@ -118,67 +106,7 @@ def archives_list(request):
 def sync_archives(request):
     """
     يعمل Snapshot/توحيد للأرشيف لكل (rep, week_no) موجودين في WeeklyPlan بحالة approved.
-    يتعامل مع الدوبلكيت: يدمج العدادات ويحذف الزيادات.
-    يرجّع JSON بدل HTML علشان الفرونت مايكسرش.
+    set-based (archives/sync.py): الخطة المرجعية بـ window query واحدة، و upsert (ON CONFLICT) لكل batch.
+    يرجّع JSON بدل HTML علشان الفرونت مايكسرش (ومعاه timings_ms لكل مرحلة).
     """
-    created = 0
-    merged  = 0
-    touched = 0
-
-    # كل الأزواج (rep_id, week_number) الموثّقة approved
-    pairs = (WeeklyPlan.objects
-             .filter(status='approved')
-             .values('rep_id', 'week_number')
-             .distinct())
-
-    for row in pairs:
-        rep_id  = row['rep_id']
-        week_no = row['week_number']
-
-        # أي Plan مرجعية لنفس الأسبوع لتعبئة التفاصيل
-        p = (WeeklyPlan.objects
-             .filter(rep_id=rep_id, week_number=week_no, status='approved')
-             .order_by('planned_date', 'id')
-             .first())
-
-        defaults = {
-            'planned_date'   : getattr(p, 'planned_date', None),
-            'aa_plan'        : getattr(p, 'aa_plan', ''),
-            'targeted_line'  : getattr(p, 'product_line', ''),
-            'entity_type'    : getattr(p, 'entity_type', ''),
-            'specialization' : getattr(p, 'specialization', ''),
-            'visit_objective': getattr(p, 'visit_objective', ''),
-            'entity_address' : getattr(p, 'entity_address', ''),
-            'notes'          : getattr(p, 'notes', ''),
-            'status'         : 'Approved',
-        }
-
-        with transaction.atomic():
-            qs = ArchiveWeekly.objects.select_for_update().filter(rep_id=rep_id, week_no=week_no).order_by('id')
-            if not qs.exists():
-                ArchiveWeekly.objects.create(rep_id=rep_id, week_no=week_no, **defaults)
-                created += 1
-            else:
-                aw = qs.first()
-                # حدّث الحقول من آخر خطة (نقدر نسيبها كما هي لو تحب)
-                for k, v in defaults.items():
-                    try:
-                        setattr(aw, k, v)
-                    except Exception:
-                        pass
-                aw.save()
-                touched += 1
-
-                dups = qs.exclude(id=aw.id)
-                if dups.exists():
-                    for e in dups:
-                        # دمج عدادات لو موديلك يحتويها
-                        if hasattr(aw, 'total_visits') and hasattr(e, 'total_visits'):
-                            aw.total_visits = (aw.total_visits or 0) + (e.total_visits or 0)
-                        if hasattr(aw, 'unique_clients') and hasattr(e, 'unique_clients'):
-                            aw.unique_clients = (aw.unique_clients or 0) + (e.unique_clients or 0)
-                        e.delete()
-                    aw.save()
-                    merged += 1
-
-    return JsonResponse({'ok': True, 'created': created, 'merged': merged, 'touched': touched})
\ No newline at end of file
+    return JsonResponse({'ok': True, **archive_sync.sync()})
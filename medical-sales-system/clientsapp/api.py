@@ -3,23 +3,30 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.views.decorators.http import require_GET, require_POST
 from django.utils import timezone
-from django.db.models import Q
 from .models import Client
 from plans.models import WeeklyPlan
 from visits.models import DailyVisit
-
-def _is_manager(u):
-    return u.is_authenticated and u.groups.filter(name='Manager').exists()
+from search.index import search_queryset
+from med.serializers import Projection, json_response, wants_ndjson, ndjson_response, NDJSON_CHUNK_SIZE
+
+CLIENT_FIELDS = Projection(
+    id="id",
+    entity_name="entity_name",
+    doctor_name="doctor_name",
+    phone="phone",
+    city="city",
+    is_deleted="is_deleted",
+)
 
 @login_required
 @require_GET
 def api_list(request):
-    """قائمة العملاء (تخفي المؤرشف افتراضياً). ?show=archived/all للمدير."""
+    """قائمة العملاء (تخفي المؤرشف افتراضياً). ?show=archived/all للمدير. ?format=ndjson → streaming من غير حد."""
     q    = (request.GET.get('q') or '').strip()
     show = (request.GET.get('show') or '').strip().lower()
     qs = Client.objects.order_by('-id')
 
-    if _is_manager(request.user):
+    if request.is_manager:
         if show == 'archived':
             qs = qs.filter(is_deleted=True)
         elif show == 'all':
@@ -30,22 +37,13 @@ def api_list(request):
         qs = qs.filter(is_deleted=False)
 
     if q:
-        qs = qs.filter(
-            Q(entity_name__icontains=q) | Q(doctor_name__icontains=q) |
-            Q(phone__icontains=q) | Q(city__icontains=q)
-        )
-
-    rows = []
-    for c in qs[:200]:
-        rows.append({
-            "id": c.id,
-            "entity_name": getattr(c, 'entity_name', ''),
-            "doctor_name": getattr(c, 'doctor_name', ''),
-            "phone": getattr(c, 'phone', ''),
-            "city": getattr(c, 'city', ''),
-            "is_deleted": c.is_deleted,
-        })
-    return JsonResponse({"rows": rows})
+        qs = search_queryset(qs, q)
+
+    # ?format=ndjson → كل العملاء streaming من غير الـ cap
+    if wants_ndjson(request):
+        return ndjson_response(CLIENT_FIELDS.iter(qs, chunk_size=NDJSON_CHUNK_SIZE))
+
+    return json_response({"rows": CLIENT_FIELDS.rows(qs[:200])})
 
 @login_required
 @require_POST
@@ -95,7 +93,7 @@ def api_finalize(request):
     # صلاحيات مبسّطة: المدير حر، الريب لازم يكون صاحب الزيارة والخطة
     from django.contrib.auth.models import User
     user = request.user
-    if not _is_manager(user):
+    if not request.is_manager:
         if getattr(v, 'rep_id', None) != user.id or getattr(p, 'rep_id', None) != user.id:
             return HttpResponseBadRequest("Not allowed")
 
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientsapp', '0003_alter_client_options_remove_client_weekly_plan'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['updated_at'], name='clientsapp__updated_bbd15e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['deleted_at'], name='clientsapp__deleted_5f3711_idx'),
+        ),
+    ]
@@ -3,20 +3,19 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.shortcuts import render, redirect
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.http import HttpResponseBadRequest
 from django.db.models import Q, Count, Max
 from django.utils import timezone
 from django.db import transaction
-import csv
 
 from .models import Client
 from plans.models import WeeklyPlan
 from visits.models import DailyVisit
 from archives.models import ArchiveWeekly
-
-
-def is_manager(u):
-    return u.is_authenticated and u.groups.filter(name='Manager').exists()
+from archives.counters import ensure_week
+from search.index import search_queryset
+from med.exports import csv_response, wants_csv
+from med.serializers import rep_display
 
 
 def _plans_for_week(rep, week_number):
@@ -29,7 +28,7 @@ def _plans_for_week(rep, week_number):
 
 @login_required
 def clients_list(request):
-    mgr  = is_manager(request.user)
+    mgr  = request.is_manager
     q    = (request.GET.get('q') or '').strip()
     wk   = (request.GET.get('week') or '').strip()
     show = (request.GET.get('show') or 'active').strip().lower()
@@ -50,17 +49,9 @@ def clients_list(request):
     if not mgr:
         qs = qs.filter(rep=request.user)
 
-    # Search
+    # Search (FTS index + relevance)
     if q:
-        qs = qs.filter(
-            Q(doctor_name__icontains=q) |
-            Q(entity_name__icontains=q) |
-            Q(city__icontains=q) |
-            Q(phone__icontains=q) |
-            Q(email__icontains=q) |
-            Q(status__icontains=q) |
-            Q(notes__icontains=q)
-        )
+        qs = search_queryset(qs, q)
 
     # Week filter
     if wk.isdigit():
@@ -86,24 +77,12 @@ def clients_list(request):
     dv_dropdown = dv_dropdown.order_by('-visit_date', '-id')
 
     # Export CSV
-    if request.GET.get('export') == 'csv':
-        resp = HttpResponse(content_type='text/csv; charset=utf-8')
-        resp['Content-Disposition'] = 'attachment; filename="clients.csv"'
-        w = csv.writer(resp)
-        w.writerow(['#','Doctor','Entity','City','Phone','Email','Status','Rep','Week #'])
-        for i, c in enumerate(qs, start=1):
-            w.writerow([
-                i,
-                c.doctor_name,
-                c.entity_name,
-                c.city,
-                c.phone,
-                c.email,
-                c.status,
-                (c.rep.get_full_name() or c.rep.username) if c.rep_id else '',
-                c.week_number or ''
-            ])
-        return resp
+    if wants_csv(request):
+        return csv_response(qs, [
+            ('Doctor', 'doctor_name'), ('Entity', 'entity_name'), ('City', 'city'),
+            ('Phone', 'phone'), ('Email', 'email'), ('Status', 'status'),
+            ('Rep', rep_display('rep')), ('Week #', 'week_number'),
+        ], 'clients.csv', numbered=True)
 
     # ---------------------- POST (Create/Edit + ARCHIVE IMMEDIATELY) ----------------------
     if request.method == 'POST':
@@ -179,32 +158,20 @@ def clients_list(request):
                 dv_obj.client = obj
                 dv_obj.save(update_fields=['client'])
 
-            # أنشئ/حدّث ArchiveWeekly لهذا الأسبوع (لو ما اتعملش وقت الـApprove)
-            aw, created_aw = ArchiveWeekly.objects.get_or_create(
-                rep=obj.rep, week_no=obj.week_number,
-                defaults={
-                    'planned_date'   : getattr(getattr(dv_obj, 'weekly_plan', None), 'planned_date', None) if dv_obj else None,
-                    'aa_plan'        : getattr(getattr(dv_obj, 'weekly_plan', None), 'aa_plan', '') if dv_obj else '',
-                    'targeted_line'  : getattr(getattr(dv_obj, 'weekly_plan', None), 'product_line', '') if dv_obj else '',
-                    'entity_type'    : getattr(getattr(dv_obj, 'weekly_plan', None), 'entity_type', '') if dv_obj else '',
-                    'specialization' : getattr(getattr(dv_obj, 'weekly_plan', None), 'specialization', '') if dv_obj else '',
-                    'visit_objective': getattr(getattr(dv_obj, 'weekly_plan', None), 'visit_objective', '') if dv_obj else '',
-                    'entity_address' : getattr(getattr(dv_obj, 'weekly_plan', None), 'entity_address', '') if dv_obj else '',
-                    'notes'          : getattr(getattr(dv_obj, 'weekly_plan', None), 'notes', '') if dv_obj else '',
-                    'status'         : 'Approved',  # اتعمل Approve قبل كده
-                    'total_visits'   : 0,
-                    'unique_clients' : 0,
-                }
-            )
-
-            # عدّل التعدادات (نزيد زيارة + عميل)
-            try:
-                aw.total_visits = (aw.total_visits or 0) + 1
-                aw.unique_clients = (aw.unique_clients or 0) + 1
-                # تقدر تكمل أي تحديثات إضافية حسب نموذجك
-                aw.save()
-            except Exception:
-                pass
+            # تأكد إن فيه ArchiveWeekly لهذا الأسبوع (لو ما اتعملش وقت الـApprove)
+            # التعدادات نفسها بتتحدث atomic من archives.counters (ربط العميل = +1 unique)
+            wp = getattr(dv_obj, 'weekly_plan', None) if dv_obj else None
+            ensure_week(obj.rep_id, obj.week_number, defaults={
+                'planned_date'   : getattr(wp, 'planned_date', None),
+                'aa_plan'        : getattr(wp, 'aa_plan', ''),
+                'targeted_line'  : getattr(wp, 'product_line', ''),
+                'entity_type'    : getattr(wp, 'entity_type', ''),
+                'specialization' : getattr(wp, 'specialization', ''),
+                'visit_objective': getattr(wp, 'visit_objective', ''),
+                'entity_address' : getattr(wp, 'entity_address', ''),
+                'notes'          : getattr(wp, 'notes', ''),
+                'status'         : 'Approved',  # اتعمل Approve قبل كده
+            })
 
             # Soft-delete للزيارة والعميل فورًا (يختفوا من النظام)
             now = timezone.now()
@@ -1,3 +1,10 @@
 from django.contrib import admin
+from .models import VisitDailyRollup
 
-# Register your models here.
+
+@admin.register(VisitDailyRollup)
+class VisitDailyRollupAdmin(admin.ModelAdmin):
+    list_display  = ('visit_date', 'rep', 'status_code', 'visits', 'deals', 'archived')
+    list_filter   = ('status_code', 'rep')
+    date_hierarchy = 'visit_date'
+    readonly_fields = ('rep', 'visit_date', 'status_code', 'visits', 'deals', 'archived')
@@ -0,0 +1,77 @@
+# dashboardapp/cache.py
+"""
+كاش الداشبورد بنسخ لكل جدول (versioned keys).
+
+- كل جدول الداشبورد بيقرا منه ليه counter في الكاش: visits / plans / clients / reps.
+- أي كتابة بتزوّد الـ counter (signals + مسارات الـ bulk/update عن طريق rollup أو bump()).
+- مفتاح الـ payload فيه النسخ الحالية → بعد أي كتابة المفتاح بيتغيّر والقديم بيموت لوحده.
+  فمفيش مسح يدوي ومفيش أرقام قديمة.
+- bump() جوه transaction بيستنى الـ commit (on_commit): لو النسخة زادت قبله، request في النص
+  هيقرا النسخة الجديدة مع الصفوف القديمة ويكيّشها تحت المفتاح الجديد. بعد الـ commit أي payload
+  اتبنى على النسخة القديمة بيموت مع الـ bump. لو حصل rollback مفيش bump أصلاً.
+
+ملحوظة: زي accounts/roles.py — مع LocMemCache الكاش لكل process؛ في الإنتاج مع أكتر من
+worker استخدم كاش مشترك علشان الـ bump يوصل للكل.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+TABLES = ('visits', 'plans', 'clients', 'reps')
+
+
+def _timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+
+
+def _vkey(table):
+    return f'dash:ver:{table}'
+
+
+def _fresh():
+    # لو الـ counter اتمسح من الكاش، نبدأ من رقم عمره ما اتستخدم قبل كده
+    return time.time_ns()
+
+
+def versions():
+    keys = [_vkey(t) for t in TABLES]
+    found = cache.get_many(keys)
+    out = []
+    for t, k in zip(TABLES, keys):
+        v = found.get(k)
+        if v is None:
+            cache.add(k, _fresh(), None)
+            v = cache.get(k)
+        out.append(v)
+    return tuple(out)
+
+
+def bump(*tables):
+    """جدول اتكتب فيه → كل payload معتمد عليه يبقى invalid (بعد الـ commit لو جوه transaction)."""
+    transaction.on_commit(lambda: _bump_now(tables))
+
+
+def _bump_now(tables):
+    for t in tables:
+        k = _vkey(t)
+        try:
+            cache.incr(k)
+        except ValueError:
+            cache.set(k, _fresh(), None)
+
+
+def key(parts):
+    raw = '|'.join(str(p) for p in (*parts, *versions()))
+    return 'dash:payload:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def get_or_build(parts, build):
+    k = key(parts)
+    data = cache.get(k)
+    if data is None:
+        data = build()
+        cache.set(k, data, _timeout())
+    return data
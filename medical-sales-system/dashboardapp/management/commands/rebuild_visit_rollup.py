@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboardapp import rollup
+
+
+class Command(BaseCommand):
+    help = "يعيد بناء جدول VisitDailyRollup من DailyVisit."
+
+    def handle(self, *args, **opts):
+        t0 = time.perf_counter()
+        n = rollup.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {n} rollup rows in {time.perf_counter() - t0:.2f}s."))
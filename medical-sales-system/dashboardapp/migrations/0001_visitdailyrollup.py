@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    """أول بناء للتجميعة من الزيارات الموجودة."""
+    from collections import defaultdict
+    from django.db.models import Count, Q
+    from django.db.models.functions import Lower, Trim
+    DailyVisit = apps.get_model('visits', 'DailyVisit')
+    Rollup = apps.get_model('dashboardapp', 'VisitDailyRollup')
+
+    deal = Q(visit_objective__iexact='deal closed') | Q(visit_status__iexact='deal closed')
+    agg = (DailyVisit.objects.order_by()
+           .values('rep_id', 'visit_date', st=Lower(Trim('visit_status')))
+           .annotate(n=Count('id'), deals=Count('id', filter=deal),
+                     archived=Count('id', filter=Q(is_deleted=True))))
+    merged = defaultdict(lambda: [0, 0, 0])
+    for r in agg:
+        m = merged[(r['rep_id'], r['visit_date'], (r['st'] or '')[:20])]
+        m[0] += r['n']; m[1] += r['deals']; m[2] += r['archived']
+    Rollup.objects.bulk_create(
+        [Rollup(rep_id=k[0], visit_date=k[1], status=k[2], visits=v[0], deals=v[1], archived=v[2])
+         for k, v in merged.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('visits', '0006_remove_dailyvisit_doctor_name_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visit_date', models.DateField()),
+                ('status', models.CharField(blank=True, max_length=20)),
+                ('visits', models.PositiveIntegerField(default=0)),
+                ('deals', models.PositiveIntegerField(default=0)),
+                ('archived', models.PositiveIntegerField(default=0)),
+                ('rep', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visit_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['visit_date'], name='dashboardap_visit_d_26e4d6_idx')],
+                'constraints': [models.UniqueConstraint(fields=('rep', 'visit_date', 'status'), name='dash_rollup_key_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
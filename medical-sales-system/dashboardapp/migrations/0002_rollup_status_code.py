@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def clear(apps, schema_editor):
+    # المفتاح القديم (نص) مالوش مقابل مباشر — بنفضّي ونبني من الأول
+    apps.get_model('dashboardapp', 'VisitDailyRollup').objects.all().delete()
+
+
+def rebuild(apps, schema_editor):
+    from django.db.models import Count, Q
+    DailyVisit = apps.get_model('visits', 'DailyVisit')
+    Rollup = apps.get_model('dashboardapp', 'VisitDailyRollup')
+    agg = (DailyVisit.objects.order_by()
+           .values('rep_id', 'visit_date', 'status_code')
+           .annotate(n=Count('id'), deals=Count('id', filter=Q(is_deal=True)),
+                     archived=Count('id', filter=Q(is_deleted=True))))
+    Rollup.objects.bulk_create(
+        [Rollup(rep_id=r['rep_id'], visit_date=r['visit_date'], status_code=r['status_code'],
+                visits=r['n'], deals=r['deals'], archived=r['archived'])
+         for r in agg if r['rep_id'] and r['visit_date']],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboardapp', '0001_visitdailyrollup'),
+        ('visits', '0008_dailyvisit_status_code'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(clear, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='visitdailyrollup',
+            name='dash_rollup_key_uniq',
+        ),
+        migrations.RemoveField(
+            model_name='visitdailyrollup',
+            name='status',
+        ),
+        migrations.AddField(
+            model_name='visitdailyrollup',
+            name='status_code',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'No status'), (1, 'Other'), (2, 'Not Completed'), (3, 'Postponed'), (4, 'Completed'), (5, 'Deal Closed')], default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='visitdailyrollup',
+            constraint=models.UniqueConstraint(fields=('rep', 'visit_date', 'status_code'), name='dash_rollup_key_uniq'),
+        ),
+        migrations.RunPython(rebuild, clear),
+    ]
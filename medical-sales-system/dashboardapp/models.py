@@ -1,3 +1,32 @@
+# dashboardapp/models.py
 from django.db import models
+from django.contrib.auth.models import User
 
-# Create your models here.
+from visits.models import VisitStatus
+
+
+class VisitDailyRollup(models.Model):
+    """
+    تجميعة يومية للزيارات لكل (rep, visit_date, status_code) — الداشبورد بيقرا منها بدل DailyVisit.
+    بتتحدث incrementally مع كل كتابة للزيارة (dashboardapp/rollup.py)،
+    ولإعادة بنائها: python manage.py rebuild_visit_rollup
+    """
+    rep        = models.ForeignKey(User, on_delete=models.CASCADE, related_name='visit_rollups')
+    visit_date = models.DateField()
+    # DailyVisit.status_code (VisitStatus) — NONE للزيارات من غير حالة
+    status_code = models.PositiveSmallIntegerField(choices=VisitStatus.choices, default=VisitStatus.NONE)
+
+    visits     = models.PositiveIntegerField(default=0)
+    deals      = models.PositiveIntegerField(default=0)   # DailyVisit.is_deal
+    archived   = models.PositiveIntegerField(default=0)   # منهم soft-deleted
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['rep', 'visit_date', 'status_code'], name='dash_rollup_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['visit_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.visit_date} — rep {self.rep_id} — {self.get_status_code_display()}: {self.visits}"
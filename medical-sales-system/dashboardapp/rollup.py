@@ -0,0 +1,148 @@
+# dashboardapp/rollup.py
+"""
+صيانة VisitDailyRollup.
+
+- كل DailyVisit بيساهم بـ (visits=1, deals=0/1, archived=0/1) في مفتاح (rep, visit_date, status_code).
+- signals (post_init/post_save/post_delete) بتحسب الفرق بين المفتاح القديم والجديد وتطبّقه بـ F().
+- المسارات اللي مش بتطلق signals (bulk_update / queryset.update) بتنادي apply() أو
+  keys_for() + rebuild_keys() بنفسها.
+- كل دالة كتابة هنا بتعمل bump لنسخة "visits" في كاش الداشبورد (dashboardapp/cache.py).
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from visits.models import DailyVisit
+from .models import VisitDailyRollup
+from . import cache as dash_cache
+
+_FIELDS = {'rep_id', 'visit_date', 'status_code', 'is_deal', 'is_deleted'}
+# instance متحمّل بـ only()/defer() — مش عارفين مساهمته القديمة من غير query
+_UNKNOWN = object()
+
+
+def _contribution(v):
+    """(key, (visits, deals, archived)) أو None لو الزيارة ناقصها rep/تاريخ."""
+    if not (v.rep_id and v.visit_date):
+        return None
+    return (v.rep_id, v.visit_date, v.status_code), (1, int(bool(v.is_deal)), int(bool(v.is_deleted)))
+
+
+def snapshot(v):
+    """يحفظ مساهمة الزيارة زي ما هي في الداتابيز (بيتنادى من post_init وبعد كل كتابة)."""
+    if not v.pk:
+        v._rollup = None
+    elif _FIELDS & {f.attname for f in v._meta.concrete_fields if f.attname not in v.__dict__}:
+        v._rollup = _UNKNOWN
+    else:
+        v._rollup = _contribution(v)
+
+
+def apply(visits):
+    """يطبّق الفرق (القديم → الجديد) لمجموعة زيارات بعد ما اتكتبت."""
+    deltas = defaultdict(lambda: [0, 0, 0])
+    unknown = set()
+    for v in visits:
+        old, new = getattr(v, '_rollup', None), _contribution(v)
+        if old is _UNKNOWN:
+            if new:
+                unknown.add(new[0][:2])
+            v._rollup = new
+            continue
+        if old == new:
+            continue
+        if old:
+            d = deltas[old[0]]
+            for i, n in enumerate(old[1]):
+                d[i] -= n
+        if new:
+            d = deltas[new[0]]
+            for i, n in enumerate(new[1]):
+                d[i] += n
+        v._rollup = new
+    _write(deltas)
+    if unknown:
+        rebuild_keys(unknown)
+    dash_cache.bump('visits')
+
+
+def remove(visits):
+    """زيارات اتمسحت من الداتابيز (hard delete)."""
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for v in visits:
+        old = getattr(v, '_rollup', None)
+        if old is None or old is _UNKNOWN:
+            old = _contribution(v)
+        if old:
+            d = deltas[old[0]]
+            for i, n in enumerate(old[1]):
+                d[i] -= n
+        v._rollup = None
+    _write(deltas)
+    dash_cache.bump('visits')
+
+
+def _write(deltas):
+    for (rep_id, day, code), (dv, dd, da) in deltas.items():
+        if not (dv or dd or da):
+            continue
+        qs = VisitDailyRollup.objects.filter(rep_id=rep_id, visit_date=day, status_code=code)
+        changes = dict(visits=F('visits') + dv, deals=F('deals') + dd, archived=F('archived') + da)
+        if qs.update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                VisitDailyRollup.objects.create(
+                    rep_id=rep_id, visit_date=day, status_code=code,
+                    visits=max(dv, 0), deals=max(dd, 0), archived=max(da, 0),
+                )
+        except IntegrityError:
+            # حد تاني عمل الصف في نفس اللحظة
+            qs.update(**changes)
+
+
+# ---------- Rebuild (set-based) ----------
+def _aggregate(qs):
+    return (qs.order_by()
+              .values('rep_id', 'visit_date', 'status_code')
+              .annotate(n=Count('id'),
+                        deals=Count('id', filter=Q(is_deal=True)),
+                        archived=Count('id', filter=Q(is_deleted=True))))
+
+
+def _rows(agg):
+    return [VisitDailyRollup(rep_id=r['rep_id'], visit_date=r['visit_date'], status_code=r['status_code'],
+                             visits=r['n'], deals=r['deals'], archived=r['archived'])
+            for r in agg if r['rep_id'] and r['visit_date']]
+
+
+def keys_for(qs):
+    """(rep, visit_date) اللي queryset بيلمسها — قبل queryset.update()."""
+    return set(qs.order_by().values_list('rep_id', 'visit_date').distinct())
+
+
+def rebuild_keys(pairs):
+    """يعيد حساب أيام معيّنة [(rep_id, visit_date), ...] من المصدر."""
+    pairs = list(pairs)
+    if not pairs:
+        return 0
+    where = Q(pk__in=[])
+    for rep_id, day in pairs:
+        where |= Q(rep_id=rep_id, visit_date=day)
+    with transaction.atomic():
+        VisitDailyRollup.objects.filter(where).delete()
+        rows = _rows(_aggregate(DailyVisit.objects.filter(where)))
+        VisitDailyRollup.objects.bulk_create(rows, batch_size=1000)
+    dash_cache.bump('visits')
+    return len(rows)
+
+
+def rebuild():
+    """إعادة بناء كاملة."""
+    with transaction.atomic():
+        VisitDailyRollup.objects.all().delete()
+        rows = _rows(_aggregate(DailyVisit.objects.all()))
+        VisitDailyRollup.objects.bulk_create(rows, batch_size=1000)
+    dash_cache.bump('visits')
+    return len(rows)
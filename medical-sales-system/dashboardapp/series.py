@@ -0,0 +1,90 @@
+# dashboardapp/series.py
+"""
+Downsampling لسلاسل الـ trend قبل ما تتبعت للشارت — حجم الـ payload ثابت (points) مهما كبر المدى.
+
+- lttb:   Largest-Triangle-Three-Buckets — بيحافظ على شكل المنحنى (الافتراضي)
+- minmax: أقل + أعلى نقطة في كل bucket — بيحافظ على الـ peaks
+
+الاتنين بيرجّعوا indices (مرتبة) فنفس الاختيار بيتطبّق على labels وكل السلاسل التانية.
+numpy اختياري: لو متسطّب الحسابات vectorized على الـ arrays، وإلا نسخة بايثون بنفس النتيجة.
+"""
+import math
+
+try:
+    import numpy as np
+except Exception:  # اختياري
+    np = None
+
+METHODS = ('lttb', 'minmax')
+
+
+def _lttb_bounds(L, n):
+    """(start, end, next_start, next_end) لكل bucket في النص (من غير أول وآخر نقطة)."""
+    every = (L - 2) / (n - 2)
+    for i in range(n - 2):
+        s = int(i * every) + 1
+        e = int((i + 1) * every) + 1
+        ne = max(min(int((i + 2) * every) + 1, L), e + 1)
+        yield s, e, e, ne
+
+
+def lttb_indices(ys, n):
+    L = len(ys)
+    if n >= L or n < 3:
+        return list(range(L))
+    out = [0]
+    a = 0
+    if np is not None:
+        y = np.asarray(ys, dtype=float)
+        for s, e, ns, ne in _lttb_bounds(L, n):
+            cx, cy = (ns + ne - 1) / 2.0, y[ns:ne].mean()
+            xs = np.arange(s, e)
+            area = np.abs((a - cx) * (y[s:e] - y[a]) - (a - xs) * (cy - y[a]))
+            a = s + int(area.argmax())
+            out.append(a)
+    else:
+        for s, e, ns, ne in _lttb_bounds(L, n):
+            cx, cy = (ns + ne - 1) / 2.0, sum(ys[ns:ne]) / (ne - ns)
+            best, best_area = s, -1.0
+            for b in range(s, e):
+                area = abs((a - cx) * (ys[b] - ys[a]) - (a - b) * (cy - ys[a]))
+                if area > best_area:
+                    best, best_area = b, area
+            a = best
+            out.append(a)
+    out.append(L - 1)
+    return out
+
+
+def minmax_indices(ys, n):
+    L = len(ys)
+    buckets = max(1, n // 2)
+    if n >= L or buckets >= L:
+        return list(range(L))
+    size = math.ceil(L / buckets)
+    # عدد الـ buckets الفعلي بعد تقريب الحجم لفوق — وإلا الصف الأخير ممكن يبقى كله nan
+    # (مثلاً L=11, n=10 → size=3 → 4 buckets مش 5) و nanargmin بيرمي ValueError
+    buckets = math.ceil(L / size)
+    if np is not None:
+        y = np.asarray(ys, dtype=float)
+        pad = size * buckets - L
+        # padding بـ nan → bucket أخير ناقص من غير ما يأثر على min/max
+        grid = np.concatenate([y, np.full(pad, np.nan)]).reshape(buckets, size)
+        base = np.arange(buckets) * size
+        lo = base + np.nanargmin(grid, axis=1)
+        hi = base + np.nanargmax(grid, axis=1)
+        picked = np.unique(np.concatenate([lo, hi]))
+        return [int(i) for i in picked if i < L]
+    picked = set()
+    for s in range(0, L, size):
+        chunk = ys[s:s + size]
+        picked.add(s + min(range(len(chunk)), key=chunk.__getitem__))
+        picked.add(s + max(range(len(chunk)), key=chunk.__getitem__))
+    return sorted(picked)
+
+
+def downsample(ys, points, method='lttb'):
+    """indices النقط اللي هتتبعت (≤ points تقريباً) — ys هي السلسلة الأساسية (visits)."""
+    if method == 'minmax':
+        return minmax_indices(ys, points)
+    return lttb_indices(ys, points)
@@ -0,0 +1,51 @@
+# dashboardapp/signals.py
+from django.contrib.auth.models import User
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from visits.models import DailyVisit
+from plans.models import WeeklyPlan
+from clientsapp.models import Client
+from reps.models import RepProfile
+from . import rollup
+from . import cache as dash_cache
+
+
+# ---------- التجميعة اليومية (بتعمل bump لنسخة visits بنفسها) ----------
+@receiver(post_init, sender=DailyVisit)
+def remember_rollup_key(sender, instance, **kwargs):
+    rollup.snapshot(instance)
+
+
+@receiver(post_save, sender=DailyVisit)
+def update_rollup(sender, instance, **kwargs):
+    rollup.apply([instance])
+
+
+@receiver(post_delete, sender=DailyVisit)
+def remove_from_rollup(sender, instance, **kwargs):
+    rollup.remove([instance])
+
+
+# ---------- نسخ كاش الداشبورد ----------
+@receiver(post_save, sender=WeeklyPlan)
+@receiver(post_delete, sender=WeeklyPlan)
+def bump_plans(sender, **kwargs):
+    dash_cache.bump('plans')
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def bump_clients(sender, **kwargs):
+    dash_cache.bump('clients')
+
+
+@receiver(post_save, sender=RepProfile)
+@receiver(post_delete, sender=RepProfile)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_reps(sender, update_fields=None, **kwargs):
+    # active reps + أسماء المندوبين في by-rep / recent / upcoming (تسجيل الدخول بس مش بيفرق)
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    dash_cache.bump('reps')
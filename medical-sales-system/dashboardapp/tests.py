@@ -1,3 +1,208 @@
-from django.test import TestCase
+from datetime import date
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from visits.models import DailyVisit, VisitStatus
+from . import cache as dash_cache, rollup, series
+from .models import VisitDailyRollup
+
+
+class CacheVersionTests(TestCase):
+    """نسخ كاش الداشبورد: الـ bump بيحصل بعد الـ commit بس."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('dash_mgr', password='x')
+        cls.manager.groups.add(Group.objects.get_or_create(name='Manager')[0])
+        cls.rep = User.objects.create_user('dash_rep', password='x')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def _total(self):
+        resp = self.client.get(reverse('dashboard:api_kpis'), {'range': '30'})
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()['total']
+
+    def _visit(self):
+        return DailyVisit.objects.create(rep=self.rep, visit_date=timezone.localdate(), entity='E')
+
+    def test_bump_waits_for_commit(self):
+        self.assertEqual(self._total(), 0)
+        v0 = dash_cache.versions()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                self._visit()
+                # لسه ما اتعملش commit: النسخة زي ما هي والـ payload القديم من الكاش
+                self.assertEqual(dash_cache.versions(), v0)
+                self.assertEqual(self._total(), 0)
+        self.assertTrue(callbacks)
+        self.assertNotEqual(dash_cache.versions(), v0)
+        self.assertEqual(self._total(), 1)
+
+    def test_rollback_does_not_bump(self):
+        self._total()
+        v0 = dash_cache.versions()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self._visit()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(dash_cache.versions(), v0)
+        self.assertEqual(self._total(), 0)
+
+    def test_payload_keyed_by_version(self):
+        built = []
+        build = lambda: built.append(1) or len(built)
+        self.assertEqual(dash_cache.get_or_build(('p',), build), 1)
+        self.assertEqual(dash_cache.get_or_build(('p',), build), 1)   # من الكاش
+        with self.captureOnCommitCallbacks(execute=True):
+            dash_cache.bump('visits')
+        self.assertEqual(dash_cache.get_or_build(('p',), build), 2)   # مفتاح جديد
+
+
+class HeatmapTests(TestCase):
+    """الـ heatmap بيعد الزيارات الـ live بس."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('heat_mgr', password='x')
+        cls.manager.groups.add(Group.objects.get_or_create(name='Manager')[0])
+        rep = User.objects.create_user('heat_rep', password='x')
+        day = timezone.localdate()
+        DailyVisit.objects.bulk_create([
+            DailyVisit(rep=rep, visit_date=day, entity='Live AM', time_shift='AM'),
+            DailyVisit(rep=rep, visit_date=day, entity='Live PM', time_shift='pm'),
+            DailyVisit(rep=rep, visit_date=day, entity='Archived', time_shift='AM',
+                       is_deleted=True, deleted_at=timezone.now()),
+        ])
+        cls.weekday = day.isoweekday() % 7   # 0 = Sunday زي HEAT_WEEKDAYS
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def test_soft_deleted_visits_excluded(self):
+        data = self.client.get(reverse('dashboard:api_heatmap'), {'range': '30'}).json()
+        self.assertEqual(data['total'], 2)
+        row = data['cells'][self.weekday]
+        self.assertEqual(row[data['shifts'].index('AM')], 1)
+        self.assertEqual(row[data['shifts'].index('PM')], 1)
+
+
+class RollupTests(TestCase):
+    """VisitDailyRollup: الـ deltas من الـ signals لازم تساوي rebuild من المصدر."""
+
+    DAY = date(2025, 3, 18)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rep = User.objects.create_user('roll_rep', password='x')
+
+    def state(self):
+        return {(r.rep_id, r.visit_date, r.status_code): (r.visits, r.deals, r.archived)
+                for r in VisitDailyRollup.objects.all() if r.visits or r.deals or r.archived}
+
+    def assertMatchesRebuild(self):
+        incremental = self.state()
+        rollup.rebuild()
+        self.assertEqual(incremental, self.state())
+        return incremental
+
+    def visit(self, **fields):
+        return DailyVisit.objects.create(rep=self.rep, visit_date=self.DAY, entity='R', **fields)
+
+    def test_save_paths(self):
+        v = self.visit(visit_status='Postponed')
+        deal = self.visit(visit_status='Deal Closed')
+        self.assertEqual(self.state()[(self.rep.pk, self.DAY, VisitStatus.DEAL)], (1, 1, 0))
+
+        v.visit_status = 'Completed'
+        v.save()
+        v.visit_date = date(2025, 3, 19)
+        v.save()
+        deal.is_deleted = True
+        deal.save(update_fields=['is_deleted'])
+        state = self.assertMatchesRebuild()
+        self.assertEqual(state, {
+            (self.rep.pk, date(2025, 3, 19), VisitStatus.DONE): (1, 0, 0),
+            (self.rep.pk, self.DAY, VisitStatus.DEAL): (1, 1, 1),
+        })
+
+        deal.delete()
+        self.assertEqual(self.assertMatchesRebuild(), {
+            (self.rep.pk, date(2025, 3, 19), VisitStatus.DONE): (1, 0, 0)})
+
+    def test_deferred_instance_falls_back_to_rebuild_keys(self):
+        v = self.visit(visit_status='Postponed')
+        partial = DailyVisit.objects.only('id', 'entity').get(pk=v.pk)
+        partial.visit_status = 'Completed'
+        partial.save()
+        self.assertMatchesRebuild()
+
+    def test_queryset_update_with_rebuild_keys(self):
+        for _ in range(3):
+            self.visit(visit_status='Completed')
+        qs = DailyVisit.objects.filter(rep=self.rep)
+        touched = rollup.keys_for(qs)
+        qs.update(is_deleted=True)
+        rollup.rebuild_keys(touched)
+        self.assertEqual(self.assertMatchesRebuild(),
+                         {(self.rep.pk, self.DAY, VisitStatus.DONE): (3, 0, 3)})
+
+    def test_dashboard_reads_rollup(self):
+        manager = User.objects.create_user('roll_mgr', password='x')
+        manager.groups.add(Group.objects.get_or_create(name='Manager')[0])
+        self.client.force_login(manager)
+        cache.clear()
+        DailyVisit.objects.create(rep=self.rep, visit_date=timezone.localdate(), entity='Today')
+        # صف مزروع في التجميعة من غير زيارة — الـ KPI لازم يقرا منها
+        VisitDailyRollup.objects.filter(rep=self.rep, visit_date=timezone.localdate()).update(visits=5)
+        resp = self.client.get(reverse('dashboard:api_kpis'), {'range': '30'})
+        self.assertEqual(resp.json()['total'], 5)
+
+
+class MinMaxDownsampleTests(SimpleTestCase):
+    """minmax_indices: نفس النتيجة بـ numpy ومن غيره، ومن غير bucket فاضي في الآخر."""
+
+    # أطوال الـ size المتقرّب فيها بيقلّل عدد الـ buckets (زي 151–222 نقطة على الـ 150 الافتراضية)
+    CASES = [(11, 10), (151, 150), (200, 150), (222, 150), (223, 150), (1000, 150), (7, 4)]
+
+    @staticmethod
+    def _ys(L):
+        return [(i * 37) % 11 + (i % 5) * 0.5 for i in range(L)]
+
+    def _check(self, L, n):
+        ys = self._ys(L)
+        idx = series.minmax_indices(ys, n)
+        self.assertEqual(idx, sorted(set(idx)))
+        self.assertTrue(0 <= idx[0] and idx[-1] < L)
+        self.assertLessEqual(len(idx), n)
+        # أعلى وأقل نقطة في السلسلة كلها لازم يفضلوا
+        self.assertIn(ys.index(max(ys)), idx)
+        self.assertIn(ys.index(min(ys)), idx)
+        return idx
+
+    def test_pure_python(self):
+        with mock.patch.object(series, 'np', None):
+            for L, n in self.CASES:
+                with self.subTest(L=L, n=n):
+                    self._check(L, n)
+            self.assertEqual(series.minmax_indices(list(range(11)), 10), [0, 2, 3, 5, 6, 8, 9, 10])
+
+    @skipUnless(series.np is not None, 'numpy مش متسطّب')
+    def test_numpy_matches_pure_python(self):
+        for L, n in self.CASES:
+            with self.subTest(L=L, n=n):
+                idx = self._check(L, n)
+                with mock.patch.object(series, 'np', None):
+                    self.assertEqual(idx, series.minmax_indices(self._ys(L), n))
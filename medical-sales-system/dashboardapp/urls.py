@@ -5,4 +5,13 @@ app_name = 'dashboard'
 
 urlpatterns = [
     path('', views.main, name='main'),
+
+    # JSON panels (بتتجاب بالتوازي من dashboard.js)
+    path('api/kpis/', views.api_kpis, name='api_kpis'),
+    path('api/by-rep/', views.api_by_rep, name='api_by_rep'),
+    path('api/trend/', views.api_trend, name='api_trend'),
+    path('api/recent/', views.api_recent, name='api_recent'),
+    path('api/upcoming/', views.api_upcoming, name='api_upcoming'),
+    path('api/adherence/', views.api_adherence, name='api_adherence'),
+    path('api/heatmap/', views.api_heatmap, name='api_heatmap'),
 ]
@@ -1,121 +1,189 @@
 from datetime import date, timedelta
-from collections import defaultdict
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Count, Q
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import ExtractWeekDay, TruncDay, TruncMonth, TruncWeek
 from django.shortcuts import render
+from django.views.decorators.http import require_GET
 from django.utils import timezone
 from visits.models import DailyVisit
 from plans.models import WeeklyPlan
 from reps.models import RepProfile
 from clientsapp.models import Client
+from django.contrib.auth.models import User
+from archives import adherence
+from .models import VisitDailyRollup
+from . import cache as dash_cache, series
+from accounts.roles import is_manager
+from med.serializers import json_response
+from med.dates import day_start
+from med import fanout
 
-def is_manager(u):
-    return u.is_authenticated and u.groups.filter(name='Manager').exists()
+# عدد الـ buckets لكل granularity: 12 شهر / 12 أسبوع / 30 يوم
+TREND_BUCKETS = {'month': 12, 'week': 12, 'day': 30}
+_TRUNC = {'month': TruncMonth, 'week': TruncWeek, 'day': TruncDay}
+# bucket=range: يومي على المدى المختار كله، متقلّص لـ TREND_POINTS نقطة (dashboardapp/series.py)
+TREND_CHOICES = (*TREND_BUCKETS, 'range')
+TREND_POINTS = 150
+TREND_MAX_POINTS = 1000
 
-@login_required
-@user_passes_test(is_manager)
-def main(request):
-    # ----- المدى الزمني -----
-    rng = request.GET.get('range') or '30'
-    today = timezone.localdate()
-    if rng == 'all':
-        start = date(1970, 1, 1)
+
+def _bucket_starts(today, bucket, n):
+    """بدايات آخر n buckets (الأقدم الأول) — شهر: أول الشهر، أسبوع: الاثنين، يوم: اليوم."""
+    if bucket == 'day':
+        return [today - timedelta(days=i) for i in range(n - 1, -1, -1)]
+    if bucket == 'week':
+        monday = today - timedelta(days=today.weekday())
+        return [monday - timedelta(weeks=i) for i in range(n - 1, -1, -1)]
+    starts = []
+    cur = today.replace(day=1)
+    for _ in range(n):
+        starts.append(cur)
+        cur = (cur - timedelta(days=1)).replace(day=1)
+    return starts[::-1]
+
+
+def _buckets_between(first, today, bucket):
+    """عدد الـ buckets من first لحد today (شاملين)."""
+    if bucket == 'day':
+        return (today - first).days + 1
+    if bucket == 'week':
+        return ((today - timedelta(days=today.weekday())) - (first - timedelta(days=first.weekday()))).days // 7 + 1
+    return (today.year - first.year) * 12 + today.month - first.month + 1
+
+
+def _trend(today, bucket='month', start=None, points=None, method='lttb'):
+    """
+    Visits / Deals لكل bucket — GROUP BY في الداتابيز على التجميعة اليومية.
+    من غير points: آخر 12 / 12 / 30 bucket. مع points (أو bucket=range): السلسلة كاملة على
+    المدى المختار (من أول يوم فيه داتا) وبعدين downsampling لـ points نقطة بالكتير.
+    """
+    grain = 'day' if bucket == 'range' else bucket
+    if points is None:
+        starts = _bucket_starts(today, grain, TREND_BUCKETS[grain])
     else:
-        try:
-            days = int(rng)
-        except ValueError:
-            days = 30
-        start = today - timedelta(days=days)
+        first = (VisitDailyRollup.objects.filter(visit_date__gte=start)
+                 .aggregate(m=Min('visit_date'))['m']) or today
+        starts = _bucket_starts(today, grain, _buckets_between(min(first, today), today, grain))
 
-    # ----- كشف أسماء الحقول المتاحة في DailyVisit لتوافق الفروع -----
-    dv_fields = {f.name for f in DailyVisit._meta.get_fields()}
-    if 'actual_datetime' in dv_fields:
-        date_field = 'actual_datetime'
-        range_filter = {f'{date_field}__date__gte': start}
-        order_expr = f'-{date_field}'
+    rows = (VisitDailyRollup.objects
+            .filter(visit_date__gte=starts[0])
+            .annotate(b=_TRUNC[grain]('visit_date'))
+            .values('b')
+            .annotate(v=Sum('visits'), d=Sum('deals'))
+            .order_by())
+    by_start = {(r['b'].date() if hasattr(r['b'], 'date') else r['b']): r for r in rows}
+
+    if grain == 'month':
+        labels = [f'{d.year}-{d.month:02d}' for d in starts]
     else:
-        date_field = 'visit_date'
-        range_filter = {f'{date_field}__gte': start}
-        order_expr = f'-{date_field}'
+        labels = [d.isoformat() for d in starts]
+    visits = [(by_start.get(d) or {}).get('v') or 0 for d in starts]
+    deals = [(by_start.get(d) or {}).get('d') or 0 for d in starts]
+
+    raw = len(labels)
+    if points is not None and raw > points:
+        idx = series.downsample(visits, points, method)
+        labels = [labels[i] for i in idx]
+        visits = [visits[i] for i in idx]
+        deals = [deals[i] for i in idx]
+    return {
+        'bucket': bucket,
+        'labels': labels,
+        'visits': visits,
+        'deals': deals,
+        'raw': raw,
+        'downsampled': len(labels) < raw,
+    }
 
-    # ----- كويري المدى -----
-    dv_range = DailyVisit.objects.filter(**range_filter)
 
-    # ----- KPIs -----
-    total = dv_range.count()
-    approved = WeeklyPlan.objects.filter(
-        planned_date__gte=start, status__iexact='Approved'
-    ).count()
+def _trend_opts(request, bucket):
+    """(points, method) من ?points= و ?downsample=lttb|minmax."""
+    try:
+        points = int(request.GET.get('points') or 0) or None
+    except ValueError:
+        points = None
+    if points is None and bucket == 'range':
+        points = TREND_POINTS
+    if points is not None:
+        points = max(3, min(points, TREND_MAX_POINTS))
+    method = request.GET.get('downsample') or 'lttb'
+    if method not in series.METHODS:
+        method = 'lttb'
+    return points, method
 
-    deals_q = Q()
-    if 'visit_objective' in dv_fields:
-        deals_q |= Q(visit_objective__iexact='Deal Closed')
-    if 'visit_status' in dv_fields:
-        deals_q |= Q(visit_status__iexact='Deal Closed')
-    deals = dv_range.filter(deals_q).count() if ('visit_status' in dv_fields or 'visit_objective' in dv_fields) else 0
 
-    active_reps = RepProfile.objects.filter(user__is_active=True).count()
-    clients_count = Client.objects.filter(is_deleted=False).count()
+# ============================
+# Panels — كل بلوك لوحده (كاش لوحده + endpoint لوحده)
+# ============================
 
-    upcoming_q = WeeklyPlan.objects.filter(
-        planned_date__gte=today,
-        planned_date__lte=today + timedelta(days=7),
-        status__iexact='Approved'
-    ).count()
+def _kpis(start, today):
+    # الأرقام من التجميعة اليومية (rep × يوم × حالة) — مش من صفوف الزيارات
+    # كل query مستقلة → بالتوازي (med/fanout.py)، فالزمن ≈ أبطأ واحدة
+    res = fanout.run({
+        'sums': lambda: VisitDailyRollup.objects.filter(visit_date__gte=start).aggregate(
+            visits=Sum('visits'), deals=Sum('deals'),
+        ),
+        'approved': lambda: WeeklyPlan.objects.filter(
+            planned_date__gte=start, status__iexact='Approved'
+        ).count(),
+        'reps': lambda: RepProfile.objects.filter(user__is_active=True).count(),
+        'clients': lambda: Client.objects.filter(is_deleted=False).count(),
+        'upcoming': lambda: WeeklyPlan.objects.filter(
+            planned_date__gte=today,
+            planned_date__lte=today + timedelta(days=7),
+            status__iexact='Approved'
+        ).count(),
+    })
+    total = res['sums']['visits'] or 0
+    deals = res['sums']['deals'] or 0
+
+    return {
+        'total': total,
+        'approved': res['approved'],
+        'deals': deals,
+        'reps': res['reps'],
+        'clients': res['clients'],
+        'upcoming': res['upcoming'],
+        'conversion': round((deals / total) * 100) if total else 0,
+    }
 
-    conversion = round((deals / total) * 100) if total else 0
 
-    # ----- Visits by Rep (Bar) -----
+def _by_rep(start):
+    """Visits by Rep (Bar)."""
     rep_rows = (
-        dv_range.values('rep__first_name', 'rep__last_name', 'rep__username')
-                .annotate(c=Count('id'))
-                .order_by('-c')
+        VisitDailyRollup.objects.filter(visit_date__gte=start)
+            .values('rep__first_name', 'rep__last_name', 'rep__username')
+            .annotate(c=Sum('visits'))
+            .order_by('-c')
     )
-    by_rep = []
-    by_rep_total = 0
+    rows = []
+    total = 0
     for r in rep_rows:
         name = f"{(r.get('rep__first_name') or '').strip()} {(r.get('rep__last_name') or '').strip()}".strip()
         if not name:
             name = r.get('rep__username') or '—'
         count = r['c']
-        by_rep_total += count
-        by_rep.append({'label': name, 'count': count})
-
-    # ----- Monthly Trend (آخر 12 شهر) -----
-    start_12 = today.replace(day=1) - timedelta(days=365)
-    dv12 = DailyVisit.objects.filter(**{f'{date_field}__gte': start_12})
-    trend_visits, trend_deals = defaultdict(int), defaultdict(int)
-
-    for row in dv12.values(date_field, 'visit_status', 'visit_objective'):
-        dt = row.get(date_field)
-        if hasattr(dt, 'date'):
-            dt = dt.date()
-        key = f'{dt.year}-{dt.month:02d}'
-        trend_visits[key] += 1
-        status_val = (row.get('visit_status') or '').lower()
-        obj_val = (row.get('visit_objective') or '').lower()
-        if status_val == 'deal closed' or obj_val == 'deal closed':
-            trend_deals[key] += 1
-
-    months = []
-    cur = today.replace(day=1)
-    for _ in range(12):
-        months.append(f'{cur.year}-{cur.month:02d}')
-        if cur.month == 1:
-            cur = cur.replace(year=cur.year - 1, month=12)
-        else:
-            cur = cur.replace(month=cur.month - 1)
-    months.reverse()
-
-    trend = {
-        'labels': months,
-        'visits': [trend_visits.get(m, 0) for m in months],
-        'deals':  [trend_deals.get(m, 0) for m in months],
-    }
+        total += count
+        rows.append({'label': name, 'count': count})
+    return {'rows': rows, 'total': total}
+
 
-    # ----- Recent Daily Visits -----
-    recent_q = dv_range.order_by(order_expr)[:10]
-    recent = []
+def _recent(start):
+    """آخر 10 زيارات في المدى."""
+    # ----- كشف أسماء الحقول المتاحة في DailyVisit لتوافق الفروع -----
+    dv_fields = {f.name for f in DailyVisit._meta.get_fields()}
+    if 'actual_datetime' in dv_fields:
+        date_field = 'actual_datetime'
+        # sargable: مقارنة مباشرة على العمود بدل __date (تحويل timezone بيمنع الـ index)
+        range_filter = {f'{date_field}__gte': day_start(start)}
+    else:
+        date_field = 'visit_date'
+        range_filter = {f'{date_field}__gte': start}
+
+    recent_q = (DailyVisit.objects.filter(**range_filter)
+                .select_related('rep', 'client')
+                .order_by(f'-{date_field}')[:10])
+    rows = []
     for v in recent_q:
         rep_name = getattr(v, 'rep', None)
         rep_name = (rep_name.get_full_name() or rep_name.username) if rep_name else '—'
@@ -125,49 +193,203 @@ def main(request):
         doctor = getattr(v, 'client_doctor', '') or (getattr(v, 'client', None).doctor_name if getattr(v, 'client_id', None) else '')
         outcome = (getattr(v, 'visit_status', '') or getattr(v, 'visit_objective', '') or '')
 
-        recent.append({
+        rows.append({
             'dt': dt_str,
             'rep': rep_name,
             'account': account,
             'doctor': doctor,
             'outcome': outcome,
         })
+    return {'rows': rows}
+
 
-    # ----- Next 7 days (Approved Weekly) -----
+def _upcoming(today):
+    """Next 7 days (Approved Weekly)."""
     upcoming_rows = WeeklyPlan.objects.filter(
         planned_date__gte=today,
         planned_date__lte=today + timedelta(days=7),
         status__iexact='Approved'
-    ).order_by('planned_date')[:10]
+    ).select_related('rep').order_by('planned_date')[:10]
 
-    upcoming = []
+    rows = []
     for p in upcoming_rows:
         rep_name = getattr(p, 'rep', None)
         rep_name = (rep_name.get_full_name() or rep_name.username) if rep_name else '—'
         plan_txt = getattr(p, 'aa_plan', None) or getattr(p, 'weekly_plan', None) or ''
         obj_txt = getattr(p, 'visit_objective', None) or ''
-        upcoming.append({
+        rows.append({
             'date': p.planned_date,
             'rep': rep_name,
             'plan': plan_txt,
             'obj': obj_txt
         })
+    return {'rows': rows}
+
+
+def _adherence(start):
+    """Planned vs actual لكل (rep, week) للأسابيع اللي ليها خطط في المدى (archives/adherence.py)."""
+    weeks = set(WeeklyPlan.objects.filter(planned_date__gte=start)
+                .order_by().values_list('week_number', flat=True).distinct())
+    data = adherence.report(weeks) if weeks else []
+
+    names = {u.pk: (u.get_full_name() or u.username)
+             for u in User.objects.filter(pk__in={r['rep_id'] for r in data}).only('first_name', 'last_name', 'username')}
+    totals = dict.fromkeys(adherence.COUNTS, 0)
+    rows = []
+    for r in data:
+        for k in adherence.COUNTS:
+            totals[k] += r[k]
+        rows.append({**r, 'rep': names.get(r['rep_id'], '—'), **adherence.rates(r)})
+    return {'rows': rows, 'totals': {**totals, **adherence.rates(totals)}}
+
+
+HEAT_WEEKDAYS = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']   # ExtractWeekDay: 1=Sunday … 7=Saturday
+HEAT_SHIFTS = ['AM', 'PM', 'Evening', 'Night']                       # نفس اختيارات فورم الزيارة
+_SHIFT_KEY = {s.lower(): s for s in HEAT_SHIFTS}
+HEAT_OTHER = 'Unspecified'
+
+
+def _heatmap(start):
+    """
+    زيارات لكل (يوم الأسبوع × time_shift) — إجمالي ولكل ريب (الزيارات الـ live بس).
+    query واحدة: GROUP BY rep, ExtractWeekDay(visit_date), time_shift.
+    """
+    agg = (DailyVisit.objects.filter(is_deleted=False, visit_date__gte=start)
+           .annotate(wd=ExtractWeekDay('visit_date'))
+           .values('rep_id', 'wd', 'time_shift')
+           .annotate(n=Count('id'))
+           .order_by())
 
-    dash = {
-        'kpis': {
-            'total': total,
-            'approved': approved,
-            'deals': deals,
-            'reps': active_reps,
-            'clients': clients_count,
-            'upcoming': upcoming_q,
-            'conversion': conversion,
-            'by_rep_total': by_rep_total,
-        },
-        'by_rep': by_rep,
-        'trend': trend,
-        'recent': recent,
-        'upcoming': upcoming,
+    shifts = list(HEAT_SHIFTS)
+    per_rep = {}
+    for r in agg:
+        shift = _SHIFT_KEY.get((r['time_shift'] or '').strip().lower(), HEAT_OTHER)
+        if shift == HEAT_OTHER and HEAT_OTHER not in shifts:
+            shifts.append(HEAT_OTHER)
+        cells = per_rep.setdefault(r['rep_id'], {})
+        k = (r['wd'] - 1, shift)
+        cells[k] = cells.get(k, 0) + r['n']
+
+    def matrix(cells):
+        return [[cells.get((d, sh), 0) for sh in shifts] for d in range(7)]
+
+    names = {u.pk: (u.get_full_name() or u.username)
+             for u in User.objects.filter(pk__in=per_rep).only('first_name', 'last_name', 'username')}
+    total = {}
+    reps = []
+    for rep_id, cells in per_rep.items():
+        for k, n in cells.items():
+            total[k] = total.get(k, 0) + n
+        reps.append({'rep_id': rep_id, 'rep': names.get(rep_id, '—'),
+                     'total': sum(cells.values()), 'cells': matrix(cells)})
+    reps.sort(key=lambda r: -r['total'])
+    return {
+        'weekdays': HEAT_WEEKDAYS,
+        'shifts': shifts,
+        'cells': matrix(total),
+        'total': sum(total.values()),
+        'reps': reps,
     }
 
-    return render(request, 'dashboard/main.html', {'dash': dash, 'range': rng})
+
+def _params(request):
+    """(range, start, today, bucket) من الـ query string."""
+    rng = request.GET.get('range') or '30'
+    today = timezone.localdate()
+    if rng == 'all':
+        start = date(1970, 1, 1)
+    else:
+        try:
+            days = int(rng)
+        except ValueError:
+            rng, days = '30', 30
+        start = today - timedelta(days=days)
+
+    bucket = request.GET.get('bucket') or 'month'
+    if bucket not in TREND_CHOICES:
+        bucket = 'month'
+    return rng, start, today, bucket
+
+
+def _panel(name, request):
+    """
+    يبني بلوك واحد (أو يرجّعه من الكاش). المفتاح = البلوك + المدى + اليوم + نسخ الجداول،
+    فأي كتابة بتغيّر النسخة ومفيش أرقام قديمة.
+    """
+    _, start, today, bucket = _params(request)
+    points, method = _trend_opts(request, bucket) if name == 'trend' else (None, None)
+    builders = {
+        'kpis':     lambda: _kpis(start, today),
+        'by_rep':   lambda: _by_rep(start),
+        'trend':    lambda: _trend(today, bucket, start, points, method),
+        'recent':   lambda: _recent(start),
+        'upcoming': lambda: _upcoming(today),
+        'adherence': lambda: _adherence(start),
+        'heatmap':  lambda: _heatmap(start),
+    }
+    key = (name, start.isoformat(), today.isoformat(), bucket, points, method)
+    return dash_cache.get_or_build(key, builders[name])
+
+
+@login_required
+@user_passes_test(is_manager)
+def main(request):
+    """
+    Shell خفيف بس — البلوكات بتتجاب بالتوازي من /dashboard/api/* (static/assets/js/dashboard.js)،
+    فأبطأ بلوك مش بيأخّر ظهور الصفحة.
+    """
+    rng, _, _, bucket = _params(request)
+    return render(request, 'dashboard/main.html', {'range': rng, 'bucket': bucket})
+
+
+# ============================
+# JSON panels
+# ============================
+
+@login_required
+@user_passes_test(is_manager)
+@require_GET
+def api_kpis(request):
+    return json_response(_panel('kpis', request))
+
+
+@login_required
+@user_passes_test(is_manager)
+@require_GET
+def api_by_rep(request):
+    return json_response(_panel('by_rep', request))
+
+
+@login_required
+@user_passes_test(is_manager)
+@require_GET
+def api_trend(request):
+    return json_response(_panel('trend', request))
+
+
+@login_required
+@user_passes_test(is_manager)
+@require_GET
+def api_recent(request):
+    return json_response(_panel('recent', request))
+
+
+@login_required
+@user_passes_test(is_manager)
+@require_GET
+def api_upcoming(request):
+    return json_response(_panel('upcoming', request))
+
+
+@login_required
+@user_passes_test(is_manager)
+@require_GET
+def api_adherence(request):
+    return json_response(_panel('adherence', request))
+
+
+@login_required
+@user_passes_test(is_manager)
+@require_GET
+def api_heatmap(request):
+    return json_response(_panel('heatmap', request))
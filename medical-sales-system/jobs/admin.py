@@ -0,0 +1,17 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.action(description="Retry (إعادة تشغيل)")
+def retry(modeladmin, request, queryset):
+    from django.utils import timezone
+    queryset.filter(status__in=[Job.FAILED]).update(status=Job.PENDING, attempts=0, run_after=timezone.now())
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display  = ('id', 'task', 'dedupe_key', 'status', 'attempts', 'coalesced', 'run_after', 'finished_at')
+    list_filter   = ('status', 'task')
+    search_fields = ('task', 'dedupe_key')
+    readonly_fields = ('created_at', 'updated_at', 'finished_at', 'last_error')
+    actions = (retry,)
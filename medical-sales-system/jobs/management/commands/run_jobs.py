@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobs.queue import requeue_stale, run_pending
+
+
+class Command(BaseCommand):
+    help = "Worker لطابور الجوبات (DB-backed, من غير broker)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="نفّذ الجاهز لحد ما يخلص واخرج.")
+        parser.add_argument('--batch', type=int, default=50, help="عدد الجوبات في كل دورة.")
+        parser.add_argument('--sleep', type=float, default=1.0, help="ثواني الانتظار لما الطابور يكون فاضي.")
+
+    def handle(self, *args, **opts):
+        batch, sleep = opts['batch'], opts['sleep']
+        stale = requeue_stale()
+        if stale:
+            self.stdout.write(f"Requeued {stale} stale job(s).")
+
+        total_ok = total_failed = 0
+        try:
+            while True:
+                ok, failed = run_pending(batch=batch)
+                total_ok += ok
+                total_failed += failed
+                if ok or failed:
+                    self.stdout.write(f"ran {ok} ok, {failed} failed")
+                    continue
+                if opts['once']:
+                    break
+                time.sleep(sleep)
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {total_ok} ok, {total_failed} failed."))
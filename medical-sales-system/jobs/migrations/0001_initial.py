@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=200)),
+                ('dedupe_key', models.CharField(blank=True, max_length=200)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3)),
+                ('coalesced', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['run_after', 'id'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='jobs_job_status_babf0b_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'pending'), models.Q(('dedupe_key', ''), _negated=True)), fields=('task', 'dedupe_key'), name='jobs_job_one_pending_per_key')],
+            },
+        ),
+    ]
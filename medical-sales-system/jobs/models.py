@@ -0,0 +1,56 @@
+# jobs/models.py
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    طابور شغل محلي في الداتابيز (من غير broker).
+    task = dotted path لدالة بتاخد payload كـ kwargs.
+    dedupe_key: أي enqueue لنفس (task, key) وهو لسه pending بيندمج في نفس الصف.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE    = 'done'
+    FAILED  = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE,    'Done'),
+        (FAILED,  'Failed'),
+    ]
+
+    task         = models.CharField(max_length=200)
+    dedupe_key   = models.CharField(max_length=200, blank=True)
+    payload      = models.JSONField(default=dict, blank=True)
+
+    status       = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    run_after    = models.DateTimeField(default=timezone.now)
+    attempts     = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # كام enqueue اتدمجوا في الجوب ده
+    coalesced    = models.PositiveIntegerField(default=0)
+    last_error   = models.TextField(blank=True)
+
+    created_at   = models.DateTimeField(auto_now_add=True)
+    updated_at   = models.DateTimeField(auto_now=True)
+    finished_at  = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+        constraints = [
+            # جوب pending واحد بس لكل (task, key) — أساس الـ coalescing
+            models.UniqueConstraint(
+                fields=['task', 'dedupe_key'],
+                condition=Q(status='pending') & ~Q(dedupe_key=''),
+                name='jobs_job_one_pending_per_key',
+            ),
+        ]
+
+    def __str__(self):
+        key = f" [{self.dedupe_key}]" if self.dedupe_key else ''
+        return f"#{self.id} {self.task}{key} — {self.status}"
@@ -0,0 +1,122 @@
+# jobs/queue.py
+"""
+enqueue / تشغيل الجوبات.
+
+- enqueue(task, payload, key=...) : لو فيه جوب pending لنفس (task, key) بيتحدث بدل ما يتعمل جديد،
+  فسلسلة saves على نفس الخطة بتطلع recomputation واحدة.
+- الجوبات اللي ليها key بتتأخر JOBS_COALESCE_SECONDS علشان الـ burst يلحق يندمج.
+- JOBS_ALWAYS_EAGER=True → التشغيل فوري جوه الـ request (مفيد للتطوير/التيست).
+- الـ worker: python manage.py run_jobs
+"""
+from datetime import timedelta
+import logging
+import traceback
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(task, payload=None, key=''):
+    """يضيف جوب (أو يدمجه في جوب pending بنفس الـ key). يرجّع الـ Job أو None لو eager."""
+    payload = payload or {}
+    if _setting('JOBS_ALWAYS_EAGER', False):
+        import_string(task)(**payload)
+        return None
+
+    now = timezone.now()
+    if not key:
+        return Job.objects.create(task=task, payload=payload, run_after=now)
+
+    run_after = now + timedelta(seconds=_setting('JOBS_COALESCE_SECONDS', 2))
+    pending = Job.objects.filter(task=task, dedupe_key=key, status=Job.PENDING)
+    if pending.update(payload=payload, coalesced=F('coalesced') + 1, updated_at=now):
+        return pending.first()
+    try:
+        with transaction.atomic():
+            return Job.objects.create(task=task, dedupe_key=key, payload=payload, run_after=run_after)
+    except IntegrityError:
+        # enqueue تاني سبقنا بنفس الـ key
+        pending.update(payload=payload, coalesced=F('coalesced') + 1, updated_at=now)
+        return pending.first()
+
+
+def requeue_stale(older_than_seconds=None):
+    """جوبات running من worker وقع → ترجع pending."""
+    secs = older_than_seconds or _setting('JOBS_STALE_SECONDS', 600)
+    cutoff = timezone.now() - timedelta(seconds=secs)
+    stale = Job.objects.filter(status=Job.RUNNING, updated_at__lt=cutoff)
+    n = 0
+    for job in stale:
+        try:
+            with transaction.atomic():
+                n += Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(status=Job.PENDING, updated_at=timezone.now())
+        except IntegrityError:
+            # فيه pending جديد لنفس الـ key — يكفي هو
+            n += Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(status=Job.DONE, finished_at=timezone.now())
+    return n
+
+
+def _claim(batch):
+    now = timezone.now()
+    ids = list(Job.objects.filter(status=Job.PENDING, run_after__lte=now)
+                          .order_by('run_after', 'id')
+                          .values_list('id', flat=True)[:batch])
+    claimed = []
+    for pk in ids:
+        # update شرطي = lock خفيف؛ لو worker تاني خده قبلنا الـ update بيرجع 0
+        if Job.objects.filter(pk=pk, status=Job.PENDING).update(
+            status=Job.RUNNING, attempts=F('attempts') + 1, updated_at=now,
+        ):
+            claimed.append(pk)
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_after', 'id'))
+
+
+def run_job(job):
+    """ينفذ جوب واحد متاخد (running) ويسجّل النتيجة. يرجّع True لو نجح."""
+    try:
+        import_string(job.task)(**(job.payload or {}))
+    except Exception:
+        err = traceback.format_exc()
+        logger.exception("Job %s failed", job.pk)
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            # backoff بسيط: 10s, 20s, 40s ...
+            delay = 10 * (2 ** max(0, job.attempts - 1))
+            try:
+                # savepoint علشان الـ IntegrityError ما يبوّظش transaction خارجية
+                with transaction.atomic():
+                    Job.objects.filter(pk=job.pk).update(
+                        status=Job.PENDING, last_error=err, updated_at=now,
+                        run_after=now + timedelta(seconds=delay),
+                    )
+            except IntegrityError:
+                # اتعمل pending أحدث لنفس الـ key — هو اللي هيعيد الحساب
+                Job.objects.filter(pk=job.pk).update(status=Job.DONE, last_error=err, finished_at=now)
+        else:
+            Job.objects.filter(pk=job.pk).update(status=Job.FAILED, last_error=err, updated_at=now, finished_at=now)
+        return False
+
+    Job.objects.filter(pk=job.pk).update(status=Job.DONE, last_error='', finished_at=timezone.now())
+    return True
+
+
+def run_pending(batch=50):
+    """دورة واحدة: ياخد لحد batch جوب جاهز وينفذهم. يرجّع (ok, failed)."""
+    ok = failed = 0
+    for job in _claim(batch):
+        if run_job(job):
+            ok += 1
+        else:
+            failed += 1
+    return ok, failed
@@ -0,0 +1,239 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import queue
+from .models import Job
+
+# الـ tasks بتتنادي بالـ dotted path — بتسجّل الـ payload هنا
+CALLS = []
+
+
+def record(**payload):
+    CALLS.append(payload)
+
+
+def explode(**payload):
+    CALLS.append(payload)
+    raise RuntimeError('boom')
+
+
+RECORD = 'jobs.tests.record'
+EXPLODE = 'jobs.tests.explode'
+
+
+def _past(seconds=1):
+    return timezone.now() - timedelta(seconds=seconds)
+
+
+@override_settings(JOBS_ALWAYS_EAGER=False, JOBS_COALESCE_SECONDS=2, JOBS_STALE_SECONDS=600)
+class JobsTestCase(TestCase):
+
+    def setUp(self):
+        CALLS.clear()
+        # الـ tasks اللي بتفشل عن قصد — من غير traceback في الـ output
+        patcher = mock.patch.object(queue.logger, 'exception')
+        self.log_exception = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ready(self, *jobs):
+        """run_after في الماضي → الجوب جاهز للـ claim."""
+        Job.objects.filter(pk__in=[j.pk for j in jobs]).update(run_after=_past())
+
+
+class EnqueueTests(JobsTestCase):
+    """enqueue: الدمج على (task, key) وهو pending، والـ constraint الجزئي."""
+
+    def test_same_key_coalesces_into_one_pending_job(self):
+        first = queue.enqueue(RECORD, {'n': 1}, key='plan:1')
+        second = queue.enqueue(RECORD, {'n': 2}, key='plan:1')
+        self.assertEqual(first.pk, second.pk)
+        job = Job.objects.get()
+        self.assertEqual((job.payload, job.coalesced, job.status), ({'n': 2}, 1, Job.PENDING))
+        # الجوبات اللي ليها key بتتأخر علشان الـ burst يندمج
+        self.assertGreater(job.run_after, timezone.now())
+
+    def test_different_keys_and_keyless_jobs_do_not_coalesce(self):
+        queue.enqueue(RECORD, key='plan:1')
+        queue.enqueue(RECORD, key='plan:2')
+        queue.enqueue('jobs.tests.other', key='plan:1')
+        keyless = [queue.enqueue(RECORD), queue.enqueue(RECORD)]
+        self.assertEqual(Job.objects.count(), 5)
+        self.assertLessEqual(keyless[0].run_after, timezone.now())
+
+    def test_constraint_is_partial_on_pending(self):
+        running = Job.objects.create(task=RECORD, dedupe_key='k', status=Job.RUNNING)
+        # جوب شغّال مش بيمنع pending جديد لنفس الـ key
+        job = queue.enqueue(RECORD, {'n': 1}, key='k')
+        self.assertNotEqual(job.pk, running.pk)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Job.objects.create(task=RECORD, dedupe_key='k')
+        # الـ key الفاضي برة الـ constraint
+        Job.objects.create(task=RECORD)
+        Job.objects.create(task=RECORD)
+
+    def test_lost_race_falls_back_to_update(self):
+        existing = Job.objects.create(task=RECORD, dedupe_key='k', payload={'n': 0})
+        real_update, calls = QuerySet.update, []
+
+        def update(qs, **kwargs):
+            # أول update (قبل الـ create) "ما لقاش" الـ pending — زي enqueue تاني سبقنا
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else real_update(qs, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', update):
+            job = queue.enqueue(RECORD, {'n': 1}, key='k')
+        self.assertEqual(job.pk, existing.pk)
+        existing.refresh_from_db()
+        self.assertEqual((existing.payload, existing.coalesced), ({'n': 1}, 1))
+        self.assertEqual(Job.objects.count(), 1)
+
+    @override_settings(JOBS_ALWAYS_EAGER=True)
+    def test_eager_runs_inline(self):
+        self.assertIsNone(queue.enqueue(RECORD, {'n': 1}, key='k'))
+        self.assertEqual(CALLS, [{'n': 1}])
+        self.assertFalse(Job.objects.exists())
+
+
+class ClaimTests(JobsTestCase):
+    """_claim: pending وجاهز بس، بالترتيب، لحد batch — والجوب المتاخد ما يتاخدش تاني."""
+
+    def test_claims_ready_jobs_in_order(self):
+        now = timezone.now()
+        late = Job.objects.create(task=RECORD, run_after=now - timedelta(seconds=5))
+        early = Job.objects.create(task=RECORD, run_after=now - timedelta(seconds=50))
+        Job.objects.create(task=RECORD, run_after=now + timedelta(minutes=5))
+        Job.objects.create(task=RECORD, status=Job.DONE, run_after=now - timedelta(seconds=50))
+
+        claimed = queue._claim(10)
+        self.assertEqual([j.pk for j in claimed], [early.pk, late.pk])
+        self.assertTrue(all(j.status == Job.RUNNING and j.attempts == 1 for j in claimed))
+        self.assertEqual(queue._claim(10), [])
+
+    def test_batch_limit(self):
+        jobs = [Job.objects.create(task=RECORD) for _ in range(3)]
+        self.ready(*jobs)
+        self.assertEqual(len(queue._claim(2)), 2)
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 1)
+
+    def test_job_taken_by_another_worker_is_skipped(self):
+        a, b = Job.objects.create(task=RECORD), Job.objects.create(task=RECORD)
+        self.ready(a, b)
+        real_update, taken = QuerySet.update, []
+
+        def update(qs, **kwargs):
+            # worker تاني خد b بين الـ select والـ update الشرطي
+            if not taken:
+                taken.append(real_update(Job.objects.filter(pk=b.pk), status=Job.RUNNING))
+            return real_update(qs, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', update):
+            claimed = queue._claim(10)
+        self.assertEqual([j.pk for j in claimed], [a.pk])
+
+
+class RunJobTests(JobsTestCase):
+    """run_job / run_pending: النجاح، والـ retry بـ backoff لحد max_attempts."""
+
+    def test_success(self):
+        job = Job.objects.create(task=RECORD, payload={'n': 7})
+        self.ready(job)
+        self.assertEqual(queue.run_pending(), (1, 0))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (Job.DONE, 1, ''))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(CALLS, [{'n': 7}])
+
+    def test_retry_with_backoff_then_failed(self):
+        job = Job.objects.create(task=EXPLODE, max_attempts=3)
+        for attempt, delay in ((1, 10), (2, 20)):
+            self.ready(job)
+            before = timezone.now()
+            self.assertEqual(queue.run_pending(), (0, 1))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.PENDING, attempt))
+            self.assertIn('RuntimeError: boom', job.last_error)
+            self.assertGreaterEqual(job.run_after, before + timedelta(seconds=delay))
+            self.assertLessEqual(job.run_after, timezone.now() + timedelta(seconds=delay))
+            # قبل ميعاد الـ retry مش بيتاخد
+            self.assertEqual(queue.run_pending(), (0, 0))
+
+        self.ready(job)
+        self.assertEqual(queue.run_pending(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 3))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(len(CALLS), 3)
+        self.assertEqual(self.log_exception.call_count, 3)
+
+    def test_failed_retry_yields_to_newer_pending_job(self):
+        job = Job.objects.create(task=EXPLODE, dedupe_key='k')
+        self.ready(job)
+        (claimed,) = queue._claim(1)
+        newer = queue.enqueue(EXPLODE, key='k')
+        self.assertFalse(queue.run_job(claimed))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertIn('boom', job.last_error)
+        self.assertEqual(Job.objects.get(pk=newer.pk).status, Job.PENDING)
+
+
+class RequeueStaleTests(JobsTestCase):
+    """requeue_stale: running قديم يرجع pending، إلا لو فيه pending أحدث لنفس الـ key."""
+
+    def stale(self, **fields):
+        job = Job.objects.create(task=RECORD, status=Job.RUNNING, **fields)
+        Job.objects.filter(pk=job.pk).update(updated_at=_past(3600))
+        return job
+
+    def test_requeues_only_stale_running_jobs(self):
+        old = self.stale()
+        fresh = Job.objects.create(task=RECORD, status=Job.RUNNING)
+        self.assertEqual(queue.requeue_stale(), 1)
+        self.assertEqual(Job.objects.get(pk=old.pk).status, Job.PENDING)
+        self.assertEqual(Job.objects.get(pk=fresh.pk).status, Job.RUNNING)
+        self.assertEqual(queue.requeue_stale(older_than_seconds=0.001), 1)
+
+    def test_stale_job_with_pending_duplicate_is_closed(self):
+        old = self.stale(dedupe_key='k')
+        pending = Job.objects.create(task=RECORD, dedupe_key='k')
+        self.assertEqual(queue.requeue_stale(), 1)
+        old.refresh_from_db()
+        self.assertEqual(old.status, Job.DONE)
+        self.assertIsNotNone(old.finished_at)
+        self.assertEqual(Job.objects.get(pk=pending.pk).status, Job.PENDING)
+
+
+class RunJobsCommandTests(JobsTestCase):
+    """run_jobs: يرجّع الـ stale، يلف لحد ما الطابور يفضى، وبيخرج بـ --once أو Ctrl+C."""
+
+    def test_once_drains_queue(self):
+        jobs = [Job.objects.create(task=RECORD, payload={'n': i}) for i in range(3)]
+        jobs.append(Job.objects.create(task=EXPLODE, max_attempts=1))
+        self.ready(*jobs)
+        stale = Job.objects.create(task=RECORD, status=Job.RUNNING, run_after=_past(), payload={'n': 'stale'})
+        Job.objects.filter(pk=stale.pk).update(updated_at=_past(3600))
+
+        out = StringIO()
+        call_command('run_jobs', '--once', '--batch', '2', stdout=out)
+        output = out.getvalue()
+        self.assertIn('Requeued 1 stale job(s).', output)
+        self.assertIn('Done: 4 ok, 1 failed.', output)
+        self.assertEqual(sorted(str(c.get('n')) for c in CALLS), ['0', '1', '2', 'None', 'stale'])
+        self.assertFalse(Job.objects.filter(status__in=[Job.PENDING, Job.RUNNING]).exists())
+
+    def test_loop_sleeps_when_idle_until_interrupted(self):
+        job = Job.objects.create(task=RECORD)
+        self.ready(job)
+        out = StringIO()
+        with mock.patch('jobs.management.commands.run_jobs.time.sleep',
+                        side_effect=KeyboardInterrupt) as sleep:
+            call_command('run_jobs', '--sleep', '5', stdout=out)
+        sleep.assert_called_once_with(5.0)
+        self.assertIn('Done: 1 ok, 0 failed.', out.getvalue())
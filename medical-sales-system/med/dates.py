@@ -0,0 +1,21 @@
+# med/dates.py
+"""
+حدود الأيام بالتوقيت المحلي (TIME_ZONE) كـ aware datetimes.
+
+actual_datetime__date=d / __date__gte=d بيلفّوا العمود في دالة تحويل timezone
+(USE_TZ=True) فالـ index مش بيتستخدم. البديل: range نص مفتوح على العمود نفسه:
+    actual_datetime__gte=day_start(d), actual_datetime__lt=day_start(d + 1 يوم)
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def day_start(d):
+    """أول لحظة في اليوم d بالتوقيت المحلي."""
+    return timezone.make_aware(datetime.combine(d, time.min))
+
+
+def day_range(d, days=1):
+    """[بداية d, بداية d+days) — للاستخدام مع __gte / __lt."""
+    return day_start(d), day_start(d + timedelta(days=days))
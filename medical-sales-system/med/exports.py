@@ -0,0 +1,98 @@
+# med/exports.py
+"""
+محرك CSV موحّد لكل الـ exports (?export=csv):
+
+    return csv_response(qs, [
+        ('ID',    'id'),
+        ('Rep',   rep_display('rep')),                          # Computed من med/serializers
+        ('Doctor', first_of('client_doctor', 'client__doctor_name')),
+        ('Status', 'status', STATUS_LABELS.get),                # formatter بايثون اختياري
+    ], 'plans.csv')
+
+- الأعمدة بتتجاب بـ values_list واحد (joins في نفس الـ SQL) — مفيش lazy loads لكل صف.
+- StreamingHttpResponse على .iterator(chunk_size) — ذاكرة ثابتة مهما كبر الملف.
+- bom=True → UTF-8 BOM في الأول (Excel يقرا العربي صح).
+"""
+import csv
+from itertools import chain
+
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.http import StreamingHttpResponse
+
+from .serializers import Computed, Projection
+
+EXPORT_CHUNK_SIZE = 2000
+_FLUSH_BYTES = 64 * 1024
+
+
+def wants_csv(request):
+    return (request.GET.get('export') or '').strip().lower() == 'csv'
+
+
+def first_of(*paths):
+    """أول قيمة نصية مش فاضية من paths (زي `a or b or ''`) — محسوبة في الـ SQL."""
+    exprs = [NullIf(F(p), Value('')) for p in paths]
+    expr = Coalesce(*exprs, Value(''), output_field=CharField())
+
+    def py(obj):
+        for p in paths:
+            cur = obj
+            for part in p.split('__'):
+                cur = getattr(cur, part, None) if cur is not None else None
+            if cur:
+                return cur
+        return ''
+    return Computed(expr, py)
+
+
+class _Echo:
+    """csv.writer بيكتب هنا والسطر بيرجع كـ string."""
+
+    def write(self, value):
+        return value
+
+
+def _cell(v):
+    return '' if v is None else v
+
+
+def _lines(rows, headers, formatters, numbered, bom, lineterminator):
+    w = csv.writer(_Echo(), lineterminator=lineterminator)
+    buf = ['\ufeff'] if bom else []
+    buf.append(w.writerow((['#'] if numbered else []) + headers))
+    size = 0
+    for i, row in enumerate(rows, start=1):
+        cells = [_cell(fmt(v) if fmt else v) for v, fmt in zip(row, formatters)]
+        line = w.writerow(([i] if numbered else []) + cells)
+        buf.append(line)
+        size += len(line)
+        if size >= _FLUSH_BYTES:
+            yield ''.join(buf).encode('utf-8')
+            buf, size = [], 0
+    if buf:
+        yield ''.join(buf).encode('utf-8')
+
+
+def csv_response(qs, columns, filename, *, numbered=False, bom=False,
+                 lineterminator='\r\n', chunk_size=EXPORT_CHUNK_SIZE, tail=()):
+    """
+    columns: [(header, source) | (header, source, formatter)]
+      source = اسم حقل/مسار أو Computed؛ formatter(value) → قيمة الخلية.
+    numbered=True → عمود '#' بترقيم الصفوف في الأول.
+    tail = instances (مش في الـ qs — زي الـ cold tier) بتتكتب بعد صفوف الـ qs بنفس الأعمدة.
+    """
+    headers = [c[0] for c in columns]
+    formatters = [c[2] if len(c) > 2 else None for c in columns]
+    proj = Projection(**{f'c{i}': c[1] for i, c in enumerate(columns)})
+    rows = proj.queryset(qs).iterator(chunk_size=chunk_size)
+    if tail:
+        rows = chain(rows, (tuple(proj.one(obj).values()) for obj in tail))
+
+    resp = StreamingHttpResponse(
+        _lines(rows, headers, formatters, numbered, bom, lineterminator),
+        content_type='text/csv; charset=utf-8',
+    )
+    resp['Content-Disposition'] = f'attachment; filename="{filename}"'
+    resp['X-Accel-Buffering'] = 'no'
+    return resp
@@ -0,0 +1,73 @@
+# med/fanout.py
+"""
+تشغيل queries مستقلة عن بعض بالتوازي (KPIs / counts / aggregates):
+
+    res = fanout.run({
+        'total': lambda: qs.count(),
+        'reps':  lambda: qs.values('rep_id').distinct().count(),
+    })
+    res['total'], res['reps']
+
+- thread pool محدود (FANOUT_MAX_WORKERS)، وكل thread بيفتح connection بتاعته ويقفلها بعد المهمة.
+- زمن الطلب ≈ أبطأ query بدل مجموعهم. على SQLite محتاج WAL (settings) علشان القرّاء ما يستنوش بعض.
+- بيشتغل inline (sequential) لو:
+    * جوه transaction.atomic — الـ threads مش هتشوف اللي لسه ما اتعملوش commit (ومنهم الـ tests)
+    * FANOUT_MAX_WORKERS <= 1، أو مهمة واحدة بس
+    * متنادي من جوه worker تاني (منع deadlock في الـ pool)
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, connections
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+def _max_workers():
+    return int(getattr(settings, 'FANOUT_MAX_WORKERS', 4) or 1)
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=_max_workers(), thread_name_prefix='fanout')
+    return _pool
+
+
+def _call(fn):
+    _local.worker = True
+    try:
+        return fn()
+    finally:
+        _local.worker = False
+        # الـ connections thread-local — من غير كده بتفضل مفتوحة مع الـ thread
+        connections.close_all()
+
+
+def _inline():
+    return (_max_workers() <= 1
+            or getattr(_local, 'worker', False)
+            or connection.in_atomic_block)
+
+
+def run(tasks):
+    """tasks: {name: callable} → {name: result}. أول exception بيترمي بعد ما الباقي يخلص."""
+    if len(tasks) < 2 or _inline():
+        return {name: fn() for name, fn in tasks.items()}
+
+    pool = _get_pool()
+    futures = {name: pool.submit(_call, fn) for name, fn in tasks.items()}
+    results, error = {}, None
+    for name, fut in futures.items():
+        try:
+            results[name] = fut.result()
+        except Exception as exc:
+            error = error or exc
+    if error is not None:
+        raise error
+    return results
@@ -0,0 +1,151 @@
+# med/serializers.py
+"""
+Serializers خفيفة للـ JSON APIs.
+
+Projection = تعريف ثابت للأعمدة اللي الـ API بيرجعها:
+    VISIT = Projection(
+        id="id",
+        visit_outcome="visit_objective",          # اسم مختلف عن الحقل
+        rep=rep_display("rep"),                   # Computed: SQL + نسخة بايثون
+    )
+    VISIT.rows(qs[:500])     # values_list واحد — من غير model instances ولا select_related
+    VISIT.one(obj)           # نفس الشكل من instance موجود (بعد save مثلاً)
+    ndjson_response(VISIT.iter(qs))   # ?format=ndjson — streaming بذاكرة ثابتة
+
+والـ encoding بيتم بـ orjson لو متسطّب (أسرع بكتير)، وإلا json + DjangoJSONEncoder —
+وفي الحالتين التواريخ بتطلع بنفس فورمات JsonResponse.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Value, CharField
+from django.db.models.functions import Coalesce, Concat, NullIf, Trim
+from django.http import HttpResponse, StreamingHttpResponse
+
+try:
+    import orjson
+except Exception:  # اختياري
+    orjson = None
+
+
+class Computed:
+    """عمود محسوب: expr للـ .values() و py(obj) لنفس القيمة من instance."""
+
+    def __init__(self, expr, py):
+        self.expr = expr
+        self.py = py
+
+
+def _path_getter(path):
+    parts = path.split("__")
+
+    def get(obj):
+        for p in parts:
+            if obj is None:
+                return None
+            obj = getattr(obj, p, None)
+        return obj
+    return get
+
+
+def rep_display(path="rep"):
+    """اسم المندوب زي get_full_name() or username — محسوب في الـ SQL."""
+    full = Trim(Concat(F(f"{path}__first_name"), Value(" "), F(f"{path}__last_name"),
+                       output_field=CharField()))
+    expr = Coalesce(NullIf(full, Value("")), F(f"{path}__username"), Value(""), output_field=CharField())
+    get_user = _path_getter(path)
+
+    def py(obj):
+        user = get_user(obj)
+        return (user.get_full_name() or user.username) if user else ""
+    return Computed(expr, py)
+
+
+class Projection:
+    """key=source: source اسم حقل/مسار (client__doctor_name) أو Computed."""
+
+    def __init__(self, **fields):
+        self._fields = fields
+        self.keys = tuple(fields)
+        self._columns = []
+        self._getters = []
+        for src in fields.values():
+            if isinstance(src, Computed):
+                self._columns.append(src.expr)
+                self._getters.append(src.py)
+            else:
+                self._columns.append(src)
+                self._getters.append(_path_getter(src))
+
+    def extend(self, **fields):
+        """Projection جديدة فيها نفس الأعمدة + زيادة."""
+        return Projection(**{**self._fields, **fields})
+
+    def queryset(self, qs):
+        """values_list بالأعمدة المعرّفة بس (بيحافظ على الفلاتر والترتيب والـ slicing اللي بعده)."""
+        return qs.values_list(*self._columns)
+
+    def rows(self, qs):
+        keys = self.keys
+        return [dict(zip(keys, t)) for t in self.queryset(qs)]
+
+    def iter(self, qs, chunk_size=2000):
+        """نفس rows بس generator على .iterator() — ذاكرة ثابتة."""
+        keys = self.keys
+        for t in self.queryset(qs).iterator(chunk_size=chunk_size):
+            yield dict(zip(keys, t))
+
+    def one(self, obj):
+        return {k: get(obj) for k, get in zip(self.keys, self._getters)}
+
+
+# ---------- Encoding ----------
+# التواريخ/Decimal/UUID بنفس فورمات DjangoJSONEncoder (زي JsonResponse بالظبط)
+_django_default = DjangoJSONEncoder().default
+
+
+def dumps(data):
+    """bytes."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_django_default,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_response(data, status=200):
+    """بديل JsonResponse بالـ encoder الأسرع."""
+    return HttpResponse(dumps(data), status=status, content_type="application/json")
+
+
+# ---------- NDJSON streaming ----------
+NDJSON_CHUNK_SIZE = 2000          # صفوف لكل fetch من الداتابيز
+_NDJSON_FLUSH_BYTES = 64 * 1024   # بنجمع السطور لحد ~64KB قبل ما نبعت
+
+
+def wants_ndjson(request):
+    return (request.GET.get("format") or "").strip().lower() == "ndjson"
+
+
+def _ndjson_lines(rows):
+    buf, size = [], 0
+    for row in rows:
+        line = dumps(row) + b"\n"
+        buf.append(line)
+        size += len(line)
+        if size >= _NDJSON_FLUSH_BYTES:
+            yield b"".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield b"".join(buf)
+
+
+def ndjson_response(rows, filename=None):
+    """
+    StreamingHttpResponse: JSON object في كل سطر، من غير cap.
+    rows = generator (عادةً Projection.iter) — مفيش list كاملة في الذاكرة.
+    """
+    resp = StreamingHttpResponse(_ndjson_lines(rows), content_type="application/x-ndjson")
+    resp["X-Accel-Buffering"] = "no"
+    if filename:
+        resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return resp
@@ -45,6 +45,8 @@ INSTALLED_APPS = [
     'reps',
     'archives',
     'dashboardapp',
+    'search.apps.SearchConfig',
+    'jobs',
 ]
 
 MIDDLEWARE = [
@@ -53,6 +55,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,6 +87,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL: القرّاء ما بيستنوش الكاتب ولا بعض (med/fanout.py بيشغّل queries بالتوازي)
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'timeout': 20,
+        },
     }
 }
 
@@ -130,6 +138,26 @@ STATICFILES_DIRS = [ BASE_DIR / 'static' ]
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Roles: مدة كاش أدوار اليوزر (ثواني) — بيتمسح أوتوماتيك لما الجروبات تتغيّر
+# (بيشتغل بس مع كاش مشترك زي Redis/Memcached؛ مع LocMem الأدوار بتتحل مرة لكل request)
+ROLE_CACHE_TIMEOUT = 300
+
+# Jobs: طابور في الداتابيز — الـ worker: python manage.py run_jobs
+# EAGER=1 → الجوبات تتنفذ فوراً جوه الـ request (من غير worker)
+JOBS_ALWAYS_EAGER = os.environ.get('DJANGO_JOBS_EAGER', '0').strip() in ('1','true','True','yes','YES')
+JOBS_COALESCE_SECONDS = 2    # مهلة دمج الـ enqueues على نفس الـ key
+JOBS_STALE_SECONDS = 600     # running أقدم من كده يرجع pending
+
+# Dashboard: مدة كاش الـ payload (ثواني) — أي كتابة بتغيّر نسخة الجدول فالكاش مش بيرجّع أرقام قديمة
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# med/fanout.py: أقصى عدد queries مستقلة بتتنفذ بالتوازي (1 = sequential)
+FANOUT_MAX_WORKERS = int(os.environ.get('DJANGO_FANOUT_WORKERS', '4') or 4)
+
+# Cold tier (archives/coldstore.py): الصفوف الأقدم من كده بتتنقل لـ segments gzip JSONL — python manage.py tier_cold
+ARCHIVE_COLD_DIR = Path(os.environ.get('DJANGO_ARCHIVE_COLD_DIR') or BASE_DIR / 'cold')
+ARCHIVE_COLD_AFTER_DAYS = int(os.environ.get('DJANGO_ARCHIVE_COLD_DAYS', '365') or 365)
+
 LOGIN_URL = '/users/login/'
 LOGIN_REDIRECT_URL = '/users/post-login/'
 LOGOUT_REDIRECT_URL = '/users/login/'
@@ -0,0 +1,130 @@
+import json
+import threading
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.http import JsonResponse
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import fanout, serializers
+
+
+class DumpsTests(SimpleTestCase):
+    """dumps: orjson والـ fallback (json + DjangoJSONEncoder) بيطلّعوا نفس الـ bytes."""
+
+    DATA = {
+        'id': 1,
+        'at': timezone.make_aware(datetime(2025, 3, 18, 9, 30, 15, 123456)),
+        'day': date(2025, 3, 18),
+        'shift': time(9, 30),
+        'amount': Decimal('1.50'),
+        'uid': uuid.UUID(int=1),
+        'entity': 'مستشفى السلام',
+        7: [None, True, 1.5],
+    }
+    EXPECTED = (
+        '{"id":1,"at":"2025-03-18T09:30:15.123+03:00","day":"2025-03-18","shift":"09:30:00",'
+        '"amount":"1.50","uid":"00000000-0000-0000-0000-000000000001","entity":"مستشفى السلام",'
+        '"7":[null,true,1.5]}'
+    ).encode('utf-8')
+
+    def test_fallback_without_orjson(self):
+        with mock.patch.object(serializers, 'orjson', None):
+            out = serializers.dumps(self.DATA)
+        self.assertEqual(out, self.EXPECTED)
+        # نفس القيم اللي JsonResponse كان بيرجّعها
+        self.assertEqual(json.loads(out), json.loads(JsonResponse(self.DATA).content))
+
+    @skipUnless(serializers.orjson is not None, 'orjson مش متسطّب')
+    def test_orjson_matches_fallback(self):
+        self.assertEqual(serializers.dumps(self.DATA), self.EXPECTED)
+
+    def test_ndjson_lines_in_both_backends(self):
+        rows = [{'id': i, 'day': date(2025, 3, i)} for i in range(1, 4)]
+        expected = b''.join(serializers.dumps(r) + b'\n' for r in rows)
+        with mock.patch.object(serializers, 'orjson', None):
+            fallback = b''.join(serializers.ndjson_response(iter(rows)).streaming_content)
+        self.assertEqual(fallback, expected)
+        self.assertEqual(fallback.splitlines()[0], b'{"id":1,"day":"2025-03-01"}')
+        self.assertEqual(b''.join(serializers.ndjson_response(iter(rows)).streaming_content), expected)
+
+
+@override_settings(FANOUT_MAX_WORKERS=4)
+class FanoutTests(TransactionTestCase):
+    """
+    fanout.run برة أي transaction: المهام بتشتغل على threads الـ pool فعلاً وكل worker بيقفل
+    الـ connections بتاعته. (على SQLite in-memory بتاع التيست close() نفسها no-op، فبنتأكد
+    من النداء على close_all جوه كل worker.)
+    """
+
+    def setUp(self):
+        User.objects.create_user('fanout_a', password='x')
+        User.objects.create_user('fanout_b', password='x')
+        real_close_all = connections.close_all
+        self.closed_in = []
+
+        def close_all():
+            self.closed_in.append(threading.current_thread().name)
+            real_close_all()
+
+        patcher = mock.patch.object(fanout.connections, 'close_all', side_effect=close_all)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_parallel_branch_runs_on_workers_and_closes_connections(self):
+        # الـ barrier بيعدّي بس لو المهمتين شغّالين في نفس الوقت
+        barrier = threading.Barrier(2, timeout=5)
+
+        def task(username):
+            barrier.wait()
+            return threading.current_thread().name, User.objects.filter(username=username).exists()
+
+        res = fanout.run({'a': lambda: task('fanout_a'), 'b': lambda: task('fanout_b')})
+        names = {name for name, _ in res.values()}
+        self.assertEqual(len(names), 2)
+        self.assertTrue(all(n.startswith('fanout') for n in names))
+        # الـ workers شايفين الداتا اللي اتعملها commit
+        self.assertEqual([found for _, found in res.values()], [True, True])
+        self.assertEqual(sorted(self.closed_in), sorted(names))
+        # connection الـ main thread ما اتقفلتش
+        self.assertNotIn(threading.current_thread().name, self.closed_in)
+
+    def test_error_is_raised_after_all_tasks_finish(self):
+        done = threading.Event()
+
+        def slow():
+            done.wait(timeout=5)
+            return User.objects.count()
+
+        def boom():
+            done.set()
+            raise ValueError('boom')
+
+        with self.assertRaisesMessage(ValueError, 'boom'):
+            fanout.run({'slow': slow, 'boom': boom})
+        self.assertEqual(len(self.closed_in), 2)
+
+    def test_nested_run_is_inline_inside_worker(self):
+        def outer():
+            return fanout.run({'x': lambda: threading.current_thread().name,
+                               'y': lambda: threading.current_thread().name})
+
+        res = fanout.run({'o1': outer, 'o2': outer})
+        for inner in res.values():
+            # المهام الداخلية على نفس الـ worker (من غير ما تستنى الـ pool)
+            self.assertEqual(len(set(inner.values())), 1)
+        self.assertFalse(getattr(fanout._local, 'worker', False))
+
+    def test_inline_inside_atomic_and_single_worker(self):
+        main = threading.current_thread().name
+        tasks = {'a': lambda: threading.current_thread().name, 'b': lambda: threading.current_thread().name}
+        with transaction.atomic():
+            self.assertEqual(set(fanout.run(tasks).values()), {main})
+        with self.settings(FANOUT_MAX_WORKERS=1):
+            self.assertEqual(set(fanout.run(tasks).values()), {main})
+        self.assertEqual(self.closed_in, [])
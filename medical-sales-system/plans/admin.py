@@ -2,14 +2,17 @@
 from django.contrib import admin
 from django.utils import timezone
 from .models import WeeklyPlan
+from dashboardapp.cache import bump as bump_dashboard
 
 @admin.action(description="Soft delete (أرشفة)")
 def soft_delete(modeladmin, request, queryset):
     queryset.update(is_deleted=True, deleted_at=timezone.now(), deleted_by=request.user)
+    bump_dashboard('plans')
 
 @admin.action(description="Restore (استرجاع)")
 def restore(modeladmin, request, queryset):
     queryset.update(is_deleted=False, deleted_at=None, deleted_by=None)
+    bump_dashboard('plans')
 
 @admin.register(WeeklyPlan)
 class WeeklyPlanAdmin(admin.ModelAdmin):
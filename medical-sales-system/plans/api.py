@@ -3,13 +3,42 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.views.decorators.http import require_GET, require_POST
 from django.utils import timezone
-from django.db.models import Q
-
-from .models import WeeklyPlan
 
+from django.db.models import F, Value, CharField
+from django.db.models.functions import Cast, Concat
 
-def _is_manager(u):
-    return u.is_authenticated and u.groups.filter(name='Manager').exists()
+from .models import WeeklyPlan
+from search.index import search_queryset
+from med.serializers import (
+    Projection, Computed, rep_display, json_response,
+    wants_ndjson, ndjson_response, NDJSON_CHUNK_SIZE,
+)
+
+
+PLAN_OPTION_FIELDS = Projection(
+    id="id",
+    label=Computed(
+        Concat(Value("#"), Cast("id", CharField()), Value(" — "), F("aa_plan"),
+               Value(" — "), Cast("planned_date", CharField()), output_field=CharField()),
+        lambda p: f"#{p.id} — {p.aa_plan} — {p.planned_date}",
+    ),
+    week_number="week_number",
+    status="status",
+    rep=rep_display("rep"),
+)
+
+PLAN_FIELDS = Projection(
+    id="id",
+    aa_plan="aa_plan",
+    planned_date="planned_date",
+    product_line="product_line",
+    entity_type="entity_type",
+    specialization="specialization",
+    status="status",
+    week_number="week_number",
+    rep=rep_display("rep"),
+    is_deleted="is_deleted",
+)
 
 
 @login_required
@@ -20,7 +49,7 @@ def api_weeks(request):
     المدير: كل الريبس. الريب: خططه فقط.
     """
     qs = WeeklyPlan.objects.filter(status='approved', is_deleted=False)
-    if not _is_manager(request.user):
+    if not request.is_manager:
         qs = qs.filter(rep=request.user)
 
     weeks = (qs.values_list('week_number', flat=True)
@@ -42,20 +71,12 @@ def api_plans_by_week(request):
 
     qs = WeeklyPlan.objects.filter(
         status='approved', is_deleted=False, week_number=w
-    ).select_related('rep').order_by('-planned_date', '-id')
+    ).order_by('-planned_date', '-id')
 
-    if not _is_manager(request.user):
+    if not request.is_manager:
         qs = qs.filter(rep=request.user)
 
-    rows = [{
-        "id": p.id,
-        "label": f"#{p.id} — {p.aa_plan} — {p.planned_date}",
-        "week_number": p.week_number,
-        "status": p.status,
-        "rep": p.rep.get_full_name() or p.rep.username,
-    } for p in qs]
-
-    return JsonResponse({"rows": rows})
+    return json_response({"rows": PLAN_OPTION_FIELDS.rows(qs)})
 
 
 @login_required
@@ -64,14 +85,15 @@ def api_list(request):
     """
     لست الخطط: افتراضي يخفي المؤرشف.
     المدير: ?show=archived أو ?show=all
-    دعم بحث q على aa_plan/status/week_number/rep.username
+    دعم بحث q عبر فهرس البحث (aa_plan/status/week_number/rep ...)
+    ?format=ndjson → كل الصفوف streaming (من غير حد الـ 200)
     """
     q    = (request.GET.get('q') or '').strip()
     show = (request.GET.get('show') or '').strip().lower()
 
-    qs = WeeklyPlan.objects.select_related('rep').order_by('-planned_date', '-id')
+    qs = WeeklyPlan.objects.order_by('-planned_date', '-id')
 
-    if _is_manager(request.user):
+    if request.is_manager:
         if show == 'archived':
             qs = qs.filter(is_deleted=True)
         elif show == 'all':
@@ -82,27 +104,13 @@ def api_list(request):
         qs = qs.filter(is_deleted=False, rep=request.user)
 
     if q:
-        qs = qs.filter(
-            Q(aa_plan__icontains=q) |
-            Q(status__icontains=q) |
-            Q(week_number__icontains=q) |
-            Q(rep__username__icontains=q)
-        )
-
-    rows = [{
-        "id": p.id,
-        "aa_plan": p.aa_plan,
-        "planned_date": p.planned_date,
-        "product_line": p.product_line,
-        "entity_type": p.entity_type,
-        "specialization": p.specialization,
-        "status": p.status,
-        "week_number": p.week_number,
-        "rep": p.rep.get_full_name() or p.rep.username,
-        "is_deleted": p.is_deleted,
-    } for p in qs[:200]]
-
-    return JsonResponse({"rows": rows})
+        qs = search_queryset(qs, q)
+
+    # ?format=ndjson → كل الخطط streaming من غير الـ cap
+    if wants_ndjson(request):
+        return ndjson_response(PLAN_FIELDS.iter(qs, chunk_size=NDJSON_CHUNK_SIZE))
+
+    return json_response({"rows": PLAN_FIELDS.rows(qs[:200])})
 
 
 @login_required
@@ -117,7 +125,7 @@ def api_archive(request, pk):
         return HttpResponseBadRequest("Plan not found")
 
     # الريب يؤرشف خطته فقط؛ المدير يؤرشف أي خطة
-    if not _is_manager(request.user) and obj.rep_id != request.user.id:
+    if not request.is_manager and obj.rep_id != request.user.id:
         return HttpResponseBadRequest("Not allowed")
 
     obj.is_deleted = True
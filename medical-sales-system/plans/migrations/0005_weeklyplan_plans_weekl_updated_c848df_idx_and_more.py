@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plans', '0004_alter_weeklyplan_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='weeklyplan',
+            index=models.Index(fields=['updated_at'], name='plans_weekl_updated_c848df_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weeklyplan',
+            index=models.Index(fields=['deleted_at'], name='plans_weekl_deleted_b6bb0b_idx'),
+        ),
+    ]
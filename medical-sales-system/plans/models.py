@@ -71,4 +71,7 @@ class WeeklyPlan(models.Model):
             models.Index(fields=['week_number']),
             models.Index(fields=['status']),
             models.Index(fields=['is_deleted']),
+            # delta sync (visits/sync.py): updated_at >= t OR deleted_at >= t
+            models.Index(fields=['updated_at']),
+            models.Index(fields=['deleted_at']),
         ]
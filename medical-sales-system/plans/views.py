@@ -4,23 +4,23 @@ from django.views.decorators.http import require_POST
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Q
-from django.http import HttpResponse
+from django.db.models import Q, Case, When, F, Value, CharField
 from django.utils import timezone
-import csv
 
 from .models import WeeklyPlan
-from archives.models import ArchiveWeekly  # ← لإخفاء الأسابيع المؤرشفة وإضافة السنابشوت
-
-# ---- Helpers ----
-def is_manager(u):
-    return u.is_authenticated and u.groups.filter(name='Manager').exists()
+from archives.models import ArchiveWeekly  # ← لإخفاء الأسابيع المؤرشفة
+from archives.counters import upsert_week  # ← السنابشوت (INSERT … ON CONFLICT)
+from accounts.roles import is_manager
+from search.index import search_queryset
+from med.exports import csv_response, wants_csv
+from med.serializers import Computed, rep_display
 
+_STATUS_LABELS = dict(WeeklyPlan.STATUS_CHOICES)
 
 # ---- Weekly (list + create + search + export) ----
 @login_required
 def weekly_view(request):
-    mgr = is_manager(request.user)
+    mgr = request.is_manager
 
     # بارامترات العرض
     show = (request.GET.get('show') or 'active').strip().lower()  # active | deleted | all
@@ -46,20 +46,9 @@ def weekly_view(request):
     if wk.isdigit():
         qs = qs.filter(week_number=int(wk))
 
-    # بحث ?q=
+    # بحث ?q= (FTS index + relevance)
     if q:
-        qs = qs.filter(
-            Q(aa_plan__icontains=q) |
-            Q(entity_address__icontains=q) |
-            Q(notes__icontains=q) |
-            Q(visit_objective__icontains=q) |
-            Q(specialization__icontains=q) |
-            Q(entity_type__icontains=q) |
-            Q(product_line__icontains=q) |
-            Q(rep__username__icontains=q) |
-            Q(rep__first_name__icontains=q) |
-            Q(rep__last_name__icontains=q)
-        )
+        qs = search_queryset(qs, q)
 
     # إخفاء الأسابيع المؤرشفة (موجودة في ArchiveWeekly) — مع إبقاء الـPending ظاهر للموافقة
     if hide_archived:
@@ -73,22 +62,18 @@ def weekly_view(request):
             qs = qs.exclude(Q(week_number__in=arch_weeks) & ~Q(status='pending'))
 
     # Export CSV بنفس الفلاتر الحالية
-    if request.GET.get('export') == 'csv':
-        resp = HttpResponse(content_type='text/csv; charset=utf-8')
-        resp['Content-Disposition'] = 'attachment; filename="weekly_plans.csv"'
-        w = csv.writer(resp)
-        w.writerow([
-            'ID','Aa Plan','Planned Date','Product Line','Entity Address','Entity Type',
-            'Specialization','Notes','Visit Objective','Other Objective','Rep','Week #','Status'
-        ])
-        for p in qs:
-            w.writerow([
-                p.id, p.aa_plan, p.planned_date, p.product_line, p.entity_address, p.entity_type,
-                p.specialization, p.notes, p.visit_objective,
-                (p.other_objective if p.visit_objective == 'Other' else ''),
-                (p.rep.get_full_name() or p.rep.username), p.week_number, p.get_status_display()
-            ])
-        return resp
+    if wants_csv(request):
+        other = Case(When(visit_objective='Other', then=F('other_objective')),
+                     default=Value(''), output_field=CharField())
+        return csv_response(qs, [
+            ('ID', 'id'), ('Aa Plan', 'aa_plan'), ('Planned Date', 'planned_date'),
+            ('Product Line', 'product_line'), ('Entity Address', 'entity_address'),
+            ('Entity Type', 'entity_type'), ('Specialization', 'specialization'), ('Notes', 'notes'),
+            ('Visit Objective', 'visit_objective'),
+            ('Other Objective', Computed(other, None)),
+            ('Rep', rep_display('rep')), ('Week #', 'week_number'),
+            ('Status', 'status', lambda v: _STATUS_LABELS.get(v, v)),
+        ], 'weekly_plans.csv')
 
     # POST: إنشاء Plan جديدة (الـRep دايمًا نفسه / المدير يقدر يختار من الـselect)
     if request.method == 'POST':
@@ -187,9 +172,7 @@ def approve_weekly(request, pk):
         # سيزيد total_visits / unique_clients لاحقًا عند إنشاء العميل (clientsapp/views.py)
     }
     try:
-        ArchiveWeekly.objects.update_or_create(
-            rep=plan.rep, week_no=plan.week_number, defaults=defaults
-        )
+        upsert_week(plan.rep_id, plan.week_number, defaults)
     except Exception:
         # لو فيه أي مشكلة في الأرشيف، نكمّل موافقة الخطة بس نعرض تنبيه
         messages.warning(request, 'Plan approved, but archiving snapshot failed.')
@@ -1,13 +1,12 @@
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Q
+from django.db.models import Q, Exists, OuterRef
 from django.contrib import messages
-from django.http import HttpResponse
 from .models import RepProfile # لو لسه عامل الموديل
-
-def is_manager(u):
-    return u.is_authenticated and u.groups.filter(name='Manager').exists()
+from accounts.roles import is_manager
+from med.exports import csv_response, wants_csv
+from med.serializers import Computed
 
 @login_required
 @user_passes_test(is_manager)  # أو @user_passes_test(is_manager, login_url='accounts:login')
@@ -44,23 +43,16 @@ def reps_list(request):
         qs = qs.filter(groups__name=role)
 
     # Export CSV (مضاف عمود Role)
-    if request.GET.get('export') == 'csv':
-        import csv
-        resp = HttpResponse(content_type='text/csv')
-        resp['Content-Disposition'] = 'attachment; filename="reps.csv"'
-        w = csv.writer(resp)
-        w.writerow(['#','First Name','Last Name','Email','Phone 1','Phone 2','Territory','Role','Active'])
-        for idx, u in enumerate(qs, start=1):
-            groups = [g.name for g in u.groups.all()]
-            role_label = 'Manager' if 'Manager' in groups else 'Rep'   # rename علشان ما نغطيش على متغير GET
-            p = getattr(u, 'repprofile', None)
-            w.writerow([
-                idx, u.first_name, u.last_name, u.email,
-                (p.phone1 if p else ''), (p.phone2 if p else ''), (p.territory if p else ''),
-                role_label,
-                ('Active' if u.is_active else 'Inactive')
-            ])
-        return resp
+    if wants_csv(request):
+        # Role = Manager لو في جروب Manager — EXISTS في نفس الـ query بدل u.groups.all() لكل صف
+        is_mgr = Exists(User.groups.through.objects.filter(user_id=OuterRef('pk'), group__name='Manager'))
+        return csv_response(qs, [
+            ('First Name', 'first_name'), ('Last Name', 'last_name'), ('Email', 'email'),
+            ('Phone 1', 'repprofile__phone1'), ('Phone 2', 'repprofile__phone2'),
+            ('Territory', 'repprofile__territory'),
+            ('Role', Computed(is_mgr, None), lambda m: 'Manager' if m else 'Rep'),
+            ('Active', 'is_active', lambda a: 'Active' if a else 'Inactive'),
+        ], 'reps.csv', numbered=True)
 
     # Pagination
     total = qs.count()
@@ -119,7 +111,7 @@ def delete_rep(request, pk):
         if user.is_superuser or user == request.user:
             messages.error(request, 'Cannot delete this user.')
             return redirect('reps:list')
-        if user.groups.filter(name='Manager').exists():
+        if is_manager(user):
             messages.error(request, 'Cannot delete another manager.')
             return redirect('reps:list')
         username = user.username
@@ -0,0 +1,248 @@
+# search/index.py
+"""
+فهرس بحث نصي (SQLite FTS5) بدل سلاسل icontains في صفحات القوائم.
+
+- جدول FTS5 لكل موديل: rowid = pk، وعمود لكل حقل قابل للبحث.
+- tokenizer = trigram لو متاح (بحث substring زي LIKE '%q%' بالظبط)،
+  وإلا unicode61 (بحث prefix على الكلمات).
+- لو FTS5 مش متاح (قاعدة غير SQLite) أو الكلمة أقصر من 3 حروف مع trigram،
+  نرجع لـ icontains على نفس الحقول.
+- الفهرس بيتحدث من signals (save/delete) ومن مسارات الـ bulk اللي بتنادي index_objects.
+  queryset.update() ما بيطلقش signals: أي update بيلمس حقل من INDEXED لازم يعمل
+  index_objects للصفوف اللي اتلمست (زي archives/finalize.py مع status). الـ soft-delete
+  updates (is_deleted / deleted_at) مش محتاجة، لأن الفلترة عليهم في الـ queryset نفسه.
+  أي drift: python manage.py rebuild_search_index
+"""
+from django.apps import apps
+from django.db import connection
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+
+# label → حقول البحث (تقبل lookups عبر العلاقات زي rep__username)
+INDEXED = {
+    'visits.DailyVisit': [
+        'entity', 'client_doctor', 'address', 'city', 'phone',
+        'visit_objective', 'other_objective', 'visit_status',
+    ],
+    'clientsapp.Client': [
+        'doctor_name', 'entity_name', 'city', 'location', 'phone',
+        'email', 'status', 'notes',
+    ],
+    'plans.WeeklyPlan': [
+        'aa_plan', 'entity_address', 'notes', 'visit_objective', 'specialization',
+        'entity_type', 'product_line', 'status', 'week_number',
+        'rep__username', 'rep__first_name', 'rep__last_name',
+    ],
+    'archives.ArchiveWeekly': [
+        'aa_plan', 'targeted_line', 'entity_type', 'specialization', 'visit_objective',
+        'entity_address', 'notes', 'status', 'rep__username',
+    ],
+}
+
+TOKENIZERS = ("trigram", "unicode61 remove_diacritics 2")
+
+# كاش: اسم الجدول → tokenizer (أو None لو الجدول مش موجود)
+_tokenizer_cache = {}
+
+
+def _label(model):
+    return model._meta.label
+
+
+def _table(label):
+    app_label, model_name = label.split('.')
+    return f"search_{app_label.lower()}_{model_name.lower()}"
+
+
+def _columns(label):
+    return [f.replace('__', '_') for f in INDEXED[label]]
+
+
+def _available():
+    return connection.vendor == 'sqlite'
+
+
+def tokenizer_for(label):
+    """tokenizer الجدول الحالي (من sqlite_master) — None لو مفيش فهرس."""
+    if not _available():
+        return None
+    table = _table(label)
+    if table not in _tokenizer_cache:
+        with connection.cursor() as cur:
+            cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = %s", [table])
+            row = cur.fetchone()
+        tok = None
+        if row:
+            tok = "trigram" if "trigram" in (row[0] or "") else "unicode61"
+        _tokenizer_cache[table] = tok
+    return _tokenizer_cache[table]
+
+
+def reset_cache():
+    _tokenizer_cache.clear()
+
+
+# ============================
+# إنشاء / إعادة بناء الجداول
+# ============================
+
+def create_table(label):
+    """ينشئ جدول FTS5 للموديل (trigram أولاً ثم unicode61). يرجّع الـ tokenizer أو None."""
+    if not _available():
+        return None
+    table = _table(label)
+    cols = ", ".join(_columns(label))
+    for tok in TOKENIZERS:
+        try:
+            with connection.cursor() as cur:
+                cur.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({cols}, tokenize='{tok}')")
+            break
+        except Exception:
+            # tokenizer غير مدعوم في نسخة SQLite دي → جرّب اللي بعده
+            continue
+    else:
+        return None
+    _tokenizer_cache.pop(table, None)
+    return tokenizer_for(label)
+
+
+def drop_table(label):
+    if not _available():
+        return
+    with connection.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {_table(label)}")
+    _tokenizer_cache.pop(_table(label), None)
+
+
+def _doc_values(obj, label):
+    vals = []
+    for path in INDEXED[label]:
+        cur = obj
+        for part in path.split('__'):
+            cur = getattr(cur, part, None) if cur is not None else None
+        vals.append('' if cur is None else str(cur))
+    return vals
+
+
+def _row_values(row, label):
+    return ['' if row.get(p) is None else str(row[p]) for p in INDEXED[label]]
+
+
+def rebuild(label, model=None, chunk_size=2000):
+    """يمسح فهرس الموديل ويبنيه من الصفر. يرجّع عدد المستندات."""
+    drop_table(label)
+    if create_table(label) is None:
+        return 0
+    model = model or apps.get_model(label)
+    table = _table(label)
+    cols = _columns(label)
+    sql = f"INSERT INTO {table}(rowid, {', '.join(cols)}) VALUES ({', '.join(['%s'] * (len(cols) + 1))})"
+
+    n = 0
+    batch = []
+    with connection.cursor() as cur:
+        for row in model.objects.values('pk', *INDEXED[label]).iterator(chunk_size=chunk_size):
+            batch.append([row['pk'], *_row_values(row, label)])
+            if len(batch) >= chunk_size:
+                cur.executemany(sql, batch)
+                n += len(batch)
+                batch = []
+        if batch:
+            cur.executemany(sql, batch)
+            n += len(batch)
+    return n
+
+
+# ============================
+# مزامنة (save / delete)
+# ============================
+
+def is_indexed(model):
+    return _label(model) in INDEXED
+
+
+def touches_index(model, update_fields):
+    """save(update_fields=...) اللي مش بيلمس حقول البحث (زي soft-delete) مش محتاج تحديث."""
+    if update_fields is None:
+        return True
+    roots = {p.split('__')[0] for p in INDEXED[_label(model)]}
+    return bool(roots & set(update_fields))
+
+
+def index_objects(model, objs):
+    """upsert لمجموعة مستندات (يُستخدم من signals ومن مسارات bulk_create/bulk_update)."""
+    label = _label(model)
+    if not objs or tokenizer_for(label) is None:
+        return
+    cols = _columns(label)
+    sql = (f"INSERT OR REPLACE INTO {_table(label)}(rowid, {', '.join(cols)}) "
+           f"VALUES ({', '.join(['%s'] * (len(cols) + 1))})")
+    with connection.cursor() as cur:
+        cur.executemany(sql, [[o.pk, *_doc_values(o, label)] for o in objs])
+
+
+def unindex_ids(model, ids):
+    label = _label(model)
+    ids = [i for i in ids if i is not None]
+    if not ids or tokenizer_for(label) is None:
+        return
+    with connection.cursor() as cur:
+        cur.executemany(f"DELETE FROM {_table(label)} WHERE rowid = %s", [[i] for i in ids])
+
+
+# ============================
+# البحث
+# ============================
+
+def _match_expr(q, tokenizer):
+    if tokenizer == "trigram":
+        # trigram محتاج 3 حروف على الأقل
+        if len(q) < 3:
+            return None
+        return '"' + q.replace('"', '""') + '"'
+    terms = [t.replace('"', '""') for t in q.split()]
+    if not terms:
+        return None
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def fallback_q(model, q):
+    cond = Q()
+    for path in INDEXED[_label(model)]:
+        cond |= Q(**{f"{path}__icontains": q})
+    return cond
+
+
+class _Rank(Func):
+    """bm25 (rank في FTS5 — الأصغر أنسب) للصف: subquery بـ rowid = pk جوه نفس الـ query."""
+    arg_joiner = ' AND rowid = '
+    output_field = FloatField()
+
+    def __init__(self, table, match):
+        super().__init__(Value(match), F('pk'),
+                         template=f"(SELECT rank FROM {table} WHERE {table} MATCH %(expressions)s)")
+
+
+def search_queryset(qs, q, rank=True):
+    """
+    فلترة qs بالمستندات المطابقة لـ q.
+    rank=True: الأعلى relevance الأول جوه النتايج المفلترة نفسها، وبعدها الترتيب الأصلي.
+    """
+    q = (q or '').strip()
+    if not q:
+        return qs
+    model = qs.model
+    label = _label(model)
+    tokenizer = tokenizer_for(label)
+    match = _match_expr(q, tokenizer) if tokenizer else None
+    if match is None:
+        return qs.filter(fallback_q(model, q))
+
+    table = _table(label)
+    qs = qs.filter(pk__in=RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [match]))
+    if not rank:
+        return qs
+
+    # الـ rank بيتحسب للصفوف اللي عدّت فلاتر qs بس (مش top-N على الجدول كله)
+    ordering = list(qs.query.order_by) or list(model._meta.ordering)
+    return qs.annotate(search_rank=_Rank(table, match)).order_by('search_rank', *ordering)
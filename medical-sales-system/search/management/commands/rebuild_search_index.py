@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from search import index
+
+
+class Command(BaseCommand):
+    help = "يعيد بناء فهرس البحث (FTS5) لكل الموديلات أو لموديل واحد."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', action='append', dest='models', default=None,
+            help="label الموديل (مثلاً visits.DailyVisit). ممكن تتكرر.",
+        )
+
+    def handle(self, *args, **opts):
+        labels = opts['models'] or list(index.INDEXED)
+        unknown = [l for l in labels if l not in index.INDEXED]
+        if unknown:
+            raise CommandError(f"Unknown model(s): {', '.join(unknown)}")
+
+        for label in labels:
+            n = index.rebuild(label)
+            tok = index.tokenizer_for(label) or 'none (icontains fallback)'
+            self.stdout.write(f"{label}: {n} documents [{tok}]")
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
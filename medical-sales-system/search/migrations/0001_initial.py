@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+def create_indexes(apps, schema_editor):
+    from search import index
+    for label in index.INDEXED:
+        index.rebuild(label, model=apps.get_model(label))
+
+
+def drop_indexes(apps, schema_editor):
+    from search import index
+    for label in index.INDEXED:
+        index.drop_table(label)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('visits', '0006_remove_dailyvisit_doctor_name_and_more'),
+        ('clientsapp', '0003_alter_client_options_remove_client_weekly_plan'),
+        ('plans', '0004_alter_weeklyplan_options_and_more'),
+        ('archives', '0004_archiveweekly_total_visits_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,21 @@
+# search/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import index
+
+
+@receiver(post_save)
+def index_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not index.is_indexed(sender):
+        return
+    if not index.touches_index(sender, update_fields):
+        return
+    index.index_objects(sender, [instance])
+
+
+@receiver(post_delete)
+def unindex_on_delete(sender, instance, **kwargs):
+    if not index.is_indexed(sender):
+        return
+    index.unindex_ids(sender, [instance.pk])
@@ -0,0 +1,77 @@
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from visits.models import DailyVisit
+from . import index
+
+
+class SearchQuerysetTests(TestCase):
+    """search_queryset: مطابقة عربي/إنجليزي، الترتيب جوه النتايج المفلترة، والـ fallback."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rep = User.objects.create_user('search_rep', password='x')
+        cls.other = User.objects.create_user('search_other', password='x')
+
+        def visit(rep, **fields):
+            return DailyVisit.objects.create(rep=rep, visit_date=date(2025, 3, 18), **fields)
+
+        cls.arabic = visit(cls.rep, entity='مستشفى السلام الدولي', city='القاهرة')
+        cls.english = visit(cls.rep, entity='Cairo Medical Center', city='Giza')
+        # نفس الكلمة في 3 حقول → أنسب من الزيارة اللي فيها مرة واحدة
+        cls.strong = visit(cls.rep, entity='Nile Clinic', address='Nile Street', city='Nile City')
+        cls.weak = visit(cls.rep, entity='Nile', city='Aswan')
+        # مطابقات كتير عند مندوب تاني — برة الفلتر
+        for i in range(30):
+            visit(cls.other, entity=f'Nile Nile Nile {i}', address='Nile', city='Nile')
+
+    def setUp(self):
+        if index.tokenizer_for('visits.DailyVisit') is None:
+            self.skipTest('FTS5 مش متاح')
+
+    def _ids(self, q, qs=None, **kw):
+        qs = qs if qs is not None else DailyVisit.objects.filter(rep=self.rep)
+        return [v.pk for v in index.search_queryset(qs, q, **kw)]
+
+    def test_arabic_match(self):
+        self.assertEqual(self._ids('السلام'), [self.arabic.pk])
+        self.assertEqual(self._ids('القاهرة'), [self.arabic.pk])
+
+    def test_english_match_is_case_insensitive(self):
+        self.assertEqual(self._ids('medical'), [self.english.pk])
+        self.assertEqual(self._ids('GIZA'), [self.english.pk])
+
+    def test_rank_within_filtered_set(self):
+        qs = DailyVisit.objects.filter(rep=self.rep)
+        with self.assertNumQueries(1):
+            ids = self._ids('Nile', qs)
+        self.assertEqual(ids, [self.strong.pk, self.weak.pk])
+
+    def test_rank_uses_outer_alias_in_subquery(self):
+        # الـ queryset المترتب كـ subquery (Django بيغيّر الـ aliases) لازم يفضل صالح
+        inner = index.search_queryset(DailyVisit.objects.filter(rep=self.rep), 'Nile').values('pk')[:1]
+        self.assertEqual(list(DailyVisit.objects.filter(pk__in=inner).values_list('pk', flat=True)),
+                         [self.strong.pk])
+
+    def test_short_query_falls_back_to_icontains(self):
+        if index.tokenizer_for('visits.DailyVisit') != 'trigram':
+            self.skipTest('الـ fallback للكلمات القصيرة خاص بـ trigram')
+        self.assertEqual(sorted(self._ids('Gi')), [self.english.pk])
+        self.assertEqual(self._ids('سل'), [self.arabic.pk])
+
+    def test_fallback_without_index(self):
+        with mock.patch.object(index, 'tokenizer_for', return_value=None):
+            qs = index.search_queryset(DailyVisit.objects.filter(rep=self.rep), 'Medical')
+            self.assertNotIn('MATCH', str(qs.query))
+            self.assertEqual([v.pk for v in qs], [self.english.pk])
+
+    def test_index_follows_update_through_index_objects(self):
+        DailyVisit.objects.filter(pk=self.english.pk).update(entity='Renamed Hospital')
+        # update() من غير index_objects → الفهرس لسه على القيمة القديمة
+        self.assertEqual(self._ids('Renamed'), [])
+        index.index_objects(DailyVisit, [DailyVisit.objects.get(pk=self.english.pk)])
+        self.assertEqual(self._ids('Renamed'), [self.english.pk])
+        self.assertEqual(self._ids('Medical'), [])
@@ -1,29 +1,42 @@
 (function () {
-  const dataEl = document.getElementById('dashdata');
-  if (!dataEl) return;
-  const dash = JSON.parse(dataEl.textContent || '{}');
+  // الصفحة بتيجي shell فاضي؛ كل بلوك بيتجاب من /dashboard/api/* بالتوازي
+  // وبيترسم أول ما يوصل — أبطأ بلوك مش بيأخّر الباقي.
+  const root = document.getElementById('dash');
+  if (!root) return;
 
-  // ===== KPIs =====
-  const k = dash.kpis || {};
   const s = (id, v) => { const el = document.getElementById(id); if (el) el.textContent = (v ?? '0'); };
-  s('k_total', k.total);
-  s('k_approved', k.approved);
-  s('k_deals', k.deals);
-  s('k_reps', k.reps);
+  const qs = () => {
+    const p = new URLSearchParams();
+    ['range', 'bucket'].forEach(n => { const el = document.getElementById(n); if (el) p.set(n, el.value); });
+    return p.toString();
+  };
+
+  function getJSON(url) {
+    return fetch(url + '?' + qs(), { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+      .then(r => { if (!r.ok) throw new Error(r.status); return r.json(); });
+  }
 
-  s('conv', (k.conversion || 0) + '%');
-  s('clientsCount', k.clients);
-  s('upcoming', k.upcoming);
+  // ===== KPIs =====
+  function renderKpis(k) {
+    s('k_total', k.total);
+    s('k_approved', k.approved);
+    s('k_deals', k.deals);
+    s('k_reps', k.reps);
 
-  const repTotal = document.getElementById('repTotal');
-  if (repTotal) repTotal.textContent = (k.by_rep_total || 0) + ' visits';
+    s('conv', (k.conversion || 0) + '%');
+    s('clientsCount', k.clients);
+    s('upcoming', k.upcoming);
+  }
 
   // ===== Bars: Visits by Rep =====
-  (function renderBars(){
+  function renderBars(data) {
+    const repTotal = document.getElementById('repTotal');
+    if (repTotal) repTotal.textContent = (data.total || 0) + ' visits';
+
     const wrap = document.getElementById('bars');
     if (!wrap) return;
     wrap.innerHTML = '';
-    const rows = dash.by_rep || [];
+    const rows = data.rows || [];
     const max = Math.max(1, ...rows.map(r => r.count||0));
     rows.forEach(r => {
       const row = document.createElement('div');
@@ -39,21 +52,54 @@
       row.appendChild(bar);
       wrap.appendChild(row);
     });
-  })();
+  }
+
+  // ===== Line chart: Trend (canvas#lineChart) =====
+  const TITLES = {
+    month: 'Monthly Trend (last 12 months)',
+    week:  'Weekly Trend (last 12 weeks)',
+    day:   'Daily Trend (last 30 days)',
+    range: 'Daily Trend (selected range)',
+  };
+  let chart = null;
 
-  // ===== Line chart: Monthly Trend (canvas#lineChart) =====
-  (function renderLine(){
+  function renderTrend(trend) {
+    s('trendTitle', TITLES[trend.bucket] || TITLES.month);
     const cv = document.getElementById('lineChart');
     if (!cv) return;
+    const labels = trend.labels || [], visits = trend.visits || [], deals = trend.deals || [];
+
+    if (window.Chart) {
+      if (chart) {
+        chart.data.labels = labels;
+        chart.data.datasets[0].data = visits;
+        chart.data.datasets[1].data = deals;
+        chart.update();
+        return;
+      }
+      chart = new Chart(cv.getContext('2d'), {
+        type: 'line',
+        data: {
+          labels: labels,
+          datasets: [
+            { label: 'Visits', data: visits, borderColor: 'rgba(75, 192, 192, 1)',  borderWidth: 2, fill: false },
+            { label: 'Deals',  data: deals,  borderColor: 'rgba(153, 102, 255, 1)', borderWidth: 2, fill: false },
+          ]
+        },
+        options: { scales: { y: { beginAtZero: true } }, responsive: true }
+      });
+      return;
+    }
+    drawCanvas(cv, visits, deals);
+  }
+
+  // fallback من غير Chart.js (CDN مش متاح)
+  function drawCanvas(cv, visits, deals) {
     const ctx = cv.getContext('2d');
     const DPR = window.devicePixelRatio || 1;
     const w = cv.clientWidth * DPR, h = cv.clientHeight * DPR;
     cv.width = w; cv.height = h;
 
-    const labels = (dash.trend && dash.trend.labels) || [];
-    const visits = (dash.trend && dash.trend.visits) || [];
-    const deals  = (dash.trend && dash.trend.deals)  || [];
-
     const pad = 32 * DPR;
     const plotW = w - pad*2, plotH = h - pad*2;
     const maxY = Math.max(1, ...visits, ...deals);
@@ -105,14 +151,21 @@
     }
     drawLine(visits, color1);
     drawLine(deals,  color2);
-  })();
+  }
 
   // ===== Tables =====
-  function fillTable(tid, rows, cols){
+  function fillTable(tid, rows, cols, emptyText){
     const tb = document.querySelector(`#${tid} tbody`);
     if (!tb) return;
     tb.innerHTML = '';
-    (rows||[]).forEach(r=>{
+    if (!rows || !rows.length) {
+      const tr = document.createElement('tr');
+      const td = document.createElement('td');
+      td.colSpan = cols.length; td.textContent = emptyText;
+      tr.appendChild(td); tb.appendChild(tr);
+      return;
+    }
+    rows.forEach(r=>{
       const tr = document.createElement('tr');
       cols.forEach(c=>{
         const td = document.createElement('td');
@@ -122,22 +175,115 @@
       tb.appendChild(tr);
     });
   }
-  fillTable('t_recent', dash.recent, ['dt','rep','account','doctor','outcome']);
-  // upcoming: التاريخ ممكن يبقى Date object stringified من Django
-  const upcomingRows = (dash.upcoming||[]).map(r=>{
-    const d = (''+r.date).slice(0,10);
-    return {date:d, rep:r.rep, plan:r.plan, obj:r.obj};
-  });
-  fillTable('t_next', upcomingRows, ['date','rep','plan','obj']);
-
-  // ===== Range selector -> reload with query =====
-  const sel = document.getElementById('range');
-  if (sel) {
+
+  function renderRecent(data) {
+    fillTable('t_recent', data.rows, ['dt','rep','account','doctor','outcome'], 'No recent visits');
+  }
+
+  function renderUpcoming(data) {
+    const rows = (data.rows||[]).map(r => ({date: (''+r.date).slice(0,10), rep: r.rep, plan: r.plan, obj: r.obj}));
+    fillTable('t_next', rows, ['date','rep','plan','obj'], 'No upcoming weekly plans');
+  }
+
+  function renderAdherence(data) {
+    const t = data.totals || {};
+    s('adhTotal', `${t.started || 0}/${t.planned || 0} plans started · ${t.plan_rate || 0}%`);
+    const rows = (data.rows||[]).map(r => ({
+      week: 'W' + r.week + (r.frozen ? ' ✓' : ''), rep: r.rep,
+      planned: r.planned, started: r.started, visits: r.visits,
+      completed: r.completed, client_linked: r.client_linked,
+      plan_rate: r.plan_rate + '%', completion_rate: r.completion_rate + '%',
+    }));
+    fillTable('t_adherence', rows,
+      ['week','rep','planned','started','visits','completed','client_linked','plan_rate','completion_rate'],
+      'No weekly plans in range');
+  }
+
+  // ===== Heatmap: weekday × time_shift =====
+  let heat = null;
+
+  function drawHeat() {
+    const tbl = document.getElementById('t_heat');
+    if (!tbl || !heat) return;
+    const sel = document.getElementById('heatRep');
+    const rep = sel && sel.value ? (heat.reps || []).find(r => String(r.rep_id) === sel.value) : null;
+    const cells = rep ? rep.cells : (heat.cells || []);
+    const max = Math.max(1, ...cells.flat());
+
+    const head = tbl.querySelector('thead tr');
+    head.innerHTML = '<th></th>';
+    (heat.shifts || []).forEach(sh => { const th = document.createElement('th'); th.textContent = sh; head.appendChild(th); });
+
+    const tb = tbl.querySelector('tbody');
+    tb.innerHTML = '';
+    (heat.weekdays || []).forEach((day, d) => {
+      const tr = document.createElement('tr');
+      const th = document.createElement('td');
+      th.textContent = day;
+      tr.appendChild(th);
+      (cells[d] || []).forEach(n => {
+        const td = document.createElement('td');
+        td.textContent = n || '';
+        td.style.textAlign = 'center';
+        td.style.background = `rgba(79,140,255,${(n / max * 0.85).toFixed(2)})`;
+        tr.appendChild(td);
+      });
+      tb.appendChild(tr);
+    });
+  }
+
+  function renderHeatmap(data) {
+    heat = data;
+    const sel = document.getElementById('heatRep');
+    if (sel) {
+      const cur = sel.value;
+      sel.innerHTML = '<option value="">All reps</option>';
+      (data.reps || []).forEach(r => {
+        const o = document.createElement('option');
+        o.value = r.rep_id; o.textContent = `${r.rep} (${r.total})`;
+        sel.appendChild(o);
+      });
+      sel.value = (data.reps || []).some(r => String(r.rep_id) === cur) ? cur : '';
+    }
+    drawHeat();
+  }
+
+  const heatSel = document.getElementById('heatRep');
+  if (heatSel) heatSel.addEventListener('change', drawHeat);
+
+  // ===== Load =====
+  const PANELS = {
+    kpis:     [root.dataset.apiKpis,     renderKpis],
+    byRep:    [root.dataset.apiByRep,    renderBars],
+    trend:    [root.dataset.apiTrend,    renderTrend],
+    recent:   [root.dataset.apiRecent,   renderRecent],
+    upcoming: [root.dataset.apiUpcoming, renderUpcoming],
+    adherence: [root.dataset.apiAdherence, renderAdherence],
+    heatmap:  [root.dataset.apiHeatmap,  renderHeatmap],
+  };
+
+  function load(names) {
+    // كل الطلبات بتطلع مع بعض، وكل بلوك بيترسم لوحده أول ما يوصل
+    names.forEach(n => {
+      const [url, render] = PANELS[n];
+      if (!url) return;
+      getJSON(url).then(render).catch(err => console.error('dashboard panel', n, err));
+    });
+  }
+
+  load(Object.keys(PANELS));
+
+  // ===== Range / bucket selectors → refetch من غير reload =====
+  function bindSelect(id, names) {
+    const sel = document.getElementById(id);
+    if (!sel) return;
     sel.addEventListener('change', ()=>{
-      const v = sel.value;
       const url = new URL(location.href);
-      url.searchParams.set('range', v);
-      location.href = url.toString();
+      url.searchParams.set(id, sel.value);
+      history.replaceState(null, '', url.toString());
+      load(names);
     });
   }
+  bindSelect('range', ['kpis', 'byRep', 'trend', 'recent', 'adherence', 'heatmap']);
+  bindSelect('bucket', ['trend']);
 })();
@@ -2,20 +2,25 @@
 from django.contrib import admin
 from django.utils import timezone
 from .models import DailyVisit
+from dashboardapp import rollup
 
 @admin.action(description="Soft delete (أرشفة)")
 def soft_delete(modeladmin, request, queryset):
+    touched = rollup.keys_for(queryset)
     queryset.update(is_deleted=True, deleted_at=timezone.now(), deleted_by=request.user)
+    rollup.rebuild_keys(touched)
 
 @admin.action(description="Restore (استرجاع)")
 def restore(modeladmin, request, queryset):
+    touched = rollup.keys_for(queryset)
     queryset.update(is_deleted=False, deleted_at=None, deleted_by=None)
+    rollup.rebuild_keys(touched)
 
 @admin.register(DailyVisit)
 class DailyVisitAdmin(admin.ModelAdmin):
     list_display  = ('id','visit_date','time_shift','visit_status','visit_objective',
                      'entity','city','phone','rep','week_number','weekly_plan')
-    list_filter   = ('visit_date','visit_status','rep','city','week_number')
+    list_filter   = ('visit_date','status_code','is_deal','rep','city','week_number')
     search_fields = ('entity','address','city','phone','client_doctor',
                      'rep__username','rep__first_name','rep__last_name')
     autocomplete_fields = ('rep','client','weekly_plan')
@@ -3,16 +3,29 @@ from django.http import JsonResponse, HttpResponseBadRequest
 from django.views.decorators.http import require_GET, require_POST
 from django.utils.dateparse import parse_date, parse_datetime
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import Q, F, Value
+from django.db.models.functions import Coalesce, NullIf
 from django.contrib.auth.models import User
-from django.core.exceptions import FieldError
+from django.db import transaction
+import base64
+import json
+from collections import Counter
 
-from .models import DailyVisit
+from .models import DailyVisit, VisitStatus
 from plans.models import WeeklyPlan
+from search.index import search_queryset, index_objects
+from med.dates import day_range
+from med.serializers import (
+    Projection, Computed, rep_display, json_response,
+    wants_ndjson, ndjson_response, NDJSON_CHUNK_SIZE,
+)
+from .tasks import enqueue_plan_cascade
+from dashboardapp import rollup
 
 # محاولة استيراد موديل الأرشيف إن وُجد
 try:
     from archives.models import ArchiveWeekly
+    from archives.counters import ensure_week, visits_added, visits_moved, link_clients
 except Exception:
     ArchiveWeekly = None
 
@@ -21,34 +34,84 @@ except Exception:
 # Helpers — أرشفة تلقائية
 # ============================
 
-def _is_manager(u):
-    return u.is_authenticated and u.groups.filter(name='Manager').exists()
+# أعمدة الـ API — values_list واحد للّستات، ونفس الشكل من instance بعد الـ save
+VISIT_FIELDS = Projection(
+    id="id",
+    entity="entity",
+    actual_datetime="actual_datetime",
+    time_shift="time_shift",
+    doctor_name=Computed(Value(""), lambda v: ""),  # legacy key
+    phone="phone",
+    rep_id="rep_id",
+    rep=rep_display("rep"),
+    visit_outcome="visit_objective",
+    additional_outcome="other_objective",
+    visit_status="visit_status",
+    weekly_plan_id="weekly_plan_id",
+    client_doctor=Computed(
+        Coalesce(NullIf(F("client_doctor"), Value("")), F("client__doctor_name"), Value("")),
+        lambda v: v.client_doctor or (v.client.doctor_name if v.client_id else "") or "",
+    ),
+    address="address",
+    city="city",
+    is_deleted="is_deleted",
+    last_change=Computed(Value(""), lambda v: getattr(v, "last_change", "") or ""),
+    created_at="created_at",
+    updated_at="updated_at",
+)
 
 
 def _serialize_visit(v):
-    return {
-        "id": v.id,
-        "entity": getattr(v, "entity", "") or getattr(v, "visited_account", ""),
-        "actual_datetime": getattr(v, "actual_datetime", None),
-        "time_shift": getattr(v, "time_shift", ""),
-        "doctor_name": getattr(v, "doctor_name", ""),
-        "phone": getattr(v, "phone", "") or getattr(v, "phone_number", ""),
-        "rep_id": getattr(v, "rep_id", None),
-        "rep": (v.rep.get_full_name() or v.rep.username) if getattr(v, "rep", None) else "",
-        "visit_outcome": getattr(v, "visit_outcome", "") or getattr(v, "visit_objective", ""),
-        "additional_outcome": getattr(v, "additional_outcome", "") or getattr(v, "other_objective", ""),
-        "visit_status": getattr(v, "visit_status", "") or getattr(v, "status", ""),
-        "weekly_plan_id": getattr(v, "weekly_plan_id", None),
-        "client_doctor": getattr(v, "client_doctor", "") or (
-            getattr(v, "client", None) and getattr(v.client, "doctor_name", "") or ""
-        ),
-        "address": getattr(v, "address", ""),
-        "city": getattr(v, "city", ""),
-        "is_deleted": getattr(v, "is_deleted", False),
-        "last_change": getattr(v, "last_change", "") or "",
-        "created_at": getattr(v, "created_at", None),
-        "updated_at": getattr(v, "updated_at", None),
-    }
+    return VISIT_FIELDS.one(v)
+
+
+def _as_int(val):
+    try:
+        return int(val)
+    except (TypeError, ValueError):
+        return None
+
+
+def _encode_cursor(payload):
+    """توكن opaque (base64 لـ JSON) — الكلاينت يرجّعه زي ما هو."""
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(token):
+    """يرجّع الـ payload أو None لو التوكن بايظ."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        return json.loads(raw.decode("utf-8"))
+    except Exception:
+        return None
+
+
+def _visit_cursor(row):
+    """مفتاح الترتيب (actual_datetime, id) لآخر صف في الصفحة."""
+    dt = row["actual_datetime"]
+    return _encode_cursor([dt.isoformat() if dt else None, row["id"]])
+
+
+def _after_cursor(qs, token):
+    """
+    Keyset: الصفوف اللي بعد (actual_datetime, id) في ترتيب
+    actual_datetime DESC NULLS LAST, id DESC — من غير OFFSET.
+    """
+    payload = _decode_cursor(token)
+    if not (isinstance(payload, list) and len(payload) == 2 and isinstance(payload[1], int)):
+        return None
+    dt_str, last_id = payload
+    if dt_str is None:
+        return qs.filter(actual_datetime__isnull=True, id__lt=last_id)
+    dt = parse_datetime(dt_str) if isinstance(dt_str, str) else None
+    if dt is None:
+        return None
+    return qs.filter(
+        Q(actual_datetime__lt=dt) |
+        Q(actual_datetime=dt, id__lt=last_id) |
+        Q(actual_datetime__isnull=True)
+    )
 
 
 def _get_week_number_from_weekly(wp):
@@ -58,43 +121,13 @@ def _get_week_number_from_weekly(wp):
 
 def _upsert_archive_weekly_snapshot(wp):
     """
-    محاولة إنشاء/تحديث سنابشوت في ArchiveWeekly بشكل مرن.
-    لو الموديل/الحقول مش متوافقة، نتجاهل بصمت بدون كسر الفلو.
+    سنابشوت الأسبوع في ArchiveWeekly.
+    العدادات بتتحدث incrementally مع كل زيارة/عميل (archives.counters)،
+    فهنا بنضمن إن صف الأسبوع موجود بس — والعدّ بيحصل مرة واحدة وقت إنشاءه.
     """
     if ArchiveWeekly is None or wp is None:
         return
-
-    week_val = _get_week_number_from_weekly(wp)
-
-    # إجماليات سريعة من DailyVisit لنفس الخطة
-    total_visits = DailyVisit.objects.filter(weekly_plan_id=wp.id).count()
-    total_archived = DailyVisit.objects.filter(weekly_plan_id=wp.id, is_deleted=True).count()
-    # لو عندك FK client_id في الزيارة هنعد المميّز، وإلا نخليها صفر
-    try:
-        unique_clients = DailyVisit.objects.filter(weekly_plan_id=wp.id).values('client_id').distinct().count()
-    except Exception:
-        unique_clients = 0
-
-    # هنجرّب أكثر من شكل حقول بحيث ما نكسرش لو الاسكيمة مختلفة
-    attempts = [
-        # شائع: week_no فقط
-        ({"week_no": week_val}, {"total_visits": total_visits, "unique_clients": unique_clients}),
-        # بديل: week_number
-        ({"week_number": week_val}, {"total_visits": total_visits, "unique_clients": unique_clients}),
-        # بعض المشاريع بتحتاج plan FK
-        ({"week_no": week_val, "plan": wp}, {"total_visits": total_visits, "unique_clients": unique_clients}),
-        ({"week_number": week_val, "plan": wp}, {"total_visits": total_visits, "unique_clients": unique_clients}),
-    ]
-    for where, defaults in attempts:
-        try:
-            ArchiveWeekly.objects.update_or_create(**where, defaults=defaults)
-            return
-        except FieldError:
-            # جرّب محاولة أخرى بحقول بديلة
-            continue
-        except Exception:
-            # لو في شرط إجباري تاني في الموديل، نتجاهل بدون كسر الأرشفة العامة
-            return
+    ensure_week(wp.rep_id, _get_week_number_from_weekly(wp))
 
 
 def _archive_weekly_plan_if_done(weekly_plan_id, user):
@@ -143,28 +176,80 @@ def _auto_archive_visit_and_cascade(obj, user, reason="archived"):
         if hasattr(obj, 'deleted_by'):
             obj.deleted_by = user
         obj.last_change = f"{timezone.now():%Y-%m-%d %H:%M} — {user.username} {reason}"
+        concrete = {f.name for f in obj._meta.concrete_fields}
         try:
-            obj.save(update_fields=[f for f in ['is_deleted', 'deleted_at', 'deleted_by', 'last_change', 'updated_at'] if hasattr(obj, f)])
+            obj.save(update_fields=[f for f in ['is_deleted', 'deleted_at', 'deleted_by', 'last_change', 'updated_at'] if f in concrete])
         except Exception:
             obj.save()
 
-    # كاسكيد على الخطة
-    _archive_weekly_plan_if_done(getattr(obj, 'weekly_plan_id', None), user)
+    # كاسكيد على الخطة — في الطابور (بيتدمج لكل خطة)
+    enqueue_plan_cascade(getattr(obj, 'weekly_plan_id', None), user)
 
 
-def _is_done_status(val):
+def _bind_visit_fields(obj, pick):
     """
-    تعريف الحالات التي نعتبرها "منتهية" وتستحق الأرشفة الآلية.
-    تقدر تزود أو تقلل حسب نظامك.
+    binding آمن بأسماء بديلة للحقول النصية/التواريخ (مشترك بين api_save و api_bulk_save).
+    pick(*names) → أول قيمة غير فاضية.
     """
-    if not val:
-        return False
-    v = str(val).strip().lower()
-    return v in {
-        'done', 'completed', 'finished', 'closed',
-        'تم', 'منجز', 'منتهي', 'مكتمل',
-        'visited', 'success', 'ok'
-    }
+    ent = pick("visited_account", "entity", "account", "hospital", "clinic")
+    if ent is not None:
+        obj.entity = ent
+
+    # actual_datetime (+ visit_date auto)
+    dt_str = pick("actual_datetime", "actual_visit_datetime", "visit_datetime", "datetime", "date_time")
+    if dt_str:
+        dt = parse_datetime(dt_str)
+        if dt:
+            obj.actual_datetime = dt
+            if not getattr(obj, "visit_date", None):
+                obj.visit_date = dt.date()
+
+    vd_str = pick("visit_date")
+    if vd_str:
+        try:
+            obj.visit_date = parse_date(vd_str)
+        except Exception:
+            pass
+
+    ts = pick("time_shift", "timeshift", "time_slot", "shift", "shift_time")
+    if ts is not None and hasattr(obj, "time_shift"):
+        obj.time_shift = ts
+
+    dr = pick("doctor_name", "doctor", "dr_name", "doc_name")
+    if dr is not None and hasattr(obj, "doctor_name"):
+        obj.doctor_name = dr
+
+    ph = pick("phone", "phone_number", "mobile")
+    if ph is not None:
+        if hasattr(obj, "phone"): obj.phone = ph
+        elif hasattr(obj, "phone_number"): obj.phone_number = ph
+
+    outcome = pick("visit_outcome", "outcome", "result", "visit_result")
+    if outcome is not None:
+        if hasattr(obj, "visit_outcome"): obj.visit_outcome = outcome
+        if hasattr(obj, "visit_objective"): obj.visit_objective = outcome
+
+    add_out = pick("additional_outcome", "other_objective", "notes", "remarks", "desc", "description")
+    if add_out is not None:
+        if hasattr(obj, "additional_outcome"): obj.additional_outcome = add_out
+        elif hasattr(obj, "other_objective"): obj.other_objective = add_out
+
+    st = pick("visit_status", "status", "state")
+    if st is not None:
+        if hasattr(obj, "visit_status"): obj.visit_status = st
+        elif hasattr(obj, "status"): obj.status = st
+
+    addr = pick("address", "entity_address", "location", "addr")
+    if addr is not None and hasattr(obj, "address"):
+        obj.address = addr
+
+    city = pick("city", "town", "governorate")
+    if city is not None and hasattr(obj, "city"):
+        obj.city = city
+
+    cdoc = pick("client_doctor", "doctor_client", "client_doctor_name")
+    if cdoc is not None and hasattr(obj, "client_doctor"):
+        obj.client_doctor = cdoc
 
 
 # ============================
@@ -174,17 +259,23 @@ def _is_done_status(val):
 @login_required
 @require_GET
 def api_list(request):
-    """List + search + simple paging (JSON). Supports ?show=deleted/all (manager only)."""
+    """
+    List + search + paging (JSON). Supports ?show=deleted/all (manager only).
+    - Paging القديم: ?page=&size= (بيرجع total).
+    - Cursor mode: ?cursor= (فاضي لأول صفحة) ثم ?cursor=<next_cursor>.
+      مفيش OFFSET ولا COUNT إلا لو ?with_total=1.
+    - ?format=ndjson: كل الصفوف streaming (سطر JSON لكل زيارة) بنفس الفلاتر.
+    """
     q = (request.GET.get("q") or "").strip()
     date_str = (request.GET.get("date") or "").strip()
     size = int(request.GET.get("size") or request.GET.get("page_size") or 20)
     page = int(request.GET.get("page") or 1)
     show = (request.GET.get("show") or "").strip().lower()
 
-    qs = DailyVisit.objects.select_related("rep", "client", "weekly_plan").order_by("-actual_datetime", "-id")
+    qs = DailyVisit.objects.order_by(F("actual_datetime").desc(nulls_last=True), "-id")
 
     # إخفاء المؤرشف/المحذوف افتراضيًا
-    if _is_manager(request.user):
+    if request.is_manager:
         if show == "deleted":
             qs = qs.filter(is_deleted=True)
         elif show == "all":
@@ -195,28 +286,102 @@ def api_list(request):
         qs = qs.filter(is_deleted=False)
 
     # Rep يشوف زياراته فقط
-    if not _is_manager(request.user):
+    if not request.is_manager:
         qs = qs.filter(rep=request.user)
 
+    # بحث عبر فهرس FTS — الترتيب بالـ relevance في وضع الصفحات فقط (الـ cursor محتاج ترتيب ثابت)
+    cursor_mode = "cursor" in request.GET
     if q:
-        qs = qs.filter(
-            Q(entity__icontains=q) | Q(visited_account__icontains=q) |
-            Q(doctor_name__icontains=q) | Q(phone__icontains=q) |
-            Q(visit_outcome__icontains=q) | Q(visit_objective__icontains=q) |
-            Q(additional_outcome__icontains=q) | Q(other_objective__icontains=q) |
-            Q(address__icontains=q) | Q(city__icontains=q) |
-            Q(client_doctor__icontains=q)
-        )
+        qs = search_queryset(qs, q, rank=not cursor_mode)
 
     if date_str:
         d = parse_date(date_str)
         if d:
-            qs = qs.filter(Q(actual_datetime__date=d) | Q(visit_date=d))
+            # range نص مفتوح بالتوقيت المحلي بدل __date (اللي بيمنع الـ index)
+            lo, hi = day_range(d)
+            qs = qs.filter(Q(actual_datetime__gte=lo, actual_datetime__lt=hi) | Q(visit_date=d))
+
+    # ----- NDJSON: كل النتايج سطر سطر (من غير paging ولا cap) -----
+    if wants_ndjson(request):
+        return ndjson_response(VISIT_FIELDS.iter(qs, chunk_size=NDJSON_CHUNK_SIZE))
+
+    # ----- Cursor mode (keyset) -----
+    if cursor_mode:
+        size = max(1, size)
+        token = (request.GET.get("cursor") or "").strip()
+        with_total = (request.GET.get("with_total") or "").strip() in ("1", "true", "yes")
+        total = qs.count() if with_total else None
+
+        if token:
+            qs = _after_cursor(qs, token)
+            if qs is None:
+                return HttpResponseBadRequest("Invalid cursor")
+
+        # نجيب صف زيادة علشان نعرف فيه صفحة بعدها ولا لأ
+        batch = VISIT_FIELDS.rows(qs[:size + 1])
+        has_more = len(batch) > size
+        batch = batch[:size]
+
+        data = {
+            "size": size,
+            "rows": batch,
+            "next_cursor": _visit_cursor(batch[-1]) if (has_more and batch) else None,
+        }
+        if with_total:
+            data["total"] = total
+        return json_response(data)
 
     total = qs.count()
     start = (page - 1) * size
-    rows = [_serialize_visit(v) for v in qs[start:start + size]]
-    return JsonResponse({"total": total, "page": page, "size": size, "rows": rows})
+    rows = VISIT_FIELDS.rows(qs[start:start + size])
+    return json_response({"total": total, "page": page, "size": size, "rows": rows})
+
+
+_AUDIT_LABELS = {
+    "entity": "Visited Account",
+    "actual_datetime": "Actual DateTime",
+    "time_shift": "Time Shift",
+    "doctor_name": "Doctor Name",
+    "phone": "Phone",
+    "visit_outcome": "Visit Outcome",
+    "additional_outcome": "Additional Outcome",
+    "visit_status": "Visit Status",
+    "weekly_plan_id": "Weekly Plan",
+    "client_doctor": "Client (Doctor)",
+}
+
+
+def _audit_vals(obj):
+    """snapshot للحقول اللي بتظهر في last_change (مشترك بين api_save و api_bulk_save)."""
+    return {
+        "entity": getattr(obj, "entity", None),
+        "actual_datetime": getattr(obj, "actual_datetime", None),
+        "time_shift": getattr(obj, "time_shift", None),
+        "doctor_name": getattr(obj, "doctor_name", None),
+        "phone": getattr(obj, "phone", None) or getattr(obj, "phone_number", None),
+        "visit_outcome": getattr(obj, "visit_outcome", None) or getattr(obj, "visit_objective", None),
+        "additional_outcome": getattr(obj, "additional_outcome", None) or getattr(obj, "other_objective", None),
+        "visit_status": getattr(obj, "visit_status", None) or getattr(obj, "status", None),
+        "weekly_plan_id": getattr(obj, "weekly_plan_id", None),
+        "client_doctor": getattr(obj, "client_doctor", None),
+    }
+
+
+def _stamp_change(obj, user, old_vals=None):
+    """last_modified_by / last_change — old_vals=None يعني إنشاء، وإلا diff مع الـ snapshot."""
+    if old_vals is None:
+        obj.last_modified_by = user
+        obj.last_change = f"{timezone.now():%Y-%m-%d %H:%M} — {user.username} created"
+        return
+    new_vals = _audit_vals(obj)
+    diffs = []
+    for k, oldv in old_vals.items():
+        newv = new_vals.get(k)
+        if (oldv or "") != (newv or ""):
+            diffs.append(f"{_AUDIT_LABELS[k]}: {oldv or '—'} → {newv or '—'}")
+    if diffs:
+        obj.last_modified_by = user
+        obj.last_change = f"{timezone.now():%Y-%m-%d %H:%M} — {user.username} edited | " + "; ".join(diffs)
 
 
 @login_required
@@ -228,6 +393,9 @@ def api_save(request):
     - لازم الريب يربط الزيارة بـ WeeklyPlan Approved بتاعه.
     - last_change بتتحدث تلقائيًا عند التعديل.
     - NEW: أرشفة تلقائية لو الحالة أصبحت منتهية أو لو تبعت archive/mark_done.
+
+    Query budget (تعديل عادي من الريب): fetch الزيارة (+الخطة والعميل) + UPDATE + فهرس البحث.
+    الخطة/العميل/الريب بيتجابوا بس لو اتغيّروا؛ التحقق من الخطة بيتم على الـ instance.
     """
     data = request.POST
 
@@ -242,98 +410,20 @@ def api_save(request):
     creating = False
     if vid:
         try:
-            obj = DailyVisit.objects.select_related("rep").get(pk=vid)
+            obj = DailyVisit.objects.select_related("weekly_plan", "client").get(pk=vid)
         except DailyVisit.DoesNotExist:
             return HttpResponseBadRequest("Visit not found")
-        if not _is_manager(request.user) and obj.rep_id != request.user.id:
+        if not request.is_manager and obj.rep_id != request.user.id:
             return HttpResponseBadRequest("Not allowed")
 
         # snapshot old values
-        def old_get(key):
-            if key == "visit_outcome":
-                return getattr(obj, "visit_outcome", None) or getattr(obj, "visit_objective", None)
-            if key == "additional_outcome":
-                return getattr(obj, "additional_outcome", None) or getattr(obj, "other_objective", None)
-            if key == "weekly_plan_id":
-                return getattr(obj, "weekly_plan_id", None)
-            return getattr(obj, key, None)
-
-        old_vals = {
-            "entity": old_get("entity"),
-            "actual_datetime": old_get("actual_datetime"),
-            "time_shift": old_get("time_shift"),
-            "doctor_name": old_get("doctor_name"),
-            "phone": old_get("phone"),
-            "visit_outcome": old_get("visit_outcome"),
-            "additional_outcome": old_get("additional_outcome"),
-            "visit_status": old_get("visit_status"),
-            "weekly_plan_id": old_get("weekly_plan_id"),
-            "client_doctor": old_get("client_doctor"),
-        }
+        old_vals = _audit_vals(obj)
     else:
         obj = DailyVisit()
         creating = True
 
     # -------- binding آمن بأسماء بديلة --------
-    ent = pick("visited_account", "entity", "account", "hospital", "clinic")
-    if ent is not None:
-        obj.entity = ent
-
-    # actual_datetime (+ visit_date auto)
-    dt_str = pick("actual_datetime", "actual_visit_datetime", "visit_datetime", "datetime", "date_time")
-    if dt_str:
-        dt = parse_datetime(dt_str)
-        if dt:
-            obj.actual_datetime = dt
-            if not getattr(obj, "visit_date", None):
-                obj.visit_date = dt.date()
-
-    vd_str = pick("visit_date")
-    if vd_str:
-        try:
-            obj.visit_date = parse_date(vd_str)
-        except Exception:
-            pass
-
-    ts = pick("time_shift", "timeshift", "time_slot", "shift", "shift_time")
-    if ts is not None and hasattr(obj, "time_shift"):
-        obj.time_shift = ts
-
-    dr = pick("doctor_name", "doctor", "dr_name", "doc_name")
-    if dr is not None and hasattr(obj, "doctor_name"):
-        obj.doctor_name = dr
-
-    ph = pick("phone", "phone_number", "mobile")
-    if ph is not None:
-        if hasattr(obj, "phone"): obj.phone = ph
-        elif hasattr(obj, "phone_number"): obj.phone_number = ph
-
-    outcome = pick("visit_outcome", "outcome", "result", "visit_result")
-    if outcome is not None:
-        if hasattr(obj, "visit_outcome"): obj.visit_outcome = outcome
-        if hasattr(obj, "visit_objective"): obj.visit_objective = outcome
-
-    add_out = pick("additional_outcome", "other_objective", "notes", "remarks", "desc", "description")
-    if add_out is not None:
-        if hasattr(obj, "additional_outcome"): obj.additional_outcome = add_out
-        elif hasattr(obj, "other_objective"): obj.other_objective = add_out
-
-    st = pick("visit_status", "status", "state")
-    if st is not None:
-        if hasattr(obj, "visit_status"): obj.visit_status = st
-        elif hasattr(obj, "status"): obj.status = st
-
-    addr = pick("address", "entity_address", "location", "addr")
-    if addr is not None and hasattr(obj, "address"):
-        obj.address = addr
-
-    city = pick("city", "town", "governorate")
-    if city is not None and hasattr(obj, "city"):
-        obj.city = city
-
-    cdoc = pick("client_doctor", "doctor_client", "client_doctor_name")
-    if cdoc is not None and hasattr(obj, "client_doctor"):
-        obj.client_doctor = cdoc
+    _bind_visit_fields(obj, pick)
 
     # weekly plan — id مباشرة
     wp_id = pick("weekly_plan_id", "weekly_plan", "plan", "wp_id", "plan_id")
@@ -345,86 +435,41 @@ def api_save(request):
     elif hasattr(obj, "weekly_plan_id"):
         obj.weekly_plan_id = None
 
-    # client FK (اختياري)
-    client_id = pick("client_id", "client", "client_pk")
-    if client_id and hasattr(obj, "client_id"):
-        try:
-            from clientsapp.models import Client
-            obj.client = Client.objects.get(pk=int(client_id))
-        except Exception:
-            pass
+    # client FK (اختياري) — query بس لو العميل اتغيّر
+    client_id = _as_int(pick("client_id", "client", "client_pk"))
+    if client_id and hasattr(obj, "client_id") and client_id != obj.client_id:
+        from clientsapp.models import Client
+        c = Client.objects.filter(pk=client_id).first()
+        if c is not None:
+            obj.client = c
 
     # rep assign
-    rep_pk = pick("rep", "rep_id", "user", "user_id")
-    if _is_manager(request.user) and rep_pk:
-        try:
-            obj.rep = User.objects.get(pk=int(rep_pk))
-        except Exception:
-            obj.rep = request.user
+    rep_pk = _as_int(pick("rep", "rep_id", "user", "user_id"))
+    if request.is_manager and rep_pk and rep_pk != request.user.id:
+        obj.rep = User.objects.filter(pk=rep_pk).first() or request.user
     else:
         obj.rep = request.user
 
     # ---------- فاليديشن: WeeklyPlan Approved لنفس الريب ----------
-    if not _is_manager(request.user):
+    if not request.is_manager:
         if not getattr(obj, 'weekly_plan_id', None):
             return HttpResponseBadRequest("Weekly plan is required")
-        ok = WeeklyPlan.objects.filter(
-            id=obj.weekly_plan_id,
-            rep=request.user,
-            status__iexact='approved'
-        ).exists()
-        if not ok:
+        # الخطة متحمّلة من select_related لو ما اتغيرتش؛ غير كده query واحدة
+        # (والـ instance بيفضل في الكاش فـ save() مش هيعمل lazy load)
+        try:
+            wp = obj.weekly_plan
+        except WeeklyPlan.DoesNotExist:
+            wp = None
+        if wp is None or wp.rep_id != request.user.id or (wp.status or '').lower() != 'approved':
             return HttpResponseBadRequest("Invalid weekly plan (must be your approved plan)")
 
         # (اختياري) تحقق من week_no لو جاي من الفورم:
         wkno = request.POST.get('week_no')
-        if wkno and str(wkno).isdigit():
-            ok2 = WeeklyPlan.objects.filter(
-                id=obj.weekly_plan_id,
-                rep=request.user,
-                status__iexact='approved',
-                week_no=int(wkno)
-            ).exists()
-            if not ok2:
-                return HttpResponseBadRequest("Weekly plan does not match selected week")
+        if wkno and str(wkno).isdigit() and wp.week_number != int(wkno):
+            return HttpResponseBadRequest("Weekly plan does not match selected week")
 
     # ---------- last_change ----------
-    if creating:
-        obj.last_modified_by = request.user
-        obj.last_change = f"{timezone.now():%Y-%m-%d %H:%M} — {request.user.username} created"
-    else:
-        labels = {
-            "entity": "Visited Account",
-            "actual_datetime": "Actual DateTime",
-            "time_shift": "Time Shift",
-            "doctor_name": "Doctor Name",
-            "phone": "Phone",
-            "visit_outcome": "Visit Outcome",
-            "additional_outcome": "Additional Outcome",
-            "visit_status": "Visit Status",
-            "weekly_plan_id": "Weekly Plan",
-            "client_doctor": "Client (Doctor)",
-        }
-        new_vals = {
-            "entity": getattr(obj, "entity", None),
-            "actual_datetime": getattr(obj, "actual_datetime", None),
-            "time_shift": getattr(obj, "time_shift", None),
-            "doctor_name": getattr(obj, "doctor_name", None),
-            "phone": getattr(obj, "phone", None) or getattr(obj, "phone_number", None),
-            "visit_outcome": getattr(obj, "visit_outcome", None) or getattr(obj, "visit_objective", None),
-            "additional_outcome": getattr(obj, "additional_outcome", None) or getattr(obj, "other_objective", None),
-            "visit_status": getattr(obj, "visit_status", None) or getattr(obj, "status", None),
-            "weekly_plan_id": getattr(obj, "weekly_plan_id", None),
-            "client_doctor": getattr(obj, "client_doctor", None),
-        }
-        diffs = []
-        for k, oldv in old_vals.items():
-            newv = new_vals.get(k)
-            if (oldv or "") != (newv or ""):
-                diffs.append(f"{labels[k]}: {oldv or '—'} → {newv or '—'}")
-        if diffs:
-            obj.last_modified_by = request.user
-            obj.last_change = f"{timezone.now():%Y-%m-%d %H:%M} — {request.user.username} edited | " + "; ".join(diffs)
+    _stamp_change(obj, request.user, None if creating else old_vals)
 
     # حفظ الزيارة أولاً
     obj.save()
@@ -433,9 +478,8 @@ def api_save(request):
     # 1) لو اتبعت archive/mark_done صراحة
     must_archive_flag = (request.POST.get('archive') == '1') or (request.POST.get('mark_done') == '1')
 
-    # 2) أو لو حالة الزيارة أصبحت منتهية
-    final_status = getattr(obj, "visit_status", None) or getattr(obj, "status", None)
-    must_archive_status = _is_done_status(final_status)
+    # 2) أو لو حالة الزيارة أصبحت منتهية (status_code اتحسب في save)
+    must_archive_status = obj.status_code == VisitStatus.DONE
 
     if must_archive_flag or must_archive_status:
         _auto_archive_visit_and_cascade(obj, request.user, reason="auto-archived via save")
@@ -443,6 +487,175 @@ def api_save(request):
     return JsonResponse({"ok": True, "row": _serialize_visit(obj)})
 
 
+# أقصى عدد صفوف في طلب bulk واحد
+BULK_MAX_ROWS = 500
+
+# الحقول اللي بيكتبها bulk_update (نفس اللي ممكن api_save يغيّرها + الأرشفة)
+_BULK_UPDATE_FIELDS = [
+    'entity', 'actual_datetime', 'visit_date', 'time_shift', 'phone',
+    'visit_objective', 'other_objective', 'visit_status', 'status_code', 'is_deal', 'address', 'city',
+    'client_doctor', 'weekly_plan', 'client', 'rep', 'week_number',
+    'is_deleted', 'deleted_at', 'deleted_by', 'updated_at',
+]
+
+
+@login_required
+@require_POST
+def api_bulk_save(request):
+    """
+    Bulk upsert لزيارات يوم كامل (JSON).
+    Body: {"rows": [{...}, ...]} أو list مباشرة — نفس أسماء الحقول بتاعة api_save.
+    - الخطط/العملاء/الزيارات الموجودة بتتجاب بـ query واحدة لكل نوع.
+    - الكتابة bulk_create / bulk_update جوه transaction واحدة.
+    - الحالة المنتهية (أو archive/mark_done) بتتأرشف في نفس الكتابة،
+      والكاسكيد على الخطة بيتعمل مرة واحدة لكل خطة.
+    - نفس الـ id مرتين في الطلب → كل الصفوف دي بترجع "Duplicate id in request".
+    Response: {"ok": true, "results": [{"index", "ok", "id", "created"} | {"index", "ok": false, "error"}]}
+    """
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "null")
+    except (ValueError, UnicodeDecodeError):
+        return HttpResponseBadRequest("Invalid JSON")
+    rows = payload.get("rows") if isinstance(payload, dict) else payload
+    if not isinstance(rows, list) or not rows:
+        return HttpResponseBadRequest("rows is required")
+    if len(rows) > BULK_MAX_ROWS:
+        return HttpResponseBadRequest(f"Too many rows (max {BULK_MAX_ROWS})")
+
+    user = request.user
+    mgr = request.is_manager
+
+    def picker(row):
+        def pick(*names):
+            for n in names:
+                v = row.get(n)
+                if v not in (None, ''):
+                    return str(v)
+            return None
+        return pick
+
+    # ---------- تجميع المراجع (query واحدة لكل نوع) ----------
+    rows = [r if isinstance(r, dict) else {} for r in rows]
+    picks = [picker(r) for r in rows]
+    ids = [_as_int(p("id")) for p in picks]
+    visit_ids = set(ids) - {None}
+    # نفس الزيارة مرتين في الطلب → الصفين بيشاركوا نفس الـ instance من in_bulk، فتعديل
+    # الصف التاني (حتى لو فشل الفاليديشن) كان بيتكتب مع الأول — بنرفض كل تكرار صريح.
+    dup_ids = {k for k, n in Counter(ids).items() if n > 1} - {None}
+    plan_ids = {_as_int(p("weekly_plan_id", "weekly_plan", "plan", "wp_id", "plan_id")) for p in picks} - {None}
+    client_ids = {_as_int(p("client_id", "client", "client_pk")) for p in picks} - {None}
+    rep_ids = ({_as_int(p("rep", "rep_id", "user", "user_id")) for p in picks} - {None}) if mgr else set()
+
+    from clientsapp.models import Client
+    visits = DailyVisit.objects.in_bulk(visit_ids) if visit_ids else {}
+    plans = WeeklyPlan.objects.in_bulk(plan_ids) if plan_ids else {}
+    clients = Client.objects.in_bulk(client_ids) if client_ids else {}
+    reps = User.objects.in_bulk(rep_ids) if rep_ids else {}
+
+    now = timezone.now()
+    results = [None] * len(rows)
+    to_create, to_update = [], []   # (index, obj)
+
+    for i, (row, pick) in enumerate(zip(rows, picks)):
+        def fail(msg):
+            results[i] = {"index": i, "ok": False, "error": msg}
+
+        vid = _as_int(pick("id"))
+        old_vals = None
+        if pick("id") is not None:
+            if vid in dup_ids:
+                fail("Duplicate id in request")
+                continue
+            obj = visits.get(vid)
+            if obj is None:
+                fail("Visit not found")
+                continue
+            if not mgr and obj.rep_id != user.id:
+                fail("Not allowed")
+                continue
+            old_vals = _audit_vals(obj)
+        else:
+            obj = DailyVisit()
+
+        _bind_visit_fields(obj, pick)
+
+        # weekly plan
+        wp_key = pick("weekly_plan_id", "weekly_plan", "plan", "wp_id", "plan_id")
+        wp = plans.get(_as_int(wp_key))
+        obj.weekly_plan = wp
+
+        # client (اختياري) — id مش موجود يتجاهل زي api_save
+        c = clients.get(_as_int(pick("client_id", "client", "client_pk")))
+        if c is not None:
+            obj.client = c
+
+        # rep
+        rep = reps.get(_as_int(pick("rep", "rep_id", "user", "user_id"))) if mgr else None
+        obj.rep = rep or user
+
+        # فاليديشن: WeeklyPlan Approved لنفس الريب
+        if not mgr:
+            if not wp_key:
+                fail("Weekly plan is required")
+                continue
+            if wp is None or wp.rep_id != user.id or (wp.status or '').lower() != 'approved':
+                fail("Invalid weekly plan (must be your approved plan)")
+                continue
+            wkno = pick("week_no")
+            if wkno and wkno.isdigit() and wp.week_number != int(wkno):
+                fail("Weekly plan does not match selected week")
+                continue
+
+        if not obj.visit_date and not obj.actual_datetime:
+            fail("visit_date is required")
+            continue
+
+        obj.fill_derived_fields()
+        _stamp_change(obj, user, old_vals)
+
+        # أرشفة في نفس الكتابة لو الحالة منتهية أو اتبعت archive/mark_done
+        flag = str(row.get("archive")) == "1" or str(row.get("mark_done")) == "1"
+        if (flag or obj.status_code == VisitStatus.DONE) and not obj.is_deleted:
+            obj.is_deleted = True
+            obj.deleted_at = now
+            obj.deleted_by = user
+
+        (to_update if obj.pk else to_create).append((i, obj))
+
+    # ---------- الكتابة ----------
+    with transaction.atomic():
+        if to_create:
+            DailyVisit.objects.bulk_create([o for _, o in to_create])
+        if to_update:
+            for _, o in to_update:
+                o.updated_at = now
+            DailyVisit.objects.bulk_update([o for _, o in to_update], _BULK_UPDATE_FIELDS)
+        index_objects(DailyVisit, [o for _, o in to_create + to_update])
+        # عدادات الأرشيف + تجميعة الداشبورد (bulk_* مش بيطلق signals)
+        rollup.apply([o for _, o in to_create + to_update])
+        if ArchiveWeekly is not None:
+            visits_added([o for _, o in to_create])
+            visits_moved([o for _, o in to_update])
+            link_clients([o for _, o in to_create + to_update])
+
+    for i, o in to_create:
+        results[i] = {"index": i, "ok": True, "id": o.pk, "created": True, "row": _serialize_visit(o)}
+    for i, o in to_update:
+        results[i] = {"index": i, "ok": True, "id": o.pk, "created": False, "row": _serialize_visit(o)}
+
+    # كاسكيد الأرشفة: جوب واحد لكل خطة اتأرشف فيها زيارات
+    archived_plans = {o.weekly_plan_id for _, o in to_create + to_update if o.is_deleted and o.weekly_plan_id}
+    for plan_id in sorted(archived_plans):
+        enqueue_plan_cascade(plan_id, user)
+
+    return JsonResponse({
+        "ok": all(r["ok"] for r in results),
+        "saved": len(to_create) + len(to_update),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "results": results,
+    })
+
+
 @login_required
 @require_POST
 def api_archive(request, pk):
@@ -456,7 +669,7 @@ def api_archive(request, pk):
         return HttpResponseBadRequest("Visit not found")
 
     # الريب يقدر يأرشف زياراته؛ المدير يقدر يأرشف الكل
-    if not _is_manager(request.user) and obj.rep_id != request.user.id:
+    if not request.is_manager and obj.rep_id != request.user.id:
         return HttpResponseBadRequest("Not allowed")
 
     _auto_archive_visit_and_cascade(obj, request.user, reason="archived")
@@ -468,7 +681,7 @@ def api_archive(request, pk):
 @require_POST
 def api_delete(request, pk):
     """حذف نهائي — Manager فقط."""
-    if not _is_manager(request.user):
+    if not request.is_manager:
         return HttpResponseBadRequest("Not allowed")
 
     try:
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientsapp', '0003_alter_client_options_remove_client_weekly_plan'),
+        ('plans', '0004_alter_weeklyplan_options_and_more'),
+        ('visits', '0006_remove_dailyvisit_doctor_name_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyvisit',
+            index=models.Index(fields=['actual_datetime'], name='visits_dail_actual__be0a4a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyvisit',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['rep', 'visit_date'], name='visits_live_rep_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyvisit',
+            index=models.Index(fields=['visit_date', 'visit_status'], name='visits_dail_visit_d_9386a7_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    """update واحد لكل قيمة نصية مختلفة — مش save لكل زيارة."""
+    from visits.models import status_code_for, is_deal_for
+    DailyVisit = apps.get_model('visits', 'DailyVisit')
+    pairs = DailyVisit.objects.order_by().values_list('visit_status', 'visit_objective').distinct()
+    for status, objective in pairs:
+        DailyVisit.objects.filter(visit_status=status, visit_objective=objective).update(
+            status_code=status_code_for(status), is_deal=is_deal_for(status, objective),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientsapp', '0003_alter_client_options_remove_client_weekly_plan'),
+        ('plans', '0004_alter_weeklyplan_options_and_more'),
+        ('visits', '0007_dailyvisit_range_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='dailyvisit',
+            name='visits_dail_visit_d_9386a7_idx',
+        ),
+        migrations.AddField(
+            model_name='dailyvisit',
+            name='is_deal',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='dailyvisit',
+            name='status_code',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'No status'), (1, 'Other'), (2, 'Not Completed'), (3, 'Postponed'), (4, 'Completed'), (5, 'Deal Closed')], default=0),
+        ),
+        migrations.AddIndex(
+            model_name='dailyvisit',
+            index=models.Index(fields=['visit_date', 'status_code'], name='visits_dail_visit_d_3656f3_idx'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
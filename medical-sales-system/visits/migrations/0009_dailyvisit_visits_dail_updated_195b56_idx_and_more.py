@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientsapp', '0004_client_clientsapp__updated_bbd15e_idx_and_more'),
+        ('plans', '0005_weeklyplan_plans_weekl_updated_c848df_idx_and_more'),
+        ('visits', '0008_dailyvisit_status_code'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyvisit',
+            index=models.Index(fields=['updated_at'], name='visits_dail_updated_195b56_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyvisit',
+            index=models.Index(fields=['deleted_at'], name='visits_dail_deleted_e691d5_idx'),
+        ),
+    ]
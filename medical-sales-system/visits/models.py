@@ -1,8 +1,44 @@
 # visits/models.py
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
 
 
+class VisitStatus(models.IntegerChoices):
+    """كود موحّد لحالة الزيارة — بيتحسب من visit_status (نص حر) في fill_derived_fields."""
+    NONE          = 0, 'No status'
+    OTHER         = 1, 'Other'
+    NOT_COMPLETED = 2, 'Not Completed'
+    POSTPONED     = 3, 'Postponed'
+    DONE          = 4, 'Completed'      # منتهية → أرشفة آلية
+    DEAL          = 5, 'Deal Closed'
+
+
+# المرادفات (عربي/إنجليزي) → الكود؛ أي نص مش هنا بيبقى OTHER
+STATUS_SYNONYMS = {
+    VisitStatus.DONE: {'done', 'completed', 'finished', 'closed', 'visited', 'success', 'ok',
+                       'تم', 'منجز', 'منتهي', 'مكتمل'},
+    VisitStatus.NOT_COMPLETED: {'not completed', 'not done', 'incomplete', 'لم يتم', 'غير مكتمل'},
+    VisitStatus.POSTPONED: {'postponed', 'rescheduled', 'delayed', 'مؤجل', 'تأجيل'},
+    VisitStatus.DEAL: {'deal closed', 'deal', 'won'},
+}
+_STATUS_LOOKUP = {syn: code for code, syns in STATUS_SYNONYMS.items() for syn in syns}
+DEAL_TEXT = 'deal closed'
+
+
+def status_code_for(text):
+    v = ' '.join((text or '').split()).lower()
+    if not v:
+        return VisitStatus.NONE
+    return _STATUS_LOOKUP.get(v, VisitStatus.OTHER)
+
+
+def is_deal_for(status, objective):
+    """Deal Closed سواء في الحالة أو في الـ outcome (visit_objective)."""
+    return (status_code_for(status) == VisitStatus.DEAL
+            or ' '.join((objective or '').split()).lower() == DEAL_TEXT)
+
+
 class DailyVisit(models.Model):
     client          = models.ForeignKey(
         'clientsapp.Client',
@@ -16,6 +52,9 @@ class DailyVisit(models.Model):
 
     time_shift      = models.CharField(max_length=10, blank=True)
     visit_status    = models.CharField(max_length=20, blank=True)
+    # مشتقين من visit_status / visit_objective (fill_derived_fields) — الفلترة عليهم بدل iexact
+    status_code     = models.PositiveSmallIntegerField(choices=VisitStatus.choices, default=VisitStatus.NONE)
+    is_deal         = models.BooleanField(default=False)
 
     weekly_plan     = models.ForeignKey(
         'plans.WeeklyPlan',
@@ -62,9 +101,24 @@ class DailyVisit(models.Model):
             models.Index(fields=['weekly_plan']),
             models.Index(fields=['week_number']),
             models.Index(fields=['is_deleted']),
+            models.Index(fields=['actual_datetime']),
+            # delta sync (visits/sync.py): updated_at >= t OR deleted_at >= t
+            models.Index(fields=['updated_at']),
+            models.Index(fields=['deleted_at']),
+            # لستة الريب (غير مؤرشف + rep + تاريخ): partial index على الصفوف الحية بس —
+            # SQLite بيكتب is_deleted=False كـ NOT is_deleted فمش بيستخدمه كـ prefix في index عادي
+            models.Index(fields=['rep', 'visit_date'], condition=Q(is_deleted=False),
+                         name='visits_live_rep_date_idx'),
+            # الفلاتر/التجميع بالتاريخ والحالة
+            models.Index(fields=['visit_date', 'status_code']),
         ]
 
-    def save(self, *args, **kwargs):
+    def fill_derived_fields(self):
+        """
+        الحقول المشتقة (تاريخ/أسبوع/بيانات العميل/كود الحالة) — بتتنادى من save()
+        ومن مسارات الـ bulk اللي مش بتعدّي على save().
+        لو weekly_plan/client متعيّنين كـ instances مفيش أي query إضافية.
+        """
         # 1) لو التاريخ الفعلي موجود ومفيش visit_date، خده منه
         if not self.visit_date and self.actual_datetime:
             try:
@@ -95,6 +149,12 @@ class DailyVisit(models.Model):
             if not self.client_doctor:
                 self.client_doctor = getattr(c, 'doctor_name', '') or self.client_doctor
 
+        # 4) كود الحالة + Deal من النص الحر
+        self.status_code = status_code_for(self.visit_status)
+        self.is_deal = is_deal_for(self.visit_status, self.visit_objective)
+
+    def save(self, *args, **kwargs):
+        self.fill_derived_fields()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -0,0 +1,184 @@
+# visits/sync.py
+"""
+Delta sync لأجهزة المندوبين (offline):
+GET /visits/api/changes/?since=<token>
+
+- بيرجّع اللي اتغيّر بعد التوكن في DailyVisit + WeeklyPlan + Client (كل اللي الكولر يشوفه).
+- "التغيير" = max(updated_at, deleted_at) — علشان الأرشفة بـ update_fields/update()
+  اللي مش بتلمس updated_at تظهر برضه. الفلترة الأول بـ updated_at >= t OR deleted_at >= t
+  (indexes على العمودين) وبعدين الـ keyset على القيمة المحسوبة للصفوف اللي عدّت بس.
+- الصف المؤرشف (is_deleted) بيرجع كـ tombstone بدل الصف كامل — والخطة كمان لما تخرج من
+  approved (rejected / Archived)، فالجهاز يشيلها. tombstone لـ id مش عند الجهاز = تجاهله.
+- التوكن opaque وفيه (changed_at, id) لكل نوع → keyset ثابت حتى مع نفس الـ timestamp.
+- ETag + If-None-Match → 304 لو مفيش جديد.
+"""
+from datetime import timedelta
+import hashlib
+
+from django.contrib.auth.decorators import login_required
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce, Greatest
+from django.http import JsonResponse, HttpResponseBadRequest
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET
+
+from .models import DailyVisit
+from .api import _serialize_visit, _encode_cursor, _decode_cursor
+from plans.models import WeeklyPlan
+from clientsapp.models import Client
+
+SYNC_DEFAULT_LIMIT = 200
+SYNC_MAX_LIMIT = 1000
+# الصفوف اللي اتغيّرت في آخر ثانيتين بتستنى السينك الجاي
+# (transaction لسه ما عملتش commit ممكن يكون ليها timestamp أقدم من التوكن)
+SYNC_SETTLE_SECONDS = 2
+
+
+def _plan_row(p):
+    return {
+        "id": p.id,
+        "aa_plan": p.aa_plan,
+        "planned_date": p.planned_date,
+        "product_line": p.product_line,
+        "entity_address": p.entity_address,
+        "entity_type": p.entity_type,
+        "specialization": p.specialization,
+        "visit_objective": p.visit_objective,
+        "other_objective": p.other_objective,
+        "notes": p.notes,
+        "status": p.status,
+        "week_number": p.week_number,
+        "rep_id": p.rep_id,
+        "updated_at": p.updated_at,
+    }
+
+
+def _client_row(c):
+    return {
+        "id": c.id,
+        "doctor_name": c.doctor_name,
+        "entity_name": c.entity_name,
+        "city": c.city,
+        "location": c.location,
+        "phone": c.phone,
+        "email": c.email,
+        "status": c.status,
+        "notes": c.notes,
+        "week_number": c.week_number,
+        "rep_id": c.rep_id,
+        "updated_at": c.updated_at,
+    }
+
+
+def _deleted(o):
+    return o.is_deleted
+
+
+def _plan_gone(p):
+    # الأجهزة شايلة الخطط الـ approved بس
+    return p.is_deleted or p.status != 'approved'
+
+
+def _streams(user, mgr):
+    """(key, queryset, serializer, gone) لكل نوع — مقصورة على بيانات الريب لو مش مدير."""
+    visits = DailyVisit.objects.select_related("rep", "client")
+    plans = WeeklyPlan.objects.all()
+    clients = Client.objects.all()
+    if not mgr:
+        visits = visits.filter(rep=user)
+        plans = plans.filter(rep=user)
+        clients = clients.filter(rep=user)
+    return [
+        ("visits", visits, _serialize_visit, _deleted),
+        ("plans", plans, _plan_row, _plan_gone),
+        ("clients", clients, _client_row, _deleted),
+    ]
+
+
+def _delta(qs, mark, upper):
+    qs = qs.annotate(
+        changed_at=Greatest(F("updated_at"), Coalesce(F("deleted_at"), F("updated_at")))
+    ).filter(changed_at__lte=upper)
+    if mark:
+        ts, last_id = mark
+        # changed_at >= ts ⇔ updated_at >= ts أو deleted_at >= ts — شرط على أعمدة متفهرسة
+        qs = qs.filter(Q(updated_at__gte=ts) | Q(deleted_at__gte=ts))
+        qs = qs.filter(Q(changed_at__gt=ts) | Q(changed_at=ts, id__gt=last_id))
+    return qs.order_by("changed_at", "id")
+
+
+def _changes_after(qs, mark, upper, limit):
+    return list(_delta(qs, mark, upper)[:limit + 1])
+
+
+def _parse_since(token):
+    """{"visits": [iso, id], ...} → {"visits": (datetime, id), ...} أو None لو التوكن بايظ."""
+    if not token:
+        return {}
+    payload = _decode_cursor(token)
+    if not isinstance(payload, dict):
+        return None
+    marks = {}
+    for key, val in payload.items():
+        if not (isinstance(val, list) and len(val) == 2 and isinstance(val[1], int)):
+            return None
+        ts = parse_datetime(val[0]) if isinstance(val[0], str) else None
+        if ts is None:
+            return None
+        marks[key] = (ts, val[1])
+    return marks
+
+
+@login_required
+@require_GET
+def api_changes(request):
+    token = (request.GET.get("since") or "").strip()
+    marks = _parse_since(token)
+    if marks is None:
+        return HttpResponseBadRequest("Invalid since token")
+    try:
+        limit = int(request.GET.get("limit") or SYNC_DEFAULT_LIMIT)
+    except ValueError:
+        limit = SYNC_DEFAULT_LIMIT
+    limit = max(1, min(limit, SYNC_MAX_LIMIT))
+
+    upper = timezone.now() - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    mgr = request.is_manager
+
+    data = {}
+    next_marks = {k: [ts.isoformat(), i] for k, (ts, i) in marks.items()}
+    has_more = False
+    for key, qs, serialize, gone in _streams(request.user, mgr):
+        batch = _changes_after(qs, marks.get(key), upper, limit)
+        if len(batch) > limit:
+            has_more = True
+            batch = batch[:limit]
+        data[key] = {
+            "upserts": [serialize(o) for o in batch if not gone(o)],
+            "tombstones": [{"id": o.id, "deleted_at": o.deleted_at} for o in batch if gone(o)],
+        }
+        if batch:
+            last = batch[-1]
+            next_marks[key] = [last.changed_at.isoformat(), last.id]
+
+    next_token = _encode_cursor(next_marks) if next_marks else ""
+
+    # نفس (user, since, next) = نفس الرد بالظبط
+    raw = f"{request.user.pk}|{token}|{next_token}|{limit}".encode("utf-8")
+    etag = quote_etag(hashlib.sha1(raw).hexdigest())
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    resp = JsonResponse({
+        "since": token,
+        "next": next_token,
+        "has_more": has_more,
+        **data,
+    })
+    resp["ETag"] = etag
+    resp["Cache-Control"] = "private, no-cache"
+    return resp
@@ -0,0 +1,31 @@
+# visits/tasks.py
+"""
+جوبات الخلفية الخاصة بالزيارات (بتتنفذ عن طريق jobs.queue / run_jobs).
+"""
+from django.contrib.auth import get_user_model
+
+from jobs.queue import enqueue
+
+CASCADE_TASK = 'visits.tasks.cascade_weekly_plan'
+
+
+def enqueue_plan_cascade(weekly_plan_id, user=None):
+    """
+    يحط كاسكيد أرشفة الخطة + السنابشوت في الطابور.
+    key لكل خطة → كذا save ورا بعض على نفس الخطة = إعادة حساب واحدة.
+    """
+    if not weekly_plan_id:
+        return None
+    return enqueue(
+        CASCADE_TASK,
+        {"plan_id": weekly_plan_id, "user_id": getattr(user, 'pk', None)},
+        key=f"plan:{weekly_plan_id}",
+    )
+
+
+def cascade_weekly_plan(plan_id, user_id=None):
+    """لو كل زيارات الخطة اتأرشفت: أرشف الخطة + اعمل سنابشوت في ArchiveWeekly."""
+    from .api import _archive_weekly_plan_if_done
+
+    user = get_user_model().objects.filter(pk=user_id).first() if user_id else None
+    _archive_weekly_plan_if_done(plan_id, user)
@@ -1,3 +1,416 @@
+import json
+import os
+import time
+from datetime import date, timedelta
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.db.models import Count, F, Q
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from med.dates import day_range, day_start
+
+from archives.counters import ensure_week
+from archives.models import ArchiveWeekly
+from jobs.models import Job
+from plans.models import WeeklyPlan
+from search.index import search_queryset
+from .api import BULK_MAX_ROWS
+from .models import DailyVisit
+
+
+class ApiSaveQueryBudgetTests(TestCase):
+    """
+    Benchmark / regression لمسار api_save:
+    تعديل عادي من الريب لازم يفضل بعدد queries ثابت مهما كبرت الداتا،
+    وزمن الاستجابة تحت حد معقول على داتا مزروعة (benchmark اختياري: DJANGO_BENCH=1).
+    """
+
+    SEED_VISITS = 3000
+    # session + user + fetch الزيارة (مع الخطة والعميل) + UPDATE + فهرس البحث
+    QUERY_BUDGET = 5
+    # متوسط زمن الـ request (ms) — بيتقاس بس مع DJANGO_BENCH=1 (wall-clock بيبقى flaky على CI)
+    LATENCY_BUDGET_MS = 150
+
+    @classmethod
+    def setUpTestData(cls):
+        rep_group, _ = Group.objects.get_or_create(name='Rep')
+        cls.rep = User.objects.create_user('bench_rep', password='x')
+        cls.rep.groups.add(rep_group)
+        other = User.objects.create_user('bench_other', password='x')
+
+        plan_kwargs = dict(
+            aa_plan='Plan', product_line='Line', entity_address='Addr',
+            entity_type='Hospital', specialization='Surgery', visit_objective='Demo',
+            week_number=12, status='approved',
+        )
+        cls.plan = WeeklyPlan.objects.create(rep=cls.rep, planned_date=date(2025, 3, 17), **plan_kwargs)
+        other_plan = WeeklyPlan.objects.create(rep=other, planned_date=date(2025, 3, 17), **plan_kwargs)
+
+        start = date(2023, 1, 1)
+        DailyVisit.objects.bulk_create([
+            DailyVisit(
+                rep=cls.rep if i % 2 else other,
+                weekly_plan=cls.plan if i % 2 else other_plan,
+                week_number=12,
+                visit_date=start + timedelta(days=i % 700),
+                entity=f'Seed entity {i}',
+                city='Cairo',
+            )
+            for i in range(cls.SEED_VISITS)
+        ])
+        cls.visit = DailyVisit.objects.create(
+            rep=cls.rep, weekly_plan=cls.plan, week_number=12,
+            visit_date=date(2025, 3, 18), entity='Target',
+        )
+
+    def setUp(self):
+        # زي الإنتاج مع كاش مشترك (Redis): الأدوار من الكاش مش query لكل request
+        patcher = mock.patch('accounts.roles._shared', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.rep)
+        # warm-up: كاش الأدوار + metadata فهرس البحث
+        self._save(entity='warm-up')
+
+    def _save(self, **fields):
+        data = {
+            'id': self.visit.id,
+            'weekly_plan_id': self.plan.id,
+            'visit_date': '2025-03-18',
+            'visit_status': 'Not Completed',
+        }
+        data.update(fields)
+        resp = self.client.post(reverse('visits:api_save'), data)
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return resp
+
+    def test_rep_update_query_budget(self):
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            resp = self._save(entity='Updated', city='Giza')
+        self.assertEqual(resp.json()['row']['entity'], 'Updated')
+        self.visit.refresh_from_db()
+        self.assertEqual(self.visit.city, 'Giza')
+
+    def test_week_check_does_not_add_queries(self):
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            self._save(entity='With week', week_no='12')
+
+    def test_rejects_plan_of_another_week(self):
+        resp = self.client.post(reverse('visits:api_save'), {
+            'id': self.visit.id, 'weekly_plan_id': self.plan.id, 'week_no': '13',
+        })
+        self.assertEqual(resp.status_code, 400)
+
+    def test_query_count_independent_of_dataset_size(self):
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            self._save(entity='Before growth')
+        DailyVisit.objects.bulk_create([
+            DailyVisit(rep=self.rep, weekly_plan=self.plan, week_number=12,
+                       visit_date=date(2025, 3, 18), entity=f'Extra {i}')
+            for i in range(1000)
+        ])
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            self._save(entity='After growth')
+
+    @skipUnless(os.environ.get('DJANGO_BENCH') == '1', 'benchmark: DJANGO_BENCH=1')
+    def test_latency_on_seeded_dataset(self):
+        runs = 30
+        t0 = time.perf_counter()
+        for i in range(runs):
+            self._save(entity=f'Latency {i}')
+        avg_ms = (time.perf_counter() - t0) * 1000 / runs
+        self.assertLess(avg_ms, self.LATENCY_BUDGET_MS, f'api_save avg {avg_ms:.1f}ms')
+
+
+class DateRangeIndexTests(TestCase):
+    """
+    فلاتر التاريخ لازم تفضل sargable: EXPLAIN على SQLite يثبت إن الـ indexes مستخدمة
+    ومفيش full SCAN على visits_dailyvisit.
+    """
+
+    DAY = date(2025, 3, 18)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rep = User.objects.create_user('idx_rep', password='x')
+        DailyVisit.objects.bulk_create([
+            DailyVisit(rep=cls.rep, week_number=12, visit_date=cls.DAY - timedelta(days=i % 60),
+                       entity=f'Idx {i}', visit_status='Completed' if i % 3 else 'Deal Closed')
+            for i in range(300)
+        ])
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN plans هنا خاصة بـ SQLite')
+
+    def assertUsesIndex(self, qs, index_name=None):
+        plan = qs.explain()
+        self.assertNotRegex(plan, r'SCAN visits_dailyvisit(?! USING)', plan)
+        self.assertIn('USING', plan)
+        if index_name:
+            self.assertIn(index_name, plan)
+        return plan
+
+    def test_api_list_day_filter(self):
+        lo, hi = day_range(self.DAY)
+        qs = DailyVisit.objects.filter(Q(actual_datetime__gte=lo, actual_datetime__lt=hi) | Q(visit_date=self.DAY))
+        plan = self.assertUsesIndex(qs.order_by())
+        self.assertIn('MULTI-INDEX OR', plan)
+        self.assertNotIn('SCAN', plan)
+
+    def test_date_lookup_is_not_sargable(self):
+        # المرجع: __date بيلف العمود في تحويل timezone → SCAN
+        plan = DailyVisit.objects.filter(actual_datetime__date=self.DAY).order_by().explain()
+        self.assertIn('SCAN', plan)
+
+    def test_dashboard_recent_range(self):
+        qs = (DailyVisit.objects.filter(actual_datetime__gte=day_start(self.DAY))
+              .order_by('-actual_datetime')[:10])
+        plan = self.assertUsesIndex(qs)
+        self.assertIn('actual_datetime>?', plan)
+
+    def test_live_rep_list_uses_partial_index(self):
+        qs = (DailyVisit.objects.filter(is_deleted=False, rep=self.rep, visit_date__gte=self.DAY - timedelta(days=7))
+              .order_by('-visit_date'))
+        self.assertUsesIndex(qs, 'visits_live_rep_date_idx')
+
+    def test_status_breakdown_is_covered(self):
+        qs = (DailyVisit.objects.filter(visit_date__gte=self.DAY - timedelta(days=30))
+              .values('status_code').annotate(n=Count('id')).order_by())
+        plan = self.assertUsesIndex(qs)
+        self.assertIn('COVERING INDEX', plan)
+
+
+@mock.patch('visits.sync.SYNC_SETTLE_SECONDS', 0)
+class SyncChangesTests(TestCase):
+    """api_changes: keyset cursor، الـ ETag، والـ tombstones (زيارة مؤرشفة / خطة خرجت من approved)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rep = User.objects.create_user('sync_rep', password='x')
+        cls.rep.groups.add(Group.objects.get_or_create(name='Rep')[0])
+        cls.plan = WeeklyPlan.objects.create(
+            rep=cls.rep, planned_date=date(2025, 3, 17), aa_plan='Plan', product_line='Line',
+            entity_address='Addr', entity_type='Hospital', specialization='Surgery',
+            visit_objective='Demo', week_number=12, status='approved',
+        )
+        cls.visits = DailyVisit.objects.bulk_create([
+            DailyVisit(rep=cls.rep, weekly_plan=cls.plan, week_number=12,
+                       visit_date=date(2025, 3, 18), entity=f'Sync {i}')
+            for i in range(3)
+        ])
+        # نفس الـ timestamp للكل — الـ id هو اللي بيفصل في الـ keyset
+        DailyVisit.objects.update(updated_at=timezone.now() - timedelta(minutes=5))
+
+    def setUp(self):
+        self.client.force_login(self.rep)
+
+    def _changes(self, since='', **extra):
+        params = {'since': since, **({'limit': extra.pop('limit')} if 'limit' in extra else {})}
+        return self.client.get(reverse('visits:api_changes'), params, **extra)
+
+    def _drain(self, since=''):
+        resp = self._changes(since)
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return resp.json()
+
+    def test_cursor_pages_through_equal_timestamps(self):
+        seen, since = [], ''
+        for _ in range(5):
+            body = self._changes(since, limit=1).json()
+            seen += [v['id'] for v in body['visits']['upserts']]
+            since = body['next']
+            if not body['has_more']:
+                break
+        self.assertEqual(sorted(seen), sorted(v.id for v in self.visits))
+        self.assertEqual(len(seen), len(set(seen)))
+        # من غير تغييرات جديدة: التوكن نفسه يرجع فاضي
+        body = self._drain(since)
+        self.assertEqual(body['visits'], {'upserts': [], 'tombstones': []})
+        self.assertEqual(body['next'], since)
+
+    def test_etag_not_modified(self):
+        since = self._drain()['next']
+        resp = self._changes(since)
+        self.assertEqual(resp.status_code, 200)
+        again = self._changes(since, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+        DailyVisit.objects.filter(pk=self.visits[0].pk).update(entity='Changed', updated_at=timezone.now())
+        self.assertEqual(self._changes(since, HTTP_IF_NONE_MATCH=resp['ETag']).status_code, 200)
+
+    def test_soft_deleted_visit_is_tombstone(self):
+        since = self._drain()['next']
+        # archive بـ update() من غير ما يلمس updated_at — deleted_at كفاية
+        DailyVisit.objects.filter(pk=self.visits[1].pk).update(is_deleted=True, deleted_at=timezone.now())
+        body = self._drain(since)
+        self.assertEqual(body['visits']['upserts'], [])
+        self.assertEqual([t['id'] for t in body['visits']['tombstones']], [self.visits[1].pk])
+
+    def test_plan_leaving_approved_is_tombstone(self):
+        body = self._drain()
+        self.assertEqual([p['id'] for p in body['plans']['upserts']], [self.plan.pk])
+        since = body['next']
+
+        self.plan.status = 'rejected'
+        self.plan.save(update_fields=['status', 'updated_at'])
+        body = self._drain(since)
+        self.assertEqual(body['plans']['upserts'], [])
+        self.assertEqual([t['id'] for t in body['plans']['tombstones']], [self.plan.pk])
+
+    def test_delta_filter_uses_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN plans هنا خاصة بـ SQLite')
+        from .sync import _delta
+        plan = _delta(DailyVisit.objects.all(), (timezone.now(), 0), timezone.now()).order_by().explain()
+        self.assertIn('MULTI-INDEX OR', plan)
+        self.assertIn('visits_dail_updated_195b56_idx', plan)
+
+
+class KeysetCursorTests(TestCase):
+    """api_list ?cursor=: نفس ترتيب الـ paging القديم، من غير تكرار أو صفوف ناقصة."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rep = User.objects.create_user('cursor_rep', password='x')
+        at = timezone.now().replace(microsecond=0) - timedelta(days=1)
+        rows = []
+        for i in range(7):
+            # تلات زيارات بنفس الـ datetime (الـ id بيفصل) + زيارتين من غير datetime (في الآخر)
+            dt = None if i >= 5 else at - timedelta(hours=0 if i < 3 else i)
+            rows.append(DailyVisit(rep=cls.rep, week_number=12, visit_date=date(2025, 3, 18),
+                                   actual_datetime=dt, entity=f'Cursor {i}'))
+        DailyVisit.objects.bulk_create(rows)
+        cls.expected = list(DailyVisit.objects.filter(rep=cls.rep)
+                            .order_by(F('actual_datetime').desc(nulls_last=True), '-id')
+                            .values_list('id', flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.rep)
+
+    def _page(self, cursor='', **params):
+        resp = self.client.get(reverse('visits:api_list'), {'cursor': cursor, 'size': 2, **params})
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return resp.json()
+
+    def _walk(self):
+        seen, cursor = [], ''
+        while True:
+            page = self._page(cursor)
+            seen += [r['id'] for r in page['rows']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                return seen
+
+    def test_walks_all_rows_in_order(self):
+        self.assertEqual(self._walk(), self.expected)
+
+    def test_matches_offset_paging(self):
+        resp = self.client.get(reverse('visits:api_list'), {'page': 1, 'size': 50}).json()
+        self.assertEqual([r['id'] for r in resp['rows']], self.expected)
+
+    def test_new_rows_do_not_shift_pages(self):
+        first = self._page()
+        self.assertEqual([r['id'] for r in first['rows']], self.expected[:2])
+        # زيارة أحدث بعد أول صفحة — الـ OFFSET كان هيكرر صف
+        DailyVisit.objects.create(rep=self.rep, visit_date=date(2025, 3, 18),
+                                  actual_datetime=timezone.now(), entity='Newest')
+        second = self._page(first['next_cursor'])
+        self.assertEqual([r['id'] for r in second['rows']], self.expected[2:4])
+
+    def test_with_total_and_invalid_cursor(self):
+        self.assertEqual(self._page(with_total=1)['total'], len(self.expected))
+        self.assertNotIn('total', self._page())
+        resp = self.client.get(reverse('visits:api_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(resp.status_code, 400)
+
+
+class BulkSaveTests(TestCase):
+    """api_bulk_save: نتيجة لكل صف، الأرشفة في نفس الكتابة، العدادات وفهرس البحث."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rep = User.objects.create_user('bulk_rep', password='x')
+        cls.rep.groups.add(Group.objects.get_or_create(name='Rep')[0])
+        cls.other = User.objects.create_user('bulk_other', password='x')
+        kwargs = dict(planned_date=date(2025, 3, 17), aa_plan='Plan', product_line='Line',
+                      entity_address='Addr', entity_type='Hospital', specialization='Surgery',
+                      visit_objective='Demo', week_number=12, status='approved')
+        cls.plan = WeeklyPlan.objects.create(rep=cls.rep, **kwargs)
+        cls.other_plan = WeeklyPlan.objects.create(rep=cls.other, **kwargs)
+        cls.existing = DailyVisit.objects.create(rep=cls.rep, weekly_plan=cls.plan, week_number=12,
+                                                 visit_date=date(2025, 3, 18), entity='Existing')
+        cls.foreign = DailyVisit.objects.create(rep=cls.other, weekly_plan=cls.other_plan, week_number=12,
+                                                visit_date=date(2025, 3, 18), entity='Foreign')
+
+    def setUp(self):
+        self.client.force_login(self.rep)
+
+    def _post(self, rows):
+        return self.client.post(reverse('visits:api_bulk_save'), json.dumps({'rows': rows}),
+                                content_type='application/json')
+
+    def row(self, **fields):
+        return {'weekly_plan_id': self.plan.pk, 'visit_date': '2025-03-19', **fields}
+
+    def test_mixed_rows(self):
+        ensure_week(self.rep.pk, 12)
+        resp = self._post([
+            self.row(entity='Bulk Alpha Clinic'),
+            self.row(id=self.existing.pk, entity='Existing Updated'),
+            self.row(id=self.foreign.pk, entity='Hijack'),
+            self.row(weekly_plan_id=self.other_plan.pk, entity='Wrong plan'),
+            self.row(entity='Bulk Done', visit_status='Completed'),
+        ])
+        self.assertEqual(resp.status_code, 200, resp.content)
+        body = resp.json()
+        self.assertEqual((body['ok'], body['saved'], body['failed']), (False, 3, 2))
+        res = body['results']
+        self.assertEqual([r['ok'] for r in res], [True, True, False, False, True])
+        self.assertEqual([r.get('created') for r in res], [True, False, None, None, True])
+        self.assertEqual(res[2]['error'], 'Not allowed')
+
+        self.assertEqual(DailyVisit.objects.get(pk=self.existing.pk).entity, 'Existing Updated')
+        self.assertEqual(DailyVisit.objects.get(pk=self.foreign.pk).entity, 'Foreign')
+        done = DailyVisit.objects.get(pk=res[4]['id'])
+        self.assertTrue(done.is_deleted)
+        self.assertEqual((done.rep_id, done.week_number), (self.rep.pk, 12))
+        # existing + 2 جديدة
+        self.assertEqual(ArchiveWeekly.objects.get(rep=self.rep, week_no=12).total_visits, 3)
+        found = search_queryset(DailyVisit.objects.all(), 'Alpha Clinic')
+        self.assertEqual([v.pk for v in found], [res[0]['id']])
+
+    def test_done_row_enqueues_plan_cascade_once(self):
+        self._post([self.row(entity='D1', visit_status='Completed'),
+                    self.row(entity='D2', visit_status='Completed')])
+        self.assertEqual(Job.objects.filter(dedupe_key=f'plan:{self.plan.pk}').count(), 1)
+
+    def test_rejects_bad_payloads(self):
+        url = reverse('visits:api_bulk_save')
+        self.assertEqual(self.client.post(url, '{', content_type='application/json').status_code, 400)
+        self.assertEqual(self._post([]).status_code, 400)
+        self.assertEqual(self._post([self.row()] * (BULK_MAX_ROWS + 1)).status_code, 400)
+        self.assertEqual(DailyVisit.objects.count(), 2)
+
+    def test_duplicate_id_rows_are_rejected(self):
+        # الصف التاني بخطة غلط كان بيعدّل نفس الـ instance قبل الفاليديشن ويتكتب مع الأول
+        resp = self._post([
+            self.row(id=self.existing.pk, entity='First'),
+            self.row(id=self.existing.pk, entity='Second', weekly_plan_id=self.other_plan.pk),
+            self.row(entity='Fresh'),
+        ])
+        res = resp.json()['results']
+        self.assertEqual([r['ok'] for r in res], [False, False, True])
+        self.assertEqual({r.get('error') for r in res[:2]}, {'Duplicate id in request'})
+        existing = DailyVisit.objects.get(pk=self.existing.pk)
+        self.assertEqual((existing.entity, existing.weekly_plan_id), ('Existing', self.plan.pk))
 
-# Create your tests here.
+    def test_rows_carry_last_change(self):
+        res = self._post([self.row(entity='New One'),
+                          self.row(id=self.existing.pk, entity='Existing Renamed')]).json()['results']
+        self.assertTrue(res[0]['row']['last_change'].endswith('bulk_rep created'))
+        self.assertIn('edited | Visited Account: Existing → Existing Renamed', res[1]['row']['last_change'])
@@ -2,6 +2,7 @@
 from django.urls import path
 from . import views
 from . import api
+from . import sync
 
 app_name = "visits"
 
@@ -14,6 +15,8 @@ urlpatterns = [
     # APIs (زي ما هي)
     path('api/list/', api.api_list, name='api_list'),
     path('api/save/', api.api_save, name='api_save'),
+    path('api/bulk-save/', api.api_bulk_save, name='api_bulk_save'),
+    path('api/changes/', sync.api_changes, name='api_changes'),
     path('api/archive/<int:pk>/', api.api_archive, name='api_archive'),
     path('api/delete/<int:pk>/', api.api_delete, name='api_delete'),
 ]
@@ -1,19 +1,16 @@
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Q
-from django.http import HttpResponse
 from django.utils import timezone
 from urllib.parse import urlencode
-import csv
 
 from .models import DailyVisit
 from plans.models import WeeklyPlan
-from archives.models import ArchiveWeekly
-
-
-def is_manager(u):
-    return u.is_authenticated and u.groups.filter(name='Manager').exists()
+from archives.counters import ensure_week
+from accounts.roles import is_manager
+from search.index import search_queryset
+from med.exports import csv_response, first_of, wants_csv
+from med.serializers import rep_display
 
 
 def _week_choices_for_user(user, wk_filter=None):
@@ -31,7 +28,7 @@ def _week_choices_for_user(user, wk_filter=None):
 
 @login_required
 def daily_view(request):
-    mgr = is_manager(request.user)
+    mgr = request.is_manager
 
     # Params
     show = (request.GET.get('show') or 'active').strip().lower()   # active | deleted | all
@@ -56,17 +53,9 @@ def daily_view(request):
     if wk.isdigit():
         qs = qs.filter(week_number=int(wk))
 
-    # Search
+    # Search (FTS index + relevance)
     if q:
-        qs = qs.filter(
-            Q(entity__icontains=q) |
-            Q(client_doctor__icontains=q) |
-            Q(address__icontains=q) |
-            Q(city__icontains=q) |
-            Q(phone__icontains=q) |
-            Q(visit_objective__icontains=q) |
-            Q(other_objective__icontains=q)
-        )
+        qs = search_queryset(qs, q)
 
     # Approved weekly plans التي يمكن البدء منها (بدون sync)
     approved_plans = WeeklyPlan.objects.filter(status='approved')
@@ -83,31 +72,22 @@ def daily_view(request):
     current_week = wk if wk.isdigit() else (str(week_choices[-1]) if week_choices else '')
 
     # Export CSV
-    if request.GET.get('export') == 'csv':
-        resp = HttpResponse(content_type='text/csv; charset=utf-8')
-        resp['Content-Disposition'] = 'attachment; filename="daily_visits.csv"'
-        w = csv.writer(resp)
-        w.writerow([
-            'ID','Week #','Visit Date','Actual DateTime','Entity','Doctor',
-            'Address','City','Phone','Objective','Other','Rep','Created'
-        ])
-        for v in qs:
-            w.writerow([
-                v.id,
-                v.week_number or '',
-                v.visit_date or '',
-                v.actual_datetime or '',
-                v.entity or (getattr(v.client, 'entity_name', '') if v.client_id else ''),
-                v.client_doctor or (getattr(v.client, 'doctor_name', '') if v.client_id else ''),
-                v.address or (getattr(v.client, 'location', '') if v.client_id else ''),
-                v.city or (getattr(v.client, 'city', '') if v.client_id else ''),
-                v.phone or (getattr(v.client, 'phone', '') if v.client_id else ''),
-                v.visit_objective or '',
-                v.other_objective or '',
-                (v.rep.get_full_name() or v.rep.username) if v.rep_id else '',
-                v.created_at or '',
-            ])
-        return resp
+    if wants_csv(request):
+        return csv_response(qs, [
+            ('ID', 'id'),
+            ('Week #', 'week_number'),
+            ('Visit Date', 'visit_date'),
+            ('Actual DateTime', 'actual_datetime'),
+            ('Entity', first_of('entity', 'client__entity_name')),
+            ('Doctor', first_of('client_doctor', 'client__doctor_name')),
+            ('Address', first_of('address', 'client__location')),
+            ('City', first_of('city', 'client__city')),
+            ('Phone', first_of('phone', 'client__phone')),
+            ('Objective', 'visit_objective'),
+            ('Other', 'other_objective'),
+            ('Rep', rep_display('rep')),
+            ('Created', 'created_at'),
+        ], 'daily_visits.csv')
 
     return render(request, 'visits/daily.html', {
         'visits': qs,
@@ -137,34 +117,17 @@ def start_from_weekly(request, pk):
     """
     1:1 بين WeeklyPlan (approved) و DailyVisit.
     لو الزيارة موجودة بالفعل لنفس الخطة → افتحها بدل ما تعمل واحدة جديدة.
-    كذلك نتعامل مع تكرار ArchiveWeekly بأمان.
+    صف ArchiveWeekly للأسبوع بيتأكد بـ upsert واحد (ON CONFLICT DO NOTHING).
     """
-    if is_manager(request.user):
+    if request.is_manager:
         messages.error(request, 'Only Reps can start from a weekly plan.')
         return redirect('visits:daily')
 
     p = get_object_or_404(WeeklyPlan, pk=pk, rep=request.user, status='approved')
 
-    # --- تأكيد وجود سجل أرشيف واحد فقط لهذا الأسبوع/المندوب ---
+    # --- تأكيد وجود سجل أرشيف لهذا الأسبوع/المندوب (unique على rep + week_no) ---
     try:
-        aw_first = ArchiveWeekly.objects.filter(rep=request.user, week_no=p.week_number).order_by('id').first()
-        if aw_first is None:
-            # مفيش أرشيف: أنشئ صف بسيط (تفاصيل إضافية اختيارية)
-            ArchiveWeekly.objects.create(rep=request.user, week_no=p.week_number)
-        else:
-            # لو فيه دوبلكيت، ادمج العدادات واحذف الزيادة
-            extras = ArchiveWeekly.objects.filter(rep=request.user, week_no=p.week_number).exclude(id=aw_first.id)
-            if extras.exists():
-                for e in extras:
-                    if hasattr(aw_first, 'total_visits') and hasattr(e, 'total_visits'):
-                        aw_first.total_visits = (aw_first.total_visits or 0) + (e.total_visits or 0)
-                    if hasattr(aw_first, 'unique_clients') and hasattr(e, 'unique_clients'):
-                        aw_first.unique_clients = (aw_first.unique_clients or 0) + (e.unique_clients or 0)
-                    e.delete()
-                try:
-                    aw_first.save()
-                except Exception:
-                    pass
+        ensure_week(request.user.pk, p.week_number)
     except Exception:
         # أي خطأ في الأرشيف لا يمنع إنشاء الزيارة
         pass
@@ -205,7 +168,7 @@ def move_to_client(request, pk):
         return redirect('visits:daily')
 
     dv = get_object_or_404(DailyVisit, pk=pk, is_deleted=False)
-    if not is_manager(request.user) and dv.rep_id != request.user.id:
+    if not request.is_manager and dv.rep_id != request.user.id:
         messages.error(request, 'Not allowed.')
         return redirect('visits:daily')
 